@@ -33,11 +33,24 @@
 
 
 # teste
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt, JWTError, ExpiredSignatureError
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# Custo do bcrypt. Hashes com custo diferente são refeitos no próximo login (ver verificar_senha_no_pool).
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+pwd_context = CryptContext(
+    schemes=['bcrypt'],
+    deprecated='auto',
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    # min = max = padrão: qualquer hash com outro custo é marcado como "precisa atualizar"
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 SECRET_KEY = "chave_secreta"
 ALGORITHM = "HS256"
@@ -49,6 +62,78 @@ def gerar_senha(senha: str):
 def verificar_hash_senha(senha: str, senha_hash: str):
     return pwd_context.verify(senha, senha_hash)
 
+def _verificar_e_atualizar(senha: str, senha_hash: str):
+    return pwd_context.verify_and_update(senha, senha_hash)
+
+
+# ---------- Pool dedicado para o bcrypt ----------
+# O bcrypt leva dezenas de ms por hash. Rodando direto nas rotas, um pico de login ocupava todas
+# as threads do threadpool do Starlette com CPU e travava as outras rotas. Pelo pool, só
+# HASH_WORKERS hashes rodam juntos e no máximo HASH_FILA_MAX rotas ficam esperando; o resto é
+# recusado na hora (HashSobrecarregadoError -> 503 com Retry-After, ver main.py).
+# "thread" já dá paralelismo real (o bcrypt libera o GIL); "process" isola a CPU do worker.
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+# Threads do threadpool das rotas síncronas (o main.py aplica no limitador do anyio; 40 é o padrão dele)
+THREADPOOL_THREADS = int(os.getenv("THREADPOOL_THREADS", 40))
+# Threads do threadpool que as rotas de senha nunca podem ocupar (ficam para as outras rotas)
+HASH_FOLGA_THREADPOOL = int(os.getenv("HASH_FOLGA_THREADPOOL", 10))
+# Máximo de hashes em execução + na fila; acima disso a requisição é recusada na hora.
+# Cada rota esperando ocupa uma thread do threadpool, então o limite fica abaixo do tamanho dele
+HASH_FILA_MAX = max(1, min(int(os.getenv("HASH_FILA_MAX", HASH_WORKERS * 8)),
+                           THREADPOOL_THREADS - HASH_FOLGA_THREADPOOL))
+# segundos sugeridos ao cliente (Retry-After) quando a fila está cheia
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", 2))
+
+class HashSobrecarregadoError(Exception):
+    """Fila do pool de hash cheia: a requisição deve ser recusada em vez de esperar."""
+
+_hash_pool = None
+_hash_pendentes = 0
+# as rotas de senha são síncronas (rodam no threadpool), então o contador precisa de lock
+_hash_lock = threading.Lock()
+
+def _get_hash_pool():
+    global _hash_pool
+    with _hash_lock:
+        if _hash_pool is None:
+            if HASH_EXECUTOR == "process":
+                _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+            else:
+                _hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+        return _hash_pool
+
+def _executar_hash(funcao, *args):
+    """Roda `funcao` no pool de hash e espera o resultado na thread da rota.
+    As rotas que chamam isto são `def`: a espera ocupa uma thread do threadpool, não o event
+    loop. HASH_FILA_MAX fica HASH_FOLGA_THREADPOOL threads abaixo de THREADPOOL_THREADS, então
+    mesmo com a fila cheia sobram threads para as outras rotas síncronas."""
+    global _hash_pendentes
+    with _hash_lock:
+        if _hash_pendentes >= HASH_FILA_MAX:
+            raise HashSobrecarregadoError("Muitas operações de senha em andamento")
+        _hash_pendentes += 1
+    try:
+        return _get_hash_pool().submit(funcao, *args).result()
+    finally:
+        with _hash_lock:
+            _hash_pendentes -= 1
+
+def gerar_senha_no_pool(senha: str):
+    return _executar_hash(gerar_senha, senha)
+
+def verificar_senha_no_pool(senha: str, senha_hash: str):
+    """Retorna (valida, novo_hash). `novo_hash` vem preenchido quando o hash salvo usa um custo
+    diferente de BCRYPT_ROUNDS e deve ser gravado no lugar do antigo."""
+    return _executar_hash(_verificar_e_atualizar, senha, senha_hash)
+
+def encerrar_hash_pool():
+    global _hash_pool
+    with _hash_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=False, cancel_futures=True)
+            _hash_pool = None
+
 def criar_token(dados: dict):
     dados_token = dados.copy()
     expira = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN)
@@ -56,6 +141,33 @@ def criar_token(dados: dict):
     token_jwt = jwt.encode(dados_token, SECRET_KEY, algorithm=ALGORITHM)
     return token_jwt
 
+# Versão do formato das claims do token do cliente.
+# v1 (sem "ver"): {"sub": email, "is_admin": bool}
+# v2: {"ver": 2, "sub": email, "uid": id_cliente, "is_admin": bool}
+TOKEN_VERSAO = 2
+
+def criar_token_cliente(cliente):
+    """Token de login do cliente, com o id embutido para as rotas não precisarem consultar o banco."""
+    return criar_token({
+        "ver": TOKEN_VERSAO,
+        "sub": cliente.email,
+        "uid": cliente.id_cliente,
+        "is_admin": bool(cliente.is_admin)
+    })
+
+def ler_claims_cliente(payload: dict):
+    """Normaliza o payload de qualquer versão do token.
+    Tokens v1 não têm o id do cliente: nesse caso "id_cliente" vem como None."""
+    if not payload or not payload.get("sub"):
+        return None
+    versao = payload.get("ver", 1)
+    return {
+        "versao": versao,
+        "email": payload["sub"],
+        "id_cliente": payload.get("uid") if versao >= 2 else None,
+        "is_admin": bool(payload.get("is_admin"))
+    }
+
 def verificar_token(token: str):
     # Se não houver token, retorna None para permitir tratamento pelo chamador # coloca pois retonava o erro a o user 
     if not token:
@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+
+class CacheLRU:
+    """Cache em memória com limite de tamanho (LRU) e expiração por TTL. Seguro entre threads."""
+
+    def __init__(self, max_itens: int = 1024, ttl: float = 60.0):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._dados = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            registro = self._dados.get(chave, _AUSENTE)
+            if registro is _AUSENTE:
+                return padrao
+            expira_em, valor = registro
+            if expira_em < time.monotonic():
+                del self._dados[chave]
+                return padrao
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl: float = None):
+        """Guarda o valor; `ttl` substitui o TTL padrão só para esta chave."""
+        expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._dados[chave] = (expira_em, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def pop(self, chave, padrao=None):
+        with self._lock:
+            registro = self._dados.pop(chave, _AUSENTE)
+        return padrao if registro is _AUSENTE else registro[1]
+
+    def remover_se(self, condicao):
+        """Remove todas as entradas cujo valor satisfaz `condicao(valor)`."""
+        with self._lock:
+            for chave in [c for c, (_, v) in self._dados.items() if condicao(v)]:
+                del self._dados[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
@@ -0,0 +1,276 @@
+import json
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+from database import get_local_db, LOCAL_DB_PATH
+
+# Carrinhos abandonados expiram após 7 dias sem alteração
+CARRINHO_TTL = int(os.getenv("CARRINHO_TTL", 60 * 60 * 24 * 7))
+# Limite de carrinhos mantidos no backend em memória (os menos usados saem primeiro)
+CARRINHO_MAX_MEMORIA = int(os.getenv("CARRINHO_MAX_MEMORIA", 10000))
+# "sqlite" (padrão, compartilhado entre workers) ou "memoria" (um processo só)
+CARRINHO_BACKEND = os.getenv("CARRINHO_BACKEND", "sqlite")
+
+
+def para_centavos(valor) -> int:
+    """Converte um preço (Decimal/float/str em reais) para centavos inteiros."""
+    return int((Decimal(str(valor)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class ItemCarrinho:
+    """Linha do carrinho. O preço fica em centavos para não acumular erro de float."""
+    __slots__ = ("id", "nome", "preco_centavos", "quantidade", "imagem")
+
+    def __init__(self, id: int, nome: str, preco_centavos: int, quantidade: int, imagem: str = None):
+        self.id = id
+        self.nome = nome
+        self.preco_centavos = preco_centavos
+        self.quantidade = quantidade
+        self.imagem = imagem
+
+    @property
+    def preco(self) -> float:
+        return self.preco_centavos / 100
+
+    def para_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "nome": self.nome,
+            "preco": self.preco,
+            "quantidade": self.quantidade,
+            "imagem": self.imagem
+        }
+
+
+class Carrinho:
+    """Itens indexados pelo id do produto, com total e quantidade mantidos a cada alteração."""
+    __slots__ = ("itens", "total_centavos", "quantidade_total")
+
+    def __init__(self):
+        self.itens = {}  # id_produto -> ItemCarrinho (dict preserva a ordem de inserção)
+        self.total_centavos = 0
+        self.quantidade_total = 0
+
+    @property
+    def total(self) -> float:
+        return self.total_centavos / 100
+
+    def __iter__(self):
+        return iter(self.itens.values())
+
+    def __len__(self):
+        return len(self.itens)
+
+    def __bool__(self):
+        return bool(self.itens)
+
+    def get(self, id_produto: int):
+        return self.itens.get(id_produto)
+
+    def adicionar(self, id_produto: int, nome: str, preco, quantidade: int, imagem: str = None) -> ItemCarrinho:
+        """Soma a quantidade se o produto já está no carrinho; senão cria a linha."""
+        item = self.itens.get(id_produto)
+        if item is None:
+            item = ItemCarrinho(id_produto, nome, para_centavos(preco), 0, imagem)
+            self.itens[id_produto] = item
+        self._alterar_quantidade(item, item.quantidade + quantidade)
+        return item
+
+    def atualizar(self, id_produto: int, quantidade: int) -> bool:
+        """Define a quantidade de um produto (0 ou menos remove). Retorna False se não estiver no carrinho."""
+        item = self.itens.get(id_produto)
+        if item is None:
+            return False
+        self._alterar_quantidade(item, quantidade)
+        return True
+
+    def remover(self, id_produto: int) -> bool:
+        item = self.itens.get(id_produto)
+        if item is None:
+            return False
+        self._alterar_quantidade(item, 0)
+        return True
+
+    def _alterar_quantidade(self, item: ItemCarrinho, quantidade: int):
+        if quantidade <= 0:
+            quantidade = 0
+            del self.itens[item.id]
+        delta = quantidade - item.quantidade
+        self.quantidade_total += delta
+        self.total_centavos += delta * item.preco_centavos
+        item.quantidade = quantidade
+
+    def para_lista(self) -> list:
+        return [item.para_dict() for item in self.itens.values()]
+
+    def para_json(self) -> str:
+        # formato compacto: [id, nome, preco_centavos, quantidade, imagem]
+        return json.dumps(
+            [[i.id, i.nome, i.preco_centavos, i.quantidade, i.imagem] for i in self.itens.values()],
+            separators=(",", ":")
+        )
+
+    @classmethod
+    def de_json(cls, dados: str) -> "Carrinho":
+        carrinho = cls()
+        for id_produto, nome, preco_centavos, quantidade, imagem in json.loads(dados):
+            carrinho.itens[id_produto] = ItemCarrinho(id_produto, nome, preco_centavos, quantidade, imagem)
+            carrinho.total_centavos += preco_centavos * quantidade
+            carrinho.quantidade_total += quantidade
+        return carrinho
+
+
+class CartStore(ABC):
+    """Interface de armazenamento dos carrinhos, indexados pelo id_cliente."""
+
+    @abstractmethod
+    def obter(self, id_cliente: int) -> Carrinho:
+        ...
+
+    @abstractmethod
+    def salvar(self, id_cliente: int, carrinho: Carrinho) -> None:
+        ...
+
+    @abstractmethod
+    def limpar(self, id_cliente: int) -> None:
+        ...
+
+    @abstractmethod
+    def atualizar(self, id_cliente: int, alterar):
+        """Lê o carrinho, aplica `alterar(carrinho)` e grava, sem que outra requisição do mesmo
+        cliente grave no meio (dois cliques em "adicionar" não se perdem). Retorna o que
+        `alterar` retornar."""
+
+
+class MemoriaCartStore(CartStore):
+    """Carrinhos no próprio processo, com LRU limitado e expiração por TTL."""
+
+    def __init__(self, ttl: int = CARRINHO_TTL, max_itens: int = CARRINHO_MAX_MEMORIA):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._dados = OrderedDict()  # id_cliente -> (expira_em, carrinho)
+        self._lock = threading.Lock()
+
+    def obter(self, id_cliente: int) -> Carrinho:
+        with self._lock:
+            return self._obter(id_cliente)
+
+    def salvar(self, id_cliente: int, carrinho: Carrinho) -> None:
+        with self._lock:
+            self._salvar(id_cliente, carrinho)
+
+    def limpar(self, id_cliente: int) -> None:
+        with self._lock:
+            self._dados.pop(id_cliente, None)
+
+    def atualizar(self, id_cliente: int, alterar):
+        with self._lock:
+            carrinho = self._obter(id_cliente)
+            resultado = alterar(carrinho)
+            self._salvar(id_cliente, carrinho)
+            return resultado
+
+    # chamados com o lock já adquirido
+    def _obter(self, id_cliente: int) -> Carrinho:
+        registro = self._dados.get(id_cliente)
+        if registro is None:
+            return Carrinho()
+        expira_em, carrinho = registro
+        if expira_em < time.monotonic():
+            del self._dados[id_cliente]
+            return Carrinho()
+        self._dados.move_to_end(id_cliente)
+        return carrinho
+
+    def _salvar(self, id_cliente: int, carrinho: Carrinho) -> None:
+        self._dados[id_cliente] = (time.monotonic() + self.ttl, carrinho)
+        self._dados.move_to_end(id_cliente)
+        while len(self._dados) > self.max_itens:
+            self._dados.popitem(last=False)
+
+
+class SQLiteCartStore(CartStore):
+    """Carrinhos em um arquivo SQLite local, visível para todos os workers da máquina."""
+
+    # A limpeza dos carrinhos expirados roda a cada N gravações
+    LIMPEZA_A_CADA = 500
+
+    def __init__(self, caminho: str = LOCAL_DB_PATH, ttl: int = CARRINHO_TTL):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._gravacoes = 0
+        self._conexao().execute(
+            "CREATE TABLE IF NOT EXISTS carrinhos ("
+            " id_cliente INTEGER PRIMARY KEY,"
+            " itens TEXT NOT NULL,"
+            " atualizado_em REAL NOT NULL)"
+        )
+
+    def _conexao(self):
+        return get_local_db(self.caminho)
+
+    def obter(self, id_cliente: int) -> Carrinho:
+        return self._obter(self._conexao(), id_cliente)
+
+    def salvar(self, id_cliente: int, carrinho: Carrinho) -> None:
+        self._salvar(self._conexao(), id_cliente, carrinho)
+        self._contar_gravacao()
+
+    def limpar(self, id_cliente: int) -> None:
+        self._conexao().execute("DELETE FROM carrinhos WHERE id_cliente = ?", (id_cliente,))
+
+    def atualizar(self, id_cliente: int, alterar):
+        conexao = self._conexao()
+        # BEGIN IMMEDIATE trava a escrita já na leitura: outro worker que tente alterar o mesmo
+        # carrinho espera este COMMIT e lê a versão já alterada
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            carrinho = self._obter(conexao, id_cliente)
+            resultado = alterar(carrinho)
+            self._salvar(conexao, id_cliente, carrinho)
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+        self._contar_gravacao()
+        return resultado
+
+    def _obter(self, conexao, id_cliente: int) -> Carrinho:
+        linha = conexao.execute(
+            "SELECT itens FROM carrinhos WHERE id_cliente = ? AND atualizado_em >= ?",
+            (id_cliente, time.time() - self.ttl),
+        ).fetchone()
+        return Carrinho.de_json(linha[0]) if linha else Carrinho()
+
+    def _salvar(self, conexao, id_cliente: int, carrinho: Carrinho) -> None:
+        if not carrinho:
+            conexao.execute("DELETE FROM carrinhos WHERE id_cliente = ?", (id_cliente,))
+            return
+        conexao.execute(
+            "INSERT INTO carrinhos (id_cliente, itens, atualizado_em) VALUES (?, ?, ?) "
+            "ON CONFLICT(id_cliente) DO UPDATE SET itens = excluded.itens, atualizado_em = excluded.atualizado_em",
+            (id_cliente, carrinho.para_json(), time.time()),
+        )
+
+    def _contar_gravacao(self) -> None:
+        self._gravacoes += 1
+        if self._gravacoes % self.LIMPEZA_A_CADA == 0:
+            self.remover_expirados()
+
+    def remover_expirados(self) -> None:
+        self._conexao().execute("DELETE FROM carrinhos WHERE atualizado_em < ?", (time.time() - self.ttl,))
+
+
+def criar_cart_store(backend: str = CARRINHO_BACKEND) -> CartStore:
+    if backend == "memoria":
+        return MemoriaCartStore()
+    if backend == "sqlite":
+        return SQLiteCartStore()
+    raise ValueError(f"Backend de carrinho desconhecido: {backend}")
+
+
+# instância única usada por todas as rotas
+carrinho_store = criar_cart_store()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+from cache import CacheLRU
+from database import get_local_db, LOCAL_DB_PATH
+
+# Cache das consultas de CEP (geolocalização e endereço do ViaCEP) em dois níveis:
+# memória do processo (LRU) na frente de uma tabela no SQLite local, compartilhada entre
+# os workers e preservada entre reinícios. CEPs que não existem também são guardados
+# (cache negativo), por menos tempo, para não repetir a consulta a cada tentativa.
+# get/set são async: a memória responde direto, e o SQLite (leitura quando a memória não tem,
+# gravação sempre) roda numa thread, porque pode esperar pelo lock de outro worker.
+
+# CEP -> coordenadas muda raramente
+CEP_CACHE_TTL = int(os.getenv("CEP_CACHE_TTL", 60 * 60 * 24 * 30))
+# CEP inexistente/sem resultado: tempo menor, caso a base dos serviços seja atualizada
+CEP_CACHE_TTL_NEGATIVO = int(os.getenv("CEP_CACHE_TTL_NEGATIVO", 60 * 60 * 6))
+CEP_CACHE_MAX_MEMORIA = int(os.getenv("CEP_CACHE_MAX_MEMORIA", 20000))
+
+# retornado por CacheCEP.get quando o CEP não está no cache (None significa "CEP sem resultado")
+AUSENTE = object()
+
+_RE_NAO_DIGITO = re.compile(r"\D")
+
+
+def limpar_cep(cep: str):
+    """Retorna só os 8 dígitos do CEP, ou None se o formato for inválido."""
+    digitos = _RE_NAO_DIGITO.sub("", cep or "")
+    return digitos if len(digitos) == 8 else None
+
+
+class CacheCEP:
+
+    # A limpeza das entradas expiradas roda a cada N gravações
+    LIMPEZA_A_CADA = 500
+
+    def __init__(self, caminho: str = LOCAL_DB_PATH, max_memoria: int = CEP_CACHE_MAX_MEMORIA):
+        self.caminho = caminho
+        self._memoria = CacheLRU(max_itens=max_memoria, ttl=CEP_CACHE_TTL)
+        self._gravacoes = 0
+        self._conexao().execute(
+            "CREATE TABLE IF NOT EXISTS cep_cache ("
+            " tipo TEXT NOT NULL,"
+            " cep TEXT NOT NULL,"
+            " valor TEXT,"
+            " expira_em REAL NOT NULL,"
+            " PRIMARY KEY (tipo, cep))"
+        )
+
+    def _conexao(self):
+        return get_local_db(self.caminho)
+
+    async def get(self, tipo: str, cep: str):
+        """Valor guardado para (tipo, cep); None se o CEP foi marcado sem resultado; AUSENTE se não há cache."""
+        valor = self._memoria.get((tipo, cep), AUSENTE)
+        if valor is not AUSENTE:
+            return valor
+        return await asyncio.to_thread(self._ler, tipo, cep)
+
+    async def get_varios(self, tipo: str, ceps: list) -> list:
+        """Como get para vários CEPs, com uma só ida à thread para os que não estão na memória."""
+        valores = [self._memoria.get((tipo, cep), AUSENTE) for cep in ceps]
+        faltando = [i for i, valor in enumerate(valores) if valor is AUSENTE]
+        if faltando:
+            lidos = await asyncio.to_thread(lambda: [self._ler(tipo, ceps[i]) for i in faltando])
+            for i, valor in zip(faltando, lidos):
+                valores[i] = valor
+        return valores
+
+    def _ler(self, tipo: str, cep: str):
+        """Segundo nível (SQLite): bloqueante, roda fora do event loop."""
+        agora = time.time()
+        try:
+            linha = self._conexao().execute(
+                "SELECT valor, expira_em FROM cep_cache WHERE tipo = ? AND cep = ? AND expira_em > ?",
+                (tipo, cep, agora),
+            ).fetchone()
+        except sqlite3.Error as e:
+            # o cache nunca pode impedir o cálculo do frete: trata como ausente
+            print(f"Erro ao ler cache de CEP: {e}")
+            return AUSENTE
+        if not linha:
+            return AUSENTE
+        valor = json.loads(linha[0]) if linha[0] is not None else None
+        self._memoria.set((tipo, cep), valor, ttl=linha[1] - agora)
+        return valor
+
+    async def set(self, tipo: str, cep: str, valor, ttl: float = None):
+        """Guarda o resultado; `valor=None` registra o CEP como sem resultado (TTL negativo)."""
+        if ttl is None:
+            ttl = CEP_CACHE_TTL if valor is not None else CEP_CACHE_TTL_NEGATIVO
+        self._memoria.set((tipo, cep), valor, ttl=ttl)
+        await asyncio.to_thread(self._gravar, tipo, cep, valor, ttl)
+
+    def _gravar(self, tipo: str, cep: str, valor, ttl: float):
+        try:
+            self._conexao().execute(
+                "INSERT INTO cep_cache (tipo, cep, valor, expira_em) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(tipo, cep) DO UPDATE SET valor = excluded.valor, expira_em = excluded.expira_em",
+                (tipo, cep, json.dumps(valor) if valor is not None else None, time.time() + ttl),
+            )
+            self._gravacoes += 1
+            if self._gravacoes % self.LIMPEZA_A_CADA == 0:
+                self.remover_expirados()
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar cache de CEP: {e}")
+
+    def remover_expirados(self) -> None:
+        self._conexao().execute("DELETE FROM cep_cache WHERE expira_em <= ?", (time.time(),))
+
+
+# instância única do processo
+cache_cep = CacheCEP()
@@ -0,0 +1,39 @@
+import os
+import httpx
+
+# Cliente HTTP único da aplicação para as APIs externas (Nominatim, ViaCEP).
+# Reaproveita as conexões (keep-alive) entre requisições em vez de abrir uma conexão
+# TCP+TLS nova a cada consulta. É criado e fechado no lifespan do FastAPI (main.py).
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10.0))
+HTTP_MAX_CONEXOES = int(os.getenv("HTTP_MAX_CONEXOES", 50))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+
+HEADERS = {"User-Agent": "Ecommerce-4linhas/1.0", "Accept-Language": "pt-BR"}
+
+_cliente = None
+
+
+def iniciar_cliente_http() -> httpx.AsyncClient:
+    global _cliente
+    if _cliente is None or _cliente.is_closed:
+        _cliente = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONEXOES, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            headers=HEADERS,
+        )
+    return _cliente
+
+
+def obter_cliente_http() -> httpx.AsyncClient:
+    """Cliente compartilhado. Fora do servidor (scripts) é criado na primeira chamada."""
+    if _cliente is None or _cliente.is_closed:
+        return iniciar_cliente_http()
+    return _cliente
+
+
+async def encerrar_cliente_http():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
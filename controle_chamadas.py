@@ -0,0 +1,172 @@
+import asyncio
+import sqlite3
+import time
+import httpx
+from database import get_local_db
+from cliente_http import obter_cliente_http
+
+# Controle das chamadas às APIs externas:
+# - ChamadaUnica: requisições simultâneas pela mesma chave (ex.: mesmo CEP) esperam uma
+#   única chamada em andamento em vez de cada uma consultar o serviço
+# - LimiteTaxa: balde de fichas compartilhado entre os workers pelo SQLite local
+#   (o Nominatim público permite no máximo 1 requisição por segundo)
+# - Disjuntor (circuit breaker): depois de várias falhas seguidas o serviço é dado como fora
+#   do ar por um tempo e as chamadas falham na hora, em vez de esperar o timeout cada uma
+# - ServicoExterno: junta limite de taxa, limite de chamadas simultâneas, timeout e disjuntor
+
+
+class LimiteTaxaExcedido(Exception):
+    """A espera por uma vaga no limite de taxa passaria do máximo permitido."""
+    pass
+
+
+class ServicoIndisponivel(Exception):
+    """O disjuntor do serviço está aberto (muitas falhas recentes)."""
+    pass
+
+
+class ChamadaUnica:
+    """Agrupa chamadas assíncronas simultâneas com a mesma chave em uma só."""
+
+    def __init__(self):
+        self._em_andamento = {}  # chave -> asyncio.Task
+
+    async def executar(self, chave, funcao):
+        """Executa `funcao()` (corrotina) ou espera a execução já em andamento para a chave."""
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(funcao())
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda t: self._finalizar(chave, t))
+        # shield: se quem iniciou for cancelado, os outros que esperam continuam recebendo o resultado
+        return await asyncio.shield(tarefa)
+
+    def _finalizar(self, chave, tarefa):
+        if self._em_andamento.get(chave) is tarefa:
+            del self._em_andamento[chave]
+        if not tarefa.cancelled():
+            tarefa.exception()  # marca o erro como lido mesmo se ninguém mais estiver esperando
+
+
+class LimiteTaxa:
+    """Balde de fichas (`taxa` por segundo, até `capacidade` acumuladas), implementado como GCRA:
+    guarda no SQLite local o horário teórico da próxima chamada, então vale para todos os workers."""
+
+    def __init__(self, nome: str, taxa: float, capacidade: int = 1, espera_maxima: float = 5.0):
+        self.nome = nome
+        self.intervalo = 1.0 / taxa
+        self.tolerancia = (capacidade - 1) * self.intervalo
+        self.espera_maxima = espera_maxima
+        get_local_db().execute(
+            "CREATE TABLE IF NOT EXISTS limites_taxa (nome TEXT PRIMARY KEY, proximo REAL NOT NULL)"
+        )
+
+    def _reservar(self) -> float:
+        """Reserva a próxima vaga e retorna quantos segundos esperar por ela."""
+        conexao = get_local_db()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            linha = conexao.execute("SELECT proximo FROM limites_taxa WHERE nome = ?", (self.nome,)).fetchone()
+            agora = time.time()
+            proximo = max(linha[0] if linha else 0.0, agora)
+            espera = max(0.0, proximo - self.tolerancia - agora)
+            if espera > self.espera_maxima:
+                conexao.execute("ROLLBACK")
+                raise LimiteTaxaExcedido(f"{self.nome}: fila de {espera:.1f}s")
+            conexao.execute(
+                "INSERT INTO limites_taxa (nome, proximo) VALUES (?, ?) "
+                "ON CONFLICT(nome) DO UPDATE SET proximo = excluded.proximo",
+                (self.nome, proximo + self.intervalo),
+            )
+            conexao.execute("COMMIT")
+        except sqlite3.Error:
+            conexao.execute("ROLLBACK")
+            raise
+        return espera
+
+    async def aguardar(self):
+        try:
+            # BEGIN IMMEDIATE pode esperar o lock de outro worker: roda fora do event loop
+            espera = await asyncio.to_thread(self._reservar)
+        except sqlite3.Error as e:
+            # sem como reservar a vaga (ex.: banco local travado): não arrisca passar do limite
+            raise LimiteTaxaExcedido(f"{self.nome}: {e}") from e
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+
+class Disjuntor:
+    """Abre após `falhas_para_abrir` falhas seguidas e fica aberto por `tempo_aberto` segundos.
+    Depois disso deixa passar uma chamada de teste: se ela funcionar, fecha de novo."""
+
+    def __init__(self, falhas_para_abrir: int = 5, tempo_aberto: float = 30.0):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.tempo_aberto = tempo_aberto
+        self._falhas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+
+    def esta_aberto(self) -> bool:
+        """True se verificar() recusaria a chamada agora (aberto ou com a chamada de teste em
+        andamento), sem reservar a chamada de teste."""
+        if self._falhas < self.falhas_para_abrir:
+            return False
+        return time.monotonic() < self._aberto_ate or self._testando
+
+    def verificar(self, nome: str):
+        """Levanta ServicoIndisponivel se a chamada não deve ser feita agora."""
+        if self._falhas < self.falhas_para_abrir:
+            return
+        if time.monotonic() < self._aberto_ate or self._testando:
+            raise ServicoIndisponivel(f"{nome} indisponível no momento")
+        self._testando = True
+
+    def registrar_sucesso(self):
+        self._falhas = 0
+        self._testando = False
+
+    def registrar_falha(self):
+        self._falhas += 1
+        self._testando = False
+        if self._falhas >= self.falhas_para_abrir:
+            self._aberto_ate = time.monotonic() + self.tempo_aberto
+
+    def cancelar_teste(self):
+        self._testando = False
+
+
+class ServicoExterno:
+    """GET no cliente HTTP compartilhado respeitando os limites do serviço.
+    Erros de rede, timeouts, 5xx e 429 contam como falha para o disjuntor."""
+
+    def __init__(self, nome: str, max_simultaneas: int, limite_taxa: LimiteTaxa = None,
+                 timeout: float = None, disjuntor: Disjuntor = None):
+        self.nome = nome
+        self.limite_taxa = limite_taxa
+        self.timeout = timeout
+        self.disjuntor = disjuntor or Disjuntor()
+        self._semaforo = asyncio.Semaphore(max_simultaneas)
+
+    async def get(self, url: str, **kwargs):
+        # falha rápido se o serviço já está fora, antes de ocupar uma vaga do limite de taxa
+        if self.disjuntor.esta_aberto():
+            raise ServicoIndisponivel(f"{self.nome} indisponível no momento")
+        if self.limite_taxa is not None:
+            await self.limite_taxa.aguardar()
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        async with self._semaforo:
+            self.disjuntor.verificar(self.nome)
+            try:
+                resposta = await obter_cliente_http().get(url, **kwargs)
+            except httpx.RequestError:
+                self.disjuntor.registrar_falha()
+                raise
+            except BaseException:
+                self.disjuntor.cancelar_teste()
+                raise
+            if resposta.status_code >= 500 or resposta.status_code == 429:
+                self.disjuntor.registrar_falha()
+            else:
+                self.disjuntor.registrar_sucesso()
+            return resposta
@@ -4,11 +4,13 @@ from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os, shutil
+from sqlalchemy import select, func, or_
 from sqlalchemy.orm import Session
 from database import get_db, SessionLocal
 from models.models import *
 from models.models import Clientes, Produtos, Pedidos
 from auth import *
+from controllers.catalogo_indice import indice_catalogo
 
 router = APIRouter() # rotas
 templates = Jinja2Templates(directory="templates") # front-end
@@ -16,9 +18,6 @@ templates = Jinja2Templates(directory="templates") # front-end
 # Configuração dos arquivos estáticos
 router.mount("/static/upload/img", StaticFiles(directory="static/upload/img"), name="static")
 
-# carrinho simples em memória
-carrinhos = {}
-
 UPLOAD_DIR = '../static/upload/img'
 # caminho para o os
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -44,16 +43,21 @@ def pagina_admin(request:Request, db:Session=Depends(get_db)):
     if not payload or not payload.get("is_admin"):
         return RedirectResponse(url="/", status_code=303)
     
-    # Buscar dados necessários
-    produtos = db.query(Produtos).all()
-    pedidos = db.query(Pedidos).all()
-    clientes = db.query(Clientes).all()
-    
+    # Contadores do painel direto no banco (uma consulta com COUNTs). As tabelas de produtos,
+    # pedidos e clientes são carregadas pelo JS em páginas, pelas rotas /api/admin/* abaixo.
+    total_produtos, total_pedidos, total_clientes = db.query(
+        select(func.count(Produtos.id_produto)).scalar_subquery(),
+        select(func.count(Pedidos.id_pedido)).scalar_subquery(),
+        select(func.count(Clientes.id_cliente)).scalar_subquery(),
+    ).one()
+    status_pedidos = [status for (status,) in db.query(Pedidos.status).distinct().order_by(Pedidos.status)]
+
     return templates.TemplateResponse("pages/admin/admin.html", {
         "request": request,
-        "produtos": produtos,
-        "pedidos": pedidos,
-        "clientes": clientes
+        "total_produtos": total_produtos,
+        "total_pedidos": total_pedidos,
+        "total_clientes": total_clientes,
+        "status_pedidos": status_pedidos
     })
 
 #Rota criar produto
@@ -93,6 +97,7 @@ def criar_produto(request: Request,
     db.add(novo_produto)
     db.commit()
     db.refresh(novo_produto)
+    indice_catalogo.atualizar_produto(novo_produto)
     return RedirectResponse(url="/admin", status_code=303)
 
 
@@ -148,6 +153,7 @@ def atualizar_produto(id: int,
     
     db.commit()
     db.refresh(produto)
+    indice_catalogo.atualizar_produto(produto)
     return RedirectResponse(url="/admin", status_code=303)
 
 
@@ -163,6 +169,160 @@ def deletar_produto(id: int, request: Request, db: Session = Depends(get_db)): #
     if produto:
         db.delete(produto)
         db.commit()
+        indice_catalogo.remover_produto(id)
     return RedirectResponse(url="/admin", status_code=303)
 
+# ---------- API do painel (tabelas paginadas com filtro no servidor) ----------
+# Paginação por cursor: lista do id mais novo para o mais antigo e o cursor é o último id
+# devolvido (WHERE id < cursor ORDER BY id DESC LIMIT n), sem OFFSET.
+
+ADMIN_POR_PAGINA = 20
+
+def _erro_admin_api(request: Request):
+    """Resposta de erro se quem chama não é admin; None se for."""
+    payload = verificar_token(request.cookies.get("token"))
+    if not payload:
+        return JSONResponse({"success": False, "msg": "Usuário não autenticado"}, status_code=401)
+    if not payload.get("is_admin"):
+        return JSONResponse({"success": False, "msg": "Acesso restrito a administradores"}, status_code=403)
+    return None
+
+def _escapar_like(texto: str) -> str:
+    """Escapa os curingas do LIKE ("%" e "_") para a busca casar o texto digitado literalmente
+    (usar com escape="\\")."""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _pagina_por_id(query, coluna_id, cursor, limite):
+    if cursor:
+        query = query.filter(coluna_id < cursor)
+    # busca um a mais só para saber se existe próxima página
+    linhas = query.order_by(coluna_id.desc()).limit(limite + 1).all()
+    return linhas[:limite], len(linhas) > limite
+
+@router.get("/api/admin/produtos")
+def api_admin_produtos(
+    request: Request,
+    q: str = Query(None, max_length=100),
+    cursor: int = None,
+    limite: int = Query(ADMIN_POR_PAGINA, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    erro = _erro_admin_api(request)
+    if erro:
+        return erro
+
+    q = (q or "").strip()
+    if q.isdigit():
+        query = db.query(Produtos).filter(Produtos.id_produto == int(q))
+        produtos, tem_mais = _pagina_por_id(query, Produtos.id_produto, cursor, limite)
+    elif q:
+        # mesma busca do catálogo (índice em memória: sem acento, por pedaço de palavra)
+        indice_catalogo.garantir_atualizado()
+        ids = sorted(indice_catalogo.buscar(q), reverse=True)
+        if cursor:
+            ids = [i for i in ids if i < cursor]
+        tem_mais = len(ids) > limite
+        ids = ids[:limite]
+        produtos = db.query(Produtos).filter(Produtos.id_produto.in_(ids)).order_by(Produtos.id_produto.desc()).all() if ids else []
+    else:
+        produtos, tem_mais = _pagina_por_id(db.query(Produtos), Produtos.id_produto, cursor, limite)
+
+    return {
+        "produtos": [
+            {
+                "id_produto": p.id_produto,
+                "nome": p.nome,
+                "descricao": p.descricao,
+                "preco": float(p.preco),
+                "tamanho": p.tamanho,
+                "cor": p.cor,
+                "estoque": p.estoque,
+                "imagens": [p.imagem_caminho, p.imagem_caminho1, p.imagem_caminho2, p.imagem_caminho3]
+            }
+            for p in produtos
+        ],
+        "proximo_cursor": produtos[-1].id_produto if tem_mais else None
+    }
+
+@router.get("/api/admin/pedidos")
+def api_admin_pedidos(
+    request: Request,
+    q: str = Query(None, max_length=100),
+    status: str = None,
+    cursor: int = None,
+    limite: int = Query(ADMIN_POR_PAGINA, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    erro = _erro_admin_api(request)
+    if erro:
+        return erro
+
+    query = (
+        db.query(Pedidos, Clientes.nome, Clientes.email)
+        .outerjoin(Clientes, Clientes.id_cliente == Pedidos.id_cliente)
+    )
+    if status:
+        query = query.filter(Pedidos.status == status)
+    q = (q or "").strip()
+    if q.isdigit():
+        query = query.filter(Pedidos.id_pedido == int(q))
+    elif q:
+        # Só pelo começo do nome ou do e-mail: "texto%" usa os índices de clientes.nome e
+        # clientes.email. Com "%texto%" o MySQL lê a tabela clientes inteira a cada tecla; para
+        # buscar no meio do texto seria preciso um índice FULLTEXT (parser ngram) e MATCH ... AGAINST.
+        inicio = f"{_escapar_like(q)}%"
+        query = query.filter(or_(Clientes.nome.like(inicio, escape="\\"), Clientes.email.like(inicio, escape="\\")))
+    linhas, tem_mais = _pagina_por_id(query, Pedidos.id_pedido, cursor, limite)
+
+    return {
+        "pedidos": [
+            {
+                "id_pedido": pedido.id_pedido,
+                "cliente": nome,
+                "email": email,
+                "valor_total": pedido.valor_total,
+                "data_pedido": pedido.data_pedido,
+                "status": pedido.status
+            }
+            for pedido, nome, email in linhas
+        ],
+        "proximo_cursor": linhas[-1][0].id_pedido if tem_mais else None
+    }
+
+@router.get("/api/admin/clientes")
+def api_admin_clientes(
+    request: Request,
+    q: str = Query(None, max_length=100),
+    cursor: int = None,
+    limite: int = Query(ADMIN_POR_PAGINA, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    erro = _erro_admin_api(request)
+    if erro:
+        return erro
+
+    query = db.query(Clientes)
+    q = (q or "").strip()
+    if q.isdigit():
+        # id do cliente ou começo do CPF
+        query = query.filter(or_(Clientes.id_cliente == int(q), Clientes.cpf.like(f"{q}%")))
+    elif q:
+        trecho = f"%{_escapar_like(q)}%"
+        query = query.filter(or_(Clientes.nome.like(trecho, escape="\\"), Clientes.email.like(trecho, escape="\\")))
+    clientes, tem_mais = _pagina_por_id(query, Clientes.id_cliente, cursor, limite)
+
+    return {
+        "clientes": [
+            {
+                "id_cliente": c.id_cliente,
+                "nome": c.nome,
+                "email": c.email,
+                "telefone": c.telefone,
+                "is_admin": bool(c.is_admin)
+            }
+            for c in clientes
+        ],
+        "proximo_cursor": clientes[-1].id_cliente if tem_mais else None
+    }
+
 #--------------------------------------------------------FIM DAS AÇÕES DE UM ADMIN------------------------------------------------------------------------
\ No newline at end of file
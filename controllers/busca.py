@@ -0,0 +1,333 @@
+import re
+import time
+import unicodedata
+import bisect
+
+# Busca de produtos em memória (índice invertido).
+# - normalização sem acento e sem maiúsculas: "Tênis" e "tenis" viram o mesmo termo
+# - cada termo aponta para os produtos que o contêm, com peso pelo campo de origem
+# - trigramas do vocabulário permitem achar termos por pedaço ("cami" -> "camisa", "fit" -> "dryfit")
+
+# peso de cada campo no ranking
+PESOS_CAMPOS = {"nome": 3.0, "cor": 2.0, "tamanho": 1.0, "descricao": 1.0}
+# termos parciais pontuam menos que o termo exato
+PESO_PARCIAL = 0.5
+TAMANHO_GRAMA = 3
+# Pedaços curtos casam com termos muito comuns ("ret" -> "retro", "preto", "concreto"...). Os
+# termos parciais entram do mais parecido com o token (mais curto) para o menos, no empate o de
+# menos produtos primeiro, e param de entrar quando já somam esse tanto de produtos: o primeiro
+# sempre entra, o termo exato nunca é cortado. Assim o custo de uma busca por pedaço não cresce
+# com o catálogo inteiro.
+MAX_PRODUTOS_PARCIAIS = 5000
+
+_RE_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto: str) -> str:
+    """Remove acentos e converte para minúsculas ("Tênis Ação" -> "tenis acao")."""
+    if not texto:
+        return ""
+    if texto.isascii():
+        return texto.casefold()  # sem acentos para remover
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def tokenizar(texto: str) -> list:
+    return _RE_TOKEN.findall(normalizar(texto))
+
+
+def _gramas(termo: str) -> set:
+    return {termo[i:i + TAMANHO_GRAMA] for i in range(len(termo) - TAMANHO_GRAMA + 1)}
+
+
+class IndiceBusca:
+    """Índice invertido termo -> {id_produto: peso}. Não é thread-safe: o IndiceCatalogo serializa o acesso."""
+
+    def __init__(self):
+        self._postings = {}     # termo -> {id_produto: peso}
+        self._termos_doc = {}   # id_produto -> {termo: peso} (para remover/atualizar)
+        self._por_grama = {}    # trigrama -> set(termos)
+        self._vocabulario = []  # termos ordenados (busca por prefixo curto)
+        self._em_carga = False
+
+    def iniciar_carga(self):
+        """Carga em massa (índice novo): os termos são ordenados uma vez só em concluir_carga.
+        Durante a carga só pode indexar, não remover nem buscar."""
+        self._em_carga = True
+
+    def concluir_carga(self):
+        self._vocabulario.sort()
+        self._em_carga = False
+
+    def indexar(self, id_produto: int, campos: dict):
+        """Indexa (ou reindexa) um produto. `campos` = {"nome": ..., "descricao": ..., ...}."""
+        self.remover(id_produto)
+        termos = {}
+        for campo, texto in campos.items():
+            peso = PESOS_CAMPOS.get(campo, 1.0)
+            for termo in tokenizar(texto):
+                termos[termo] = termos.get(termo, 0.0) + peso
+        self._termos_doc[id_produto] = termos
+        for termo, peso in termos.items():
+            postings = self._postings.get(termo)
+            if postings is None:
+                postings = self._postings[termo] = {}
+                self._adicionar_ao_vocabulario(termo)
+            postings[id_produto] = peso
+
+    def remover(self, id_produto: int):
+        termos = self._termos_doc.pop(id_produto, None)
+        if not termos:
+            return
+        for termo in termos:
+            postings = self._postings.get(termo)
+            if postings is None:
+                continue
+            postings.pop(id_produto, None)
+            if not postings:
+                del self._postings[termo]
+                self._remover_do_vocabulario(termo)
+
+    def buscar(self, consulta: str) -> list:
+        """Ids dos produtos que contêm todos os termos da consulta, do mais relevante para o menos."""
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return []
+        pontuacao = None
+        for token in dict.fromkeys(tokens):
+            pontos_token = self._pontuar(token)
+            if pontuacao is None:
+                pontuacao = pontos_token
+            else:
+                # todos os termos precisam aparecer no produto
+                pontuacao = {i: p + pontos_token[i] for i, p in pontuacao.items() if i in pontos_token}
+            if not pontuacao:
+                return []
+        # maior pontuação primeiro; no empate, o id maior (mais recente). Duas ordenações com
+        # chave em C (a segunda é estável) em vez de uma com tupla montada por lambda
+        ids = sorted(pontuacao, reverse=True)
+        ids.sort(key=pontuacao.__getitem__, reverse=True)
+        return ids
+
+    def _pontuar(self, token: str) -> dict:
+        """{id_produto: pontos} dos produtos que casam com o token (o melhor termo de cada produto)."""
+        pontos_token = {}
+        parciais = 0
+        expandidos = sorted(self._expandir(token), key=lambda t: (-t[1], len(self._postings[t[0]]), t[0]))
+        for termo, fator in expandidos:
+            postings = self._postings[termo]
+            if fator < 1.0:
+                if parciais and parciais + len(postings) > MAX_PRODUTOS_PARCIAIS:
+                    break
+                parciais += len(postings)
+            if not pontos_token:
+                pontos_token = {i: peso * fator for i, peso in postings.items()}
+                continue
+            for id_produto, peso in postings.items():
+                pontos = peso * fator
+                if pontos > pontos_token.get(id_produto, 0.0):
+                    pontos_token[id_produto] = pontos
+        return pontos_token
+
+    def _expandir(self, token: str):
+        """Termos do vocabulário que casam com o token, com o fator de pontuação de cada um."""
+        encontrados = []
+        if token in self._postings:
+            encontrados.append((token, 1.0))
+        if len(token) < TAMANHO_GRAMA:
+            # token curto: só prefixo, pela lista ordenada
+            inicio = bisect.bisect_left(self._vocabulario, token)
+            for termo in self._vocabulario[inicio:]:
+                if not termo.startswith(token):
+                    break
+                if termo != token:
+                    encontrados.append((termo, PESO_PARCIAL * len(token) / len(termo)))
+            return encontrados
+        candidatos = None
+        for grama in _gramas(token):
+            termos = self._por_grama.get(grama)
+            if not termos:
+                return encontrados
+            candidatos = set(termos) if candidatos is None else candidatos & termos
+        for termo in candidatos or ():
+            if termo != token and token in termo:
+                encontrados.append((termo, PESO_PARCIAL * len(token) / len(termo)))
+        return encontrados
+
+    def _adicionar_ao_vocabulario(self, termo: str):
+        if self._em_carga:
+            self._vocabulario.append(termo)
+        else:
+            bisect.insort(self._vocabulario, termo)
+        for grama in _gramas(termo):
+            self._por_grama.setdefault(grama, set()).add(termo)
+
+    def _remover_do_vocabulario(self, termo: str):
+        posicao = bisect.bisect_left(self._vocabulario, termo)
+        if posicao < len(self._vocabulario) and self._vocabulario[posicao] == termo:
+            del self._vocabulario[posicao]
+        for grama in _gramas(termo):
+            termos = self._por_grama.get(grama)
+            if termos is not None:
+                termos.discard(termo)
+                if not termos:
+                    del self._por_grama[grama]
+
+
+# ---------- Sugestões (autocomplete) ----------
+# Lista ordenada de chaves normalizadas com bisect: cada nome de produto entra uma vez
+# para cada início de palavra ("Camisa Polo" -> "camisa polo" e "polo"), assim digitar
+# "pol" também sugere "Camisa Polo". Buscas feitas no catálogo que trouxeram resultado
+# entram como sugestões populares.
+# Prefixos com poucas chaves são ranqueados percorrendo a faixa alfabética inteira. Prefixos
+# curtos em catálogo grande ("c" casa com dezenas de milhares de chaves) usam a lista de todas
+# as sugestões ordenada por peso: as primeiras que casam com o prefixo são as mais pesadas da
+# faixa. Essa ordem é refeita a cada REORDENAR_SUGESTOES_A_CADA segundos; o ranking final usa
+# os pesos atuais. Limite conhecido desse caminho: entre sugestões de mesmo peso, os primeiros
+# candidatos são os textos mais curtos, então uma sugestão do meio do nome pode aparecer no
+# lugar de uma (mais longa) do início do nome. O peso nunca é ignorado.
+
+MAX_BUSCAS_POPULARES = 2000
+# acima dessa quantidade de chaves na faixa do prefixo, usa a ordem por peso
+MAX_CANDIDATOS_SUGESTAO = 500
+REORDENAR_SUGESTOES_A_CADA = 30.0
+# candidatos tirados da ordem por peso para o ranking final, por sugestão pedida
+CANDIDATOS_POR_SUGESTAO = 4
+
+
+class IndiceSugestoes:
+    """Não é thread-safe: o IndiceCatalogo serializa o acesso."""
+
+    def __init__(self):
+        self._sugestoes = {}  # texto normalizado -> [texto exibido, qtd de produtos, qtd de buscas]
+        self._chaves = []     # lista ordenada de (chave, texto normalizado)
+        self._qtd_buscas = 0
+        self._por_peso = []   # textos normalizados do mais pesado para o mais leve
+        self._ordenado_em = None
+        self._em_carga = False
+
+    def iniciar_carga(self):
+        """Carga em massa (índice novo): as chaves são ordenadas uma vez só em concluir_carga.
+        Durante a carga só pode adicionar nomes."""
+        self._em_carga = True
+
+    def concluir_carga(self):
+        self._chaves.sort()
+        self._em_carga = False
+
+    def adicionar_nome(self, nome: str):
+        normalizado = " ".join(tokenizar(nome))
+        if not normalizado:
+            return
+        sugestao = self._sugestoes.get(normalizado)
+        if sugestao is None:
+            self._sugestoes[normalizado] = [nome.strip(), 1, 0]
+            self._inserir_chaves(normalizado)
+        else:
+            if sugestao[1] == 0:
+                sugestao[0] = nome.strip()  # nome do produto tem preferência sobre o texto digitado
+            sugestao[1] += 1
+
+    def remover_nome(self, nome: str):
+        normalizado = " ".join(tokenizar(nome))
+        sugestao = self._sugestoes.get(normalizado)
+        if sugestao is None or sugestao[1] == 0:
+            return
+        sugestao[1] -= 1
+        if sugestao[1] == 0 and sugestao[2] == 0:
+            self._descartar(normalizado)
+
+    def registrar_busca(self, consulta: str):
+        normalizado = " ".join(tokenizar(consulta))
+        if not normalizado:
+            return
+        sugestao = self._sugestoes.get(normalizado)
+        if sugestao is None:
+            if self._qtd_buscas >= MAX_BUSCAS_POPULARES:
+                self._envelhecer_buscas()
+            self._sugestoes[normalizado] = [normalizado, 0, 1]
+            self._inserir_chaves(normalizado)
+            self._qtd_buscas += 1
+        else:
+            if sugestao[2] == 0:
+                self._qtd_buscas += 1
+            sugestao[2] += 1
+
+    def buscas_populares(self) -> dict:
+        return {normalizado: s[2] for normalizado, s in self._sugestoes.items() if s[2]}
+
+    def restaurar_buscas(self, buscas: dict):
+        for normalizado, quantidade in buscas.items():
+            self.registrar_busca(normalizado)
+            self._sugestoes[normalizado][2] = quantidade
+
+    def sugerir(self, prefixo: str, limite: int = 8) -> list:
+        """Até `limite` sugestões que começam (em alguma palavra) pelo prefixo, das mais buscadas
+        e com mais produtos para as menos; começo do nome e textos curtos vêm antes."""
+        prefixo = " ".join(tokenizar(prefixo))
+        if not prefixo:
+            return []
+        inicio = bisect.bisect_left(self._chaves, (prefixo, ""))
+        # primeira chave depois de todas as que começam pelo prefixo
+        fim = bisect.bisect_left(self._chaves, (prefixo[:-1] + chr(ord(prefixo[-1]) + 1), ""), inicio)
+        melhores = {}
+        if fim - inicio <= MAX_CANDIDATOS_SUGESTAO:
+            for chave, normalizado in self._chaves[inicio:fim]:
+                no_inicio = chave == normalizado
+                if melhores.get(normalizado) is not True:
+                    melhores[normalizado] = no_inicio
+        else:
+            maximo = limite * CANDIDATOS_POR_SUGESTAO
+            meio_de_palavra = " " + prefixo
+            for normalizado in self._ordem_por_peso():
+                no_inicio = normalizado.startswith(prefixo)
+                if (no_inicio or meio_de_palavra in normalizado) and normalizado in self._sugestoes:
+                    melhores[normalizado] = no_inicio
+                    if len(melhores) >= maximo:
+                        break
+
+        def relevancia(normalizado):
+            _, produtos, buscas = self._sugestoes[normalizado]
+            return (-(buscas * 2 + produtos), not melhores[normalizado], len(normalizado), normalizado)
+
+        return [self._sugestoes[n][0] for n in sorted(melhores, key=relevancia)[:limite]]
+
+    def _ordem_por_peso(self) -> list:
+        agora = time.monotonic()
+        if self._ordenado_em is None or agora - self._ordenado_em >= REORDENAR_SUGESTOES_A_CADA:
+            sugestoes = self._sugestoes
+            self._por_peso = sorted(
+                sugestoes, key=lambda n: (-(sugestoes[n][2] * 2 + sugestoes[n][1]), len(n), n))
+            self._ordenado_em = agora
+        return self._por_peso
+
+    def _inserir_chaves(self, normalizado: str):
+        for chave in self._chaves_de(normalizado):
+            if self._em_carga:
+                self._chaves.append((chave, normalizado))
+            else:
+                bisect.insort(self._chaves, (chave, normalizado))
+
+    def _descartar(self, normalizado: str):
+        del self._sugestoes[normalizado]
+        for chave in self._chaves_de(normalizado):
+            posicao = bisect.bisect_left(self._chaves, (chave, normalizado))
+            if posicao < len(self._chaves) and self._chaves[posicao] == (chave, normalizado):
+                del self._chaves[posicao]
+
+    def _envelhecer_buscas(self):
+        """Divide a contagem de buscas pela metade e descarta as que zeraram."""
+        for normalizado, sugestao in list(self._sugestoes.items()):
+            if sugestao[2] == 0:
+                continue
+            sugestao[2] //= 2
+            if sugestao[2] == 0:
+                if sugestao[1] == 0:
+                    self._descartar(normalizado)
+                self._qtd_buscas -= 1
+
+    @staticmethod
+    def _chaves_de(normalizado: str):
+        palavras = normalizado.split(" ")
+        return {" ".join(palavras[i:]) for i in range(len(palavras))}
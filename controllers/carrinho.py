@@ -1,15 +1,21 @@
 import requests
 from fastapi import APIRouter, Request, Form, UploadFile, File, Depends, HTTPException, Query, BackgroundTasks
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os, shutil
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 from database import get_db, SessionLocal
 from models.models import *
 from models.models import Clientes, Produtos, Pedidos , ItemPedido
 from auth import *
-from controllers.enviar_email import send_order_email
+from fila_emails import enfileirar_email, despachante_emails
+from controllers.frete import cotar_por_coordenadas, geocodificar_endereco, ler_cotacao
+from cep_cache import limpar_cep
+from controllers.cupom_indice import indice_cupons, registrar_uso_cupom
+from idempotencia import registro_idempotencia, chave_valida, EM_PROCESSAMENTO
 
 router = APIRouter() # rotas
 templates = Jinja2Templates(directory="templates") # front-end
@@ -17,8 +23,8 @@ templates = Jinja2Templates(directory="templates") # front-end
 # Configuração dos arquivos estáticos
 router.mount("/static", StaticFiles(directory="static"), name="static")
 
-# carrinho simples em memória
-carrinhos = {}
+# carrinhos compartilhados entre workers (ver carrinho_store.py)
+from carrinho_store import carrinho_store, Carrinho
 
 UPLOAD_DIR = '../static/upload/img'
 # caminho para o os
@@ -26,200 +32,108 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # ---------- Carrinho ----------
 
-# ---------- Função Auxiliar de Contexto (Adicionado por Gemini) ----------
-
-def get_user_from_token(request: Request, db: Session):
-    """Verifica o token no cookie e retorna o objeto do usuário se válido."""
-    token = request.cookies.get("token")
-    if not token:
-        return None
-    payload = verificar_token(token)
-    if not payload:
-        return None
-    email = payload.get("sub")
-    if not email:
-        return None
-    return db.query(Clientes).filter(Clientes.email == email).first()
-
-def get_base_context(request: Request, db: Session):
-    """Retorna o contexto base para os templates, incluindo o usuário."""
-    user = get_user_from_token(request, db)
-    return {"request": request, "user": user}
-
 # Import para usar 
 from controllers.cliente import *
+from controllers.sessao import get_user_from_token, get_base_context, usuario_atual, obter_usuario, UsuarioSessao
 
 # Rota para visualizar carrinho completo
 @router.get("/carrinho", response_class=HTMLResponse, name="carrinho")
-def ver_carrinho(request:Request, db:Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+def ver_carrinho(request:Request, usuario:UsuarioSessao = Depends(usuario_atual)):
+    if not usuario:
         return RedirectResponse(url="/login", status_code=303)
     
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    total = sum(item["preco"] * item["quantidade"] for item in carrinho)
-    
     # Exibir o carrinho dentro da página de perfil (aba Carrinho).
     # Redirecionamos para /perfil — a página de perfil monta o carrinho a partir do estado do servidor.
     return RedirectResponse(url="/perfil", status_code=303)
 
 # Rota para obter o conteúdo do carrinho (para o modal)
 @router.get("/carrinho/conteudo", response_class=HTMLResponse)
-def carrinho_conteudo(request:Request, db:Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+def carrinho_conteudo(request:Request, usuario:UsuarioSessao = Depends(usuario_atual)):
+    if not usuario:
         return RedirectResponse(url="/login", status_code=303)
     
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    total = sum(item["preco"] * item["quantidade"] for item in carrinho)
+    carrinho = carrinho_store.obter(usuario.id_cliente)
     
     return templates.TemplateResponse("pages/carrinho/carrinho_modal.html", {
         "request": request,
         "carrinho": carrinho,
-        "total": total
+        "total": carrinho.total
     })
 
 # Rota para obter a contagem de itens no carrinho
 @router.get("/carrinho/contador")
-def carrinho_contador(request:Request, db:Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    if not token:
-        return {"quantidade": 0}
-
-    payload = verificar_token(token)
-    if not payload:
-        return {"quantidade": 0}
-
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    if not cliente:
+def carrinho_contador(request:Request, usuario:UsuarioSessao = Depends(usuario_atual)):
+    # Chamado em toda página pelo cart.js: o id vem do próprio token, sem consulta ao banco
+    if not usuario:
         return {"quantidade": 0}
 
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    quantidade = sum(item["quantidade"] for item in carrinho)
-    return {"quantidade": quantidade}
+    carrinho = carrinho_store.obter(usuario.id_cliente)
+    return {"quantidade": carrinho.quantidade_total}
 
 # Rota para obter os itens do carrinho em formato JSON (para o novo modal)
 @router.get("/carrinho/itens")
-def get_carrinho_itens(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+def get_carrinho_itens(request: Request, usuario: UsuarioSessao = Depends(usuario_atual)):
+    if not usuario:
         return JSONResponse({"error": "Não autenticado"}, status_code=401)
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    if not cliente:
-        return JSONResponse({"error": "Cliente não encontrado"}, status_code=401)
-
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    total = sum(item["preco"] * item["quantidade"] for item in carrinho)
+    carrinho = carrinho_store.obter(usuario.id_cliente)
 
     return JSONResponse({
-        "itens": carrinho,
-        "total": total
+        "itens": carrinho.para_lista(),
+        "total": carrinho.total
     })
 
 # Rota para adicionar item ao carrinho
 @router.post("/carrinho/adicionar/{produto_id}")
-async def adicionar_carrinho(
+def adicionar_carrinho(
     request:Request, 
     produto_id:int, 
     quantidade:int = Form(1), 
+    usuario:UsuarioSessao = Depends(usuario_atual),
     db:Session = Depends(get_db)
 ):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+    if not usuario:
         return JSONResponse({"mensagem": "Login necessário"}, status_code=401)
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    if not cliente:
-        return JSONResponse({"mensagem": "Cliente não encontrado"}, status_code=401)
-
     produto = db.query(Produtos).filter_by(id_produto=produto_id).first()
     if not produto:
         return JSONResponse({"mensagem": "Produto não encontrado"}, status_code=404)
-    
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    
-    print(f"Adicionando produto {produto_id} ao carrinho do cliente {cliente.id_cliente}")
-    print(f"Produto encontrado: {produto.nome}, preço: {produto.preco}, imagem: {produto.imagem_caminho}")
-    
-    # Verifica se o produto já existe no carrinho
-    produto_existente = None
-    for item in carrinho:
-        if item["id"] == produto_id:
-            produto_existente = item
-            break
-            
-    if produto_existente:
-        produto_existente["quantidade"] += quantidade
-        print(f"Produto já existe no carrinho, nova quantidade: {produto_existente['quantidade']}")
-    else:
-        novo_item = {
-            "id": produto.id_produto,
-            "nome": produto.nome,
-            "preco": float(produto.preco),  # Converter Decimal para float
-            "quantidade": quantidade,
-            "imagem": produto.imagem_caminho
-        }
-        carrinho.append(novo_item)
-        print(f"Novo item adicionado ao carrinho: {novo_item}")
-    
-    carrinhos[cliente.id_cliente] = carrinho
-    print(f"Carrinho atualizado para cliente {cliente.id_cliente}: {carrinho}")
+
+    # Soma a quantidade se o produto já existe no carrinho (busca pelo id, sem percorrer a lista).
+    # Leitura e gravação numa transação só: cliques seguidos não sobrescrevem um ao outro
+    carrinho_store.atualizar(usuario.id_cliente, lambda carrinho: carrinho.adicionar(
+        produto.id_produto,
+        produto.nome,
+        produto.preco,  # guardado em centavos
+        quantidade,
+        produto.imagem_caminho
+    ))
     return JSONResponse({"mensagem": "Produto adicionado ao carrinho", "success": True}, status_code=200)
 
-def _get_cart_data(carrinho: list) -> dict:
-    """Calcula o total e a quantidade de itens do carrinho."""
-    total = sum(item["preco"] * item["quantidade"] for item in carrinho)
-    quantidade_total = sum(item["quantidade"] for item in carrinho)
-    return {"total": total, "quantidade_total": quantidade_total, "itens": carrinho}
+def _get_cart_data(carrinho: Carrinho) -> dict:
+    """Retorna o total e a quantidade de itens do carrinho (já mantidos pelo próprio carrinho)."""
+    return {"total": carrinho.total, "quantidade_total": carrinho.quantidade_total, "itens": carrinho.para_lista()}
 
 # Rota para atualizar quantidade de item no carrinho
 @router.post("/carrinho/atualizar/{produto_id}")
-async def atualizar_quantidade(
+def atualizar_quantidade(
     request:Request,
     produto_id:int,
     quantidade:int = Form(...),
-    db:Session = Depends(get_db)
+    usuario:UsuarioSessao = Depends(usuario_atual)
 ):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+    if not usuario:
         return JSONResponse({"success": False, "message": "Não autenticado"}, status_code=401)
-    
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    if not cliente:
-        return JSONResponse({"success": False, "message": "Cliente não encontrado"}, status_code=401)
 
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    
-    produto_encontrado = False
-    for item in carrinho:
-        if item["id"] == produto_id:
-            if quantidade > 0:
-                item["quantidade"] = quantidade
-            else:
-                # Se a quantidade for 0 ou menos, remove o item
-                carrinho.remove(item)
-            produto_encontrado = True
-            break
-            
-    if not produto_encontrado:
-        return JSONResponse({"success": False, "message": "Produto não encontrado no carrinho"}, status_code=404)
+    # Se a quantidade for 0 ou menos, o item é removido
+    def alterar(carrinho):
+        if not carrinho.atualizar(produto_id, quantidade):
+            return None
+        return _get_cart_data(carrinho)
 
-    carrinhos[cliente.id_cliente] = carrinho
-    cart_data = _get_cart_data(carrinho)
+    cart_data = carrinho_store.atualizar(usuario.id_cliente, alterar)
+    if cart_data is None:
+        return JSONResponse({"success": False, "message": "Produto não encontrado no carrinho"}, status_code=404)
     
     return JSONResponse({
         "success": True, 
@@ -229,31 +143,22 @@ async def atualizar_quantidade(
 
 # Rota para remover item do carrinho
 @router.post("/carrinho/remover/{produto_id}")
-async def remover_do_carrinho(
+def remover_do_carrinho(
     request:Request,
     produto_id:int,
-    db:Session = Depends(get_db)
+    usuario:UsuarioSessao = Depends(usuario_atual)
 ):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+    if not usuario:
         return JSONResponse({"success": False, "message": "Não autenticado"}, status_code=401)
-    
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    if not cliente:
-        return JSONResponse({"success": False, "message": "Cliente não encontrado"}, status_code=401)
 
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    
-    initial_len = len(carrinho)
-    carrinho = [item for item in carrinho if item["id"] != produto_id]
-    
-    if len(carrinho) == initial_len:
-        return JSONResponse({"success": False, "message": "Produto não encontrado no carrinho"}, status_code=404)
+    def alterar(carrinho):
+        if not carrinho.remover(produto_id):
+            return None
+        return _get_cart_data(carrinho)
 
-    carrinhos[cliente.id_cliente] = carrinho
-    cart_data = _get_cart_data(carrinho)
+    cart_data = carrinho_store.atualizar(usuario.id_cliente, alterar)
+    if cart_data is None:
+        return JSONResponse({"success": False, "message": "Produto não encontrado no carrinho"}, status_code=404)
 
     return JSONResponse({
         "success": True,
@@ -261,44 +166,80 @@ async def remover_do_carrinho(
         "cart": cart_data
     })
 
-#rota checkout
-@router.get("/checkout")
-async def checkout_get(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
+def _mensagem_sem_estoque(db: Session, carrinho: Carrinho) -> str:
+    """Lista os itens do carrinho que não têm estoque suficiente (chamar após o rollback)."""
+    disponivel = dict(
+        db.query(Produtos.id_produto, Produtos.estoque)
+        .filter(Produtos.id_produto.in_([item.id for item in carrinho]))
+        .all()
+    )
+    faltando = [
+        f"{item.nome} (disponível: {max(disponivel.get(item.id) or 0, 0)})"
+        for item in carrinho
+        if (disponivel.get(item.id) or 0) < item.quantidade
+    ]
+    if not faltando:
+        return "O estoque mudou durante a compra. Tente novamente."
+    return "Estoque insuficiente para: " + ", ".join(faltando) + ". Ajuste o carrinho e tente novamente."
 
-    if not payload:
+@router.post("/checkout")
+async def checkout(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    # A rota é async só para ler o formulário e esperar o envio duplicado. Todo acesso ao banco
+    # (síncrono) fica em _finalizar_checkout, no threadpool: nenhuma conexão do pool fica presa
+    # enquanto a requisição espera no event loop. O registro de idempotência (SQLite local)
+    # também roda no threadpool.
+    usuario = obter_usuario(request)  # id vem do token, sem consulta ao banco
+    if not usuario:
         return RedirectResponse(url="/login", status_code=303)
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    total_produtos = sum(item["preco"] * item["quantidade"] for item in carrinho) if carrinho else 0
-
-    from_profile = request.query_params.get("from_profile") == "true"
-
-    return templates.TemplateResponse("pages/checkout/checkout.html", {
-        "request": request,
-        "cliente": cliente,
-        "carrinho": carrinho,
-        "total": total_produtos,
-        "erro": "",
-        "from_profile": from_profile,
-    })
+    form = await request.form()
+    chave = form.get("chave_idempotencia")
+    if not chave_valida(chave):
+        # formulário antigo/sem JS: processa normalmente, sem proteção contra reenvio
+        return await run_in_threadpool(_finalizar_checkout, request, background_tasks, db, form)
+
+    # a chave vale só para este cliente
+    chave_formulario = chave
+    chave = f"checkout:{usuario.id_cliente}:{chave}"
+    # o registro é SQLite síncrono (BEGIN IMMEDIATE espera o lock de outro worker): fora do event loop
+    resposta_anterior = await run_in_threadpool(registro_idempotencia.reservar, chave)
+    if resposta_anterior is EM_PROCESSAMENTO:
+        # duplo clique: espera o primeiro envio terminar e devolve o mesmo resultado
+        resposta_anterior = await registro_idempotencia.aguardar(chave)
+    if resposta_anterior is EM_PROCESSAMENTO:
+        carrinho = carrinho_store.obter(usuario.id_cliente)
+        return templates.TemplateResponse("pages/checkout/checkout.html", {
+            "request": request,
+            "carrinho": carrinho,
+            "total": carrinho.total,
+            "erro": "Seu pedido ainda está sendo processado. Aguarde alguns instantes e confira em Meus Pedidos.",
+            "from_profile": False,
+            # mesma chave: reenviar o formulário devolve o resultado deste pedido, não cria outro
+            "chave_idempotencia": chave_formulario,
+        })
+    if resposta_anterior is not None:
+        print(f"Checkout repetido do cliente {usuario.id_cliente}: devolvendo {resposta_anterior}")
+        return RedirectResponse(url=resposta_anterior, status_code=303)
 
-@router.post("/checkout")
-async def checkout(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
+    try:
+        resposta = await run_in_threadpool(_finalizar_checkout, request, background_tasks, db, form)
+    except BaseException:
+        await run_in_threadpool(registro_idempotencia.liberar, chave)
+        raise
+    destino = resposta.headers.get("location", "")
+    if isinstance(resposta, RedirectResponse) and destino.startswith("/pedidos/confirmacao"):
+        await run_in_threadpool(registro_idempotencia.concluir, chave, destino)
+    else:
+        # terminou com erro (estoque, frete, carrinho vazio...): o cliente pode tentar de novo
+        await run_in_threadpool(registro_idempotencia.liberar, chave)
+    return resposta
 
-    if not payload:
+def _finalizar_checkout(request: Request, background_tasks: BackgroundTasks, db: Session, form):
+    cliente = get_user_from_token(request, db)
+    if not cliente:
         return RedirectResponse(url="/login", status_code=303)
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-
-    carrinho = carrinhos.get(cliente.id_cliente, [])
+    carrinho = carrinho_store.obter(cliente.id_cliente)
     if not carrinho:
         return templates.TemplateResponse("pages/checkout/checkout.html", {
             "request": request,
@@ -312,7 +253,6 @@ async def checkout(request: Request, background_tasks: BackgroundTasks, db: Sess
     # -----------------------------
     # RECEBE FORMULÁRIO
     # -----------------------------
-    form = await request.form()
     from_profile = form.get("from_profile") == "true"
 
     form_logradouro = form.get("logradouro")
@@ -329,7 +269,13 @@ async def checkout(request: Request, background_tasks: BackgroundTasks, db: Sess
     except:
         distancia_km = 0
 
-    endereco_obj = db.query(Endereco).filter_by(id_cliente=cliente.id_cliente).first()
+    # endereço salvo escolhido no checkout (ou o primeiro do cliente)
+    form_id_endereco = form.get("id_endereco")
+    endereco_obj = None
+    if form_id_endereco and form_id_endereco.isdigit():
+        endereco_obj = db.query(Endereco).filter_by(id_endereco=int(form_id_endereco), id_cliente=cliente.id_cliente).first()
+    if endereco_obj is None:
+        endereco_obj = db.query(Endereco).filter_by(id_cliente=cliente.id_cliente).first()
 
     # Endereço via formulário
     if form_logradouro:
@@ -343,6 +289,9 @@ async def checkout(request: Request, background_tasks: BackgroundTasks, db: Sess
                 endereco_obj.bairro = form_bairro
                 endereco_obj.cidade = form_cidade
                 endereco_obj.estado = form_uf
+                if endereco_obj.cep != form_cep:
+                    endereco_obj.latitude = None
+                    endereco_obj.longitude = None
                 endereco_obj.cep = form_cep
                 db.add(endereco_obj)
             else:
@@ -358,7 +307,11 @@ async def checkout(request: Request, background_tasks: BackgroundTasks, db: Sess
                     cep=form_cep
                 )
                 db.add(novo_end)
+                endereco_obj = novo_end
             db.commit()
+            # coordenadas gravadas em segundo plano para os próximos pedidos
+            if form_cep and endereco_obj.latitude is None:
+                background_tasks.add_task(geocodificar_endereco, endereco_obj.id_endereco, form_cep)
 
     # Endereço salvo
     elif endereco_obj:
@@ -373,39 +326,61 @@ async def checkout(request: Request, background_tasks: BackgroundTasks, db: Sess
         if from_profile:
             return RedirectResponse(url="/checkout?from_profile=true", status_code=303)
 
-        total_produtos = sum(item["preco"] * item["quantidade"] for item in carrinho)
         return templates.TemplateResponse("pages/checkout/checkout.html", {
             "request": request,
             "cliente": cliente,
             "carrinho": carrinho,
-            "total": total_produtos,
+            "total": carrinho.total,
             "erro": "Nenhum endereço cadastrado. Cadastre um endereço ou preencha os dados no checkout antes de finalizar.",
             "from_profile": False,
         })
 
     # TOTAL PRODUTOS
-    total_produtos = sum(item["preco"] * item["quantidade"] for item in carrinho)
+    total_produtos = carrinho.total
 
     # --- CÁLCULO DE FRETE ---
-    # O frete é calculado no frontend via /api/frete e enviado no formulário.
-    # Se não for enviado, o valor padrão é 0.
-    valor_frete_str = form.get("valor_frete", "0.0")
-    try:
-        valor_frete = float(valor_frete_str)
-    except (ValueError, TypeError):
-        valor_frete = 0.0
+    # 1) cotação assinada devolvida pelo /api/frete: só confere assinatura/validade, sem consulta externa
+    # 2) endereço salvo já geocodificado: calculado aqui pelas coordenadas gravadas
+    # Valores de frete enviados soltos no formulário não são aceitos.
+    cotacao = ler_cotacao(form.get("cotacao_frete"), cliente.id_cliente, cep_used)
+    if cotacao:
+        valor_frete = cotacao["frete"]
+    elif (endereco_obj is not None and endereco_obj.latitude is not None and endereco_obj.longitude is not None
+            and limpar_cep(endereco_obj.cep) == limpar_cep(cep_used)):
+        _, valor_frete, _ = cotar_por_coordenadas(endereco_obj.latitude, endereco_obj.longitude)
+    else:
+        if from_profile:
+            return RedirectResponse(url="/checkout?from_profile=true", status_code=303)
+
+        return templates.TemplateResponse("pages/checkout/checkout.html", {
+            "request": request,
+            "cliente": cliente,
+            "carrinho": carrinho,
+            "total": total_produtos,
+            "erro": "Calcule o frete do endereço de entrega antes de finalizar o pedido.",
+            "from_profile": False,
+        })
 
     # CUPOM
     codigo_cupom = form.get("promo_code")
     valor_desconto = 0
+    cupom = None
 
     if codigo_cupom:
-        consultar = db.query(Cupom).filter(
-            Cupom.chave_cupon == codigo_cupom,
-            Cupom.ativo == True
-        ).first()
-        if consultar:
-            valor_desconto = total_produtos * consultar.valor_desconto
+        # índice em memória; o uso é contado (com os limites) na transação do pedido
+        cupom = indice_cupons.buscar(codigo_cupom)
+        if not cupom:
+            # o cupom foi validado na página, mas esgotou ou foi desativado antes do envio:
+            # não finaliza cobrando o valor cheio sem avisar
+            return templates.TemplateResponse("pages/checkout/checkout.html", {
+                "request": request,
+                "cliente": cliente,
+                "carrinho": carrinho,
+                "total": total_produtos,
+                "erro": f"O cupom {codigo_cupom} é inválido, esgotou ou não está mais ativo.",
+                "from_profile": False,
+            })
+        valor_desconto = total_produtos * cupom.valor_desconto
 
     total_final = total_produtos + valor_frete - valor_desconto
 
@@ -439,33 +414,92 @@ async def checkout(request: Request, background_tasks: BackgroundTasks, db: Sess
         valor_total=total_final
     )
 
-    db.add(pedido)
-    db.commit()
-    db.refresh(pedido)
-
-    # ITENS DO PEDIDO
-    for item in carrinho:
-        novo_item = ItemPedido(
-            pedido_id=pedido.id_pedido,
-            produto_id=item["id"],
-            quantidade=item["quantidade"],
-            preco_unitario=item["preco"]
-        )
-        db.add(novo_item)
-
-    itens_email = [
-        {
-            "nome": item["nome"],
-            "quantidade": item["quantidade"],
-            "preco": item["preco"]
-        }
-        for item in carrinho
-    ]
+    # Pedido, baixa de estoque e itens em uma única transação: ou entra tudo ou nada
+    try:
+        # Reserva o estoque com UPDATE condicional (só baixa se ainda houver a quantidade).
+        # As linhas são travadas sempre na ordem do id_produto: dois checkouts com os mesmos
+        # produtos esperam um pelo outro em vez de entrar em deadlock.
+        faltou_estoque = False
+        for item in sorted(carrinho, key=lambda i: i.id):
+            resultado = db.execute(
+                update(Produtos)
+                .where(Produtos.id_produto == item.id, Produtos.estoque >= item.quantidade)
+                .values(estoque=Produtos.estoque - item.quantidade)
+                .execution_options(synchronize_session=False)
+            )
+            if resultado.rowcount != 1:
+                faltou_estoque = True
+                break
+
+        if faltou_estoque:
+            db.rollback()
+            return templates.TemplateResponse("pages/checkout/checkout.html", {
+                "request": request,
+                "cliente": cliente,
+                "carrinho": carrinho,
+                "total": total_produtos,
+                "erro": _mensagem_sem_estoque(db, carrinho),
+                "from_profile": False,
+            })
+
+        db.add(pedido)
+        db.flush()  # gera o id_pedido sem fazer commit
+
+        # ITENS DO PEDIDO (um INSERT com todas as linhas, executemany)
+        db.execute(insert(ItemPedido), [
+            {
+                "pedido_id": pedido.id_pedido,
+                "produto_id": item.id,
+                "quantidade": item.quantidade,
+                "preco_unitario": item.preco
+            }
+            for item in carrinho
+        ])
+
+        # e-mail de confirmação na fila, na mesma transação (enviado pelo despachante, fila_emails.py)
+        enfileirar_email(db, "pedido", cliente.email, {
+            "id_pedido": pedido.id_pedido,
+            "valor_total": pedido.valor_total,
+            "itens": [
+                {
+                    "nome": item.nome,
+                    "quantidade": item.quantidade,
+                    "preco": item.preco
+                }
+                for item in carrinho
+            ]
+        })
 
-    background_tasks.add_task(send_order_email, cliente.email, pedido, itens_email)
+        # por último: a linha do cupom é disputada por todos os pedidos da campanha
+        erro_cupom = registrar_uso_cupom(db, cupom, cliente.id_cliente) if cupom else None
+        if erro_cupom:
+            db.rollback()
+            return templates.TemplateResponse("pages/checkout/checkout.html", {
+                "request": request,
+                "cliente": cliente,
+                "carrinho": carrinho,
+                "total": total_produtos,
+                "erro": erro_cupom,
+                "from_profile": False,
+            })
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        import traceback
+        print(f"Erro ao criar pedido: {e}")
+        print(traceback.format_exc())
+        return templates.TemplateResponse("pages/checkout/checkout.html", {
+            "request": request,
+            "cliente": cliente,
+            "carrinho": carrinho,
+            "total": total_produtos,
+            "erro": "Não foi possível finalizar o pedido. Tente novamente.",
+            "from_profile": False,
+        })
 
-    db.commit()
+    despachante_emails.avisar()
 
-    carrinhos[cliente.id_cliente] = []
+    carrinho_store.limpar(cliente.id_cliente)
 
     return RedirectResponse(url=f"/pedidos/confirmacao?id={pedido.id_pedido}", status_code=303)
\ No newline at end of file
@@ -0,0 +1,327 @@
+import bisect
+import threading
+import time
+from collections import Counter
+from database import SessionLocal
+from versoes import ler_versao, incrementar_versao, alteracoes_desde
+from models.models import Produtos
+from carrinho_store import para_centavos
+from controllers.busca import IndiceBusca, IndiceSugestoes
+
+# Índice do catálogo em memória: evita consultas extras ao banco para montar os filtros
+# da barra lateral do /catalogo. É carregado na subida do servidor e atualizado de forma
+# incremental pelas rotas de admin. Como cada worker do uvicorn tem o próprio índice, as
+# alterações incrementam uma versão no SQLite local junto com o id do produto alterado; os
+# outros workers percebem a mudança e releem do banco só esses produtos. Se o registro de
+# alterações não cobre o intervalo (worker muito atrasado), o índice é reconstruído numa
+# thread separada e o índice antigo continua respondendo até a troca.
+# Também mantém o índice de busca textual (controllers/busca.py) usado pelo campo "q"
+# e as sugestões do autocomplete.
+
+FACETAS = ("sexo", "cor", "tamanho")
+# ordenações aceitas pela busca textual (feitas em memória sobre o resultado)
+ORDENACOES_BUSCA = ("relevancia", "recentes", "preco", "preco_desc", "nome")
+# intervalo mínimo entre verificações da versão compartilhada
+VERIFICAR_VERSAO_A_CADA = 2.0
+COLUNAS = (Produtos.id_produto, Produtos.nome, Produtos.descricao, Produtos.preco,
+           Produtos.sexo, Produtos.cor, Produtos.tamanho)
+
+
+class ProdutoIndexado:
+    """Somente os campos usados pelos filtros do catálogo."""
+    __slots__ = ("id_produto", "nome", "nome_minusculo", "preco_centavos", "sexo", "cor", "tamanho")
+
+    def __init__(self, produto):
+        self.id_produto = produto.id_produto
+        self.nome = produto.nome or ""
+        self.nome_minusculo = self.nome.lower()
+        self.preco_centavos = para_centavos(produto.preco)
+        self.sexo = produto.sexo
+        self.cor = produto.cor
+        self.tamanho = produto.tamanho
+
+
+class IndiceCatalogo:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._produtos = {}  # id_produto -> ProdutoIndexado
+        self._por_valor = {faceta: {} for faceta in FACETAS}  # faceta -> valor -> set(id_produto)
+        # cada combinação (sexo, cor, tamanho) ganha um código inteiro: contar inteiros é bem
+        # mais rápido que contar tuplas
+        self._codigos = {}  # (sexo, cor, tamanho) -> código
+        self._combinacao_de = []  # código -> (sexo, cor, tamanho)
+        self._facetas = {}  # id_produto -> código da combinação
+        self._combinacoes = Counter()  # código -> quantidade de produtos no catálogo
+        self._precos = []  # lista ordenada de (preco_centavos, id_produto)
+        self._busca = IndiceBusca()
+        self._sugestoes = IndiceSugestoes()
+        self._carregado = False
+        self._versao = None
+        self._verificado_em = 0.0
+        self._recarregando = False
+
+    # ---------- Carga e atualização ----------
+
+    def carregar(self, db):
+        """(Re)constrói o índice inteiro a partir do banco."""
+        # lê a versão antes do banco: uma alteração feita durante a carga é aplicada depois
+        versao = ler_versao("catalogo")
+        linhas = db.query(*COLUNAS).all()
+        # monta as estruturas novas fora do lock: as consultas seguem usando o índice atual
+        novo = IndiceCatalogo()
+        novo._busca.iniciar_carga()
+        novo._sugestoes.iniciar_carga()
+        for linha in linhas:
+            novo._inserir(ProdutoIndexado(linha), linha.descricao)
+        novo._busca.concluir_carga()
+        novo._sugestoes.concluir_carga()
+        novo._precos = sorted((p.preco_centavos, p.id_produto) for p in novo._produtos.values())
+        with self._lock:
+            # as buscas populares não vêm do banco: sobrevivem à recarga
+            novo._sugestoes.restaurar_buscas(self._sugestoes.buscas_populares())
+            self._produtos = novo._produtos
+            self._por_valor = novo._por_valor
+            self._codigos = novo._codigos
+            self._combinacao_de = novo._combinacao_de
+            self._facetas = novo._facetas
+            self._combinacoes = novo._combinacoes
+            self._precos = novo._precos
+            self._busca = novo._busca
+            self._sugestoes = novo._sugestoes
+            self._carregado = True
+            self._versao = versao
+            self._verificado_em = time.monotonic()
+
+    def atualizar_produto(self, produto):
+        """Inclui ou substitui um produto (chamar após o commit do admin)."""
+        with self._lock:
+            self._substituir(produto)
+            self._registrar_alteracao(produto.id_produto)
+
+    def remover_produto(self, id_produto: int):
+        with self._lock:
+            self._remover(id_produto)
+            self._registrar_alteracao(id_produto)
+
+    def _substituir(self, produto):
+        self._remover(produto.id_produto)
+        indexado = ProdutoIndexado(produto)
+        self._inserir(indexado, produto.descricao)
+        bisect.insort(self._precos, (indexado.preco_centavos, indexado.id_produto))
+
+    def _registrar_alteracao(self, id_produto: int):
+        versao = incrementar_versao("catalogo", id_produto)
+        if self._versao is not None and versao == self._versao + 1:
+            self._versao = versao
+        else:
+            # outro worker alterou o catálogo antes: a próxima consulta aplica as alterações
+            # a partir da versão que o índice tem (inclusive esta, o que é inofensivo)
+            self._verificado_em = 0.0
+
+    def garantir_atualizado(self):
+        """Carrega o índice na primeira vez e aplica as alterações feitas por outros workers."""
+        agora = time.monotonic()
+        if self._carregado and agora - self._verificado_em < VERIFICAR_VERSAO_A_CADA:
+            return
+        if not self._carregado:
+            with SessionLocal() as db:
+                self.carregar(db)
+            return
+        self._verificado_em = agora
+        versao = self._versao
+        if versao is None:
+            self._recarregar_em_segundo_plano()
+            return
+        atual, ids = alteracoes_desde("catalogo", versao)
+        if atual == versao:
+            return
+        if ids is None:
+            self._recarregar_em_segundo_plano()
+            return
+        # poucos produtos alterados: uma consulta pelos ids, aplicada no índice atual
+        with SessionLocal() as db:
+            linhas = db.query(*COLUNAS).filter(Produtos.id_produto.in_(ids)).all()
+        with self._lock:
+            if self._versao != versao:
+                return  # recarga ou outra aplicação terminou antes desta
+            encontrados = set()
+            for linha in linhas:
+                self._substituir(linha)
+                encontrados.add(linha.id_produto)
+            for id_produto in ids - encontrados:
+                self._remover(id_produto)  # excluído do banco
+            self._versao = atual
+
+    def _recarregar_em_segundo_plano(self):
+        with self._lock:
+            if self._recarregando:
+                return
+            self._recarregando = True
+
+        def recarregar():
+            try:
+                with SessionLocal() as db:
+                    self.carregar(db)
+            except Exception as e:
+                print(f"Erro ao recarregar o índice do catálogo: {e}")
+                self._verificado_em = 0.0
+            finally:
+                self._recarregando = False
+
+        threading.Thread(target=recarregar, name="recarga-catalogo", daemon=True).start()
+
+    def registrar_busca(self, q: str):
+        """Conta uma busca do catálogo que trouxe resultados (alimenta as sugestões)."""
+        with self._lock:
+            self._sugestoes.registrar_busca(q)
+
+    def _inserir(self, indexado: ProdutoIndexado, descricao: str = None):
+        # self._precos é mantido pelo chamador (ordenado de uma vez na carga, insort no incremental)
+        self._produtos[indexado.id_produto] = indexado
+        combinacao = tuple(getattr(indexado, faceta) for faceta in FACETAS)
+        codigo = self._codigos.get(combinacao)
+        if codigo is None:
+            codigo = self._codigos[combinacao] = len(self._combinacao_de)
+            self._combinacao_de.append(combinacao)
+        self._facetas[indexado.id_produto] = codigo
+        self._combinacoes[codigo] += 1
+        for faceta, valor in zip(FACETAS, combinacao):
+            if valor is not None:
+                self._por_valor[faceta].setdefault(valor, set()).add(indexado.id_produto)
+        self._busca.indexar(indexado.id_produto, {
+            "nome": indexado.nome,
+            "descricao": descricao or "",
+            "cor": indexado.cor or "",
+            "tamanho": indexado.tamanho or "",
+        })
+        self._sugestoes.adicionar_nome(indexado.nome)
+
+    def _remover(self, id_produto: int):
+        antigo = self._produtos.pop(id_produto, None)
+        if antigo is None:
+            return
+        self._busca.remover(id_produto)
+        self._sugestoes.remover_nome(antigo.nome)
+        codigo = self._facetas.pop(id_produto)
+        self._combinacoes[codigo] -= 1
+        if not self._combinacoes[codigo]:
+            del self._combinacoes[codigo]
+        for faceta in FACETAS:
+            valor = getattr(antigo, faceta)
+            ids = self._por_valor[faceta].get(valor)
+            if ids is not None:
+                ids.discard(id_produto)
+                if not ids:
+                    del self._por_valor[faceta][valor]
+        posicao = bisect.bisect_left(self._precos, (antigo.preco_centavos, id_produto))
+        if posicao < len(self._precos) and self._precos[posicao] == (antigo.preco_centavos, id_produto):
+            del self._precos[posicao]
+
+    # ---------- Consultas ----------
+
+    def opcoes(self, faceta: str) -> list:
+        """Valores existentes da faceta, em ordem alfabética."""
+        with self._lock:
+            return sorted(self._por_valor[faceta])
+
+    def faixa_preco(self):
+        """(menor, maior) preço do catálogo em reais."""
+        with self._lock:
+            if not self._precos:
+                return 0.0, 0.0
+            return self._precos[0][0] / 100, self._precos[-1][0] / 100
+
+    def contagens(self, q=None, tamanho=None, cor=None, sexo=None, preco_min=None, preco_max=None) -> dict:
+        """Quantidade de produtos por valor de cada faceta sob os filtros atuais.
+        A contagem de uma faceta ignora o filtro dela mesma, para mostrar as alternativas."""
+        with self._lock:
+            encontrados = set(self._busca.buscar(q)) if q else None
+            return self._contagens(encontrados, tamanho, cor, sexo, preco_min, preco_max)
+
+    def buscar(self, q, tamanho=None, cor=None, sexo=None, preco_min=None, preco_max=None,
+               ordenacao: str = "relevancia") -> list:
+        """Ids dos produtos que casam com a busca textual e os filtros, já ordenados."""
+        with self._lock:
+            return self._filtrar(self._busca.buscar(q), tamanho, cor, sexo, preco_min, preco_max, ordenacao)
+
+    def buscar_com_contagens(self, q, tamanho=None, cor=None, sexo=None, preco_min=None, preco_max=None,
+                             ordenacao: str = "relevancia"):
+        """(buscar(), contagens()) da mesma consulta, com a busca textual feita uma vez só."""
+        with self._lock:
+            encontrados = self._busca.buscar(q)
+            return (
+                self._filtrar(encontrados, tamanho, cor, sexo, preco_min, preco_max, ordenacao),
+                self._contagens(set(encontrados), tamanho, cor, sexo, preco_min, preco_max),
+            )
+
+    def sugerir(self, prefixo: str, limite: int = 8) -> list:
+        with self._lock:
+            return self._sugestoes.sugerir(prefixo, limite)
+
+    def _ids_preco(self, preco_min, preco_max):
+        """Ids dentro da faixa de preço, ou None se a faixa não filtra nada."""
+        if self._precos and (preco_min is not None or preco_max is not None):
+            minimo = para_centavos(preco_min) if preco_min is not None else self._precos[0][0]
+            maximo = para_centavos(preco_max) if preco_max is not None else self._precos[-1][0]
+            # o formulário sempre envia a faixa; se ela cobre o catálogo todo não filtra nada
+            if minimo > self._precos[0][0] or maximo < self._precos[-1][0]:
+                inicio = bisect.bisect_left(self._precos, (minimo, -1))
+                fim = bisect.bisect_right(self._precos, (maximo, float("inf")))
+                return {id_produto for _, id_produto in self._precos[inicio:fim]}
+        return None
+
+    def _filtrar(self, ids: list, tamanho, cor, sexo, preco_min, preco_max, ordenacao) -> list:
+        for faceta, valor in (("sexo", sexo), ("cor", cor), ("tamanho", tamanho)):
+            if valor and ids:
+                selecionados = self._por_valor[faceta].get(valor, set())
+                ids = [i for i in ids if i in selecionados]
+        faixa = self._ids_preco(preco_min, preco_max)
+        if faixa is not None:
+            ids = [i for i in ids if i in faixa]
+
+        if ordenacao == "recentes":
+            ids.sort(reverse=True)
+        elif ordenacao == "preco":
+            ids.sort(key=lambda i: (self._produtos[i].preco_centavos, i))
+        elif ordenacao == "preco_desc":
+            ids.sort(key=lambda i: (self._produtos[i].preco_centavos, i), reverse=True)
+        elif ordenacao == "nome":
+            ids.sort(key=lambda i: (self._produtos[i].nome_minusculo, i))
+        return ids
+
+    def _contagens(self, encontrados, tamanho, cor, sexo, preco_min, preco_max) -> dict:
+        """`encontrados` = ids da busca textual (set), ou None sem busca.
+        Conta os códigos das combinações (sexo, cor, tamanho) do resultado numa passada só
+        (map/Counter em C) e soma as combinações por faceta: são poucas centenas, qualquer que
+        seja o tamanho do resultado."""
+        filtros = {"sexo": sexo, "cor": cor, "tamanho": tamanho}
+        base = self._ids_base(encontrados, preco_min, preco_max)  # None = todos os produtos
+        if base is None and not any(filtros.values()):
+            return {faceta: {valor: len(ids) for valor, ids in self._por_valor[faceta].items()} for faceta in FACETAS}
+        if base is None:
+            combinacoes = self._combinacoes
+        else:
+            combinacoes = Counter(map(self._facetas.__getitem__, base))
+        resultado = {faceta: dict.fromkeys(self._por_valor[faceta], 0) for faceta in FACETAS}
+        for codigo, quantidade in combinacoes.items():
+            valores = dict(zip(FACETAS, self._combinacao_de[codigo]))
+            for faceta in FACETAS:
+                valor = valores[faceta]
+                if valor is None:
+                    continue
+                # a contagem de uma faceta aplica os filtros das outras, não o dela
+                if all(not filtro or valores[outra] == filtro
+                       for outra, filtro in filtros.items() if outra != faceta):
+                    resultado[faceta][valor] += quantidade
+        return resultado
+
+    def _ids_base(self, encontrados, preco_min, preco_max):
+        ids = self._ids_preco(preco_min, preco_max)
+        if encontrados is not None:
+            ids = encontrados if ids is None else ids & encontrados
+        return ids
+
+
+# instância única do processo
+indice_catalogo = IndiceCatalogo()
@@ -0,0 +1,91 @@
+import csv
+import os
+import bisect
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional: sem ele as consultas em lote usam bisect
+    np = None
+
+# Tabela offline de faixas de CEP -> coordenada aproximada (centroide da faixa).
+# O frete só precisa da distância aproximada para escolher a faixa de preço, então um CEP
+# coberto pela tabela é cotado sem nenhuma chamada externa; o geocodificador (Nominatim)
+# fica só para CEPs fora da tabela.
+#
+# Formato do CSV (com cabeçalho), um dos dois:
+#   cep_inicio,cep_fim,lat,lon     ex.: 01000000,01099999,-23.5489,-46.6388
+#   prefixo,lat,lon                ex.: 01310,-23.5614,-46.6559  (vale para 01310000..01310999)
+# As faixas não podem se sobrepor; linhas sobrepostas são ignoradas na carga.
+
+CEP_CENTROIDES_CSV = os.getenv("CEP_CENTROIDES_CSV", "dados/cep_centroides.csv")
+
+
+class TabelaCentroides:
+
+    def __init__(self):
+        # arrays compactos e ordenados por cep_inicio (busca binária)
+        self._inicios = array("q")
+        self._fins = array("q")
+        self._lats = array("d")
+        self._lons = array("d")
+
+    def carregar(self, caminho: str = CEP_CENTROIDES_CSV):
+        """Carrega o CSV. Sem arquivo a tabela fica vazia e tudo cai no geocodificador."""
+        if not os.path.exists(caminho):
+            print(f"Tabela de centroides de CEP não encontrada em {caminho}; usando só geocodificação online")
+            return
+        faixas = []
+        with open(caminho, newline="", encoding="utf-8") as arquivo:
+            for linha in csv.DictReader(arquivo):
+                try:
+                    if linha.get("prefixo"):
+                        prefixo = linha["prefixo"].strip()
+                        inicio, fim = int(prefixo.ljust(8, "0")), int(prefixo.ljust(8, "9"))
+                    else:
+                        inicio, fim = int(linha["cep_inicio"]), int(linha["cep_fim"])
+                    faixas.append((inicio, fim, float(linha["lat"]), float(linha["lon"])))
+                except (KeyError, TypeError, ValueError):
+                    print(f"Linha inválida na tabela de centroides: {linha}")
+        faixas.sort()
+
+        inicios, fins, lats, lons = array("q"), array("q"), array("d"), array("d")
+        for inicio, fim, lat, lon in faixas:
+            if fins and inicio <= fins[-1]:
+                print(f"Faixa de CEP {inicio}-{fim} sobrepõe a anterior; ignorada")
+                continue
+            inicios.append(inicio)
+            fins.append(fim)
+            lats.append(lat)
+            lons.append(lon)
+        self._inicios, self._fins, self._lats, self._lons = inicios, fins, lats, lons
+        print(f"Tabela de centroides de CEP carregada: {len(inicios)} faixas")
+
+    def buscar(self, cep_limpo: str):
+        """(lat, lon) aproximados do CEP (8 dígitos) ou None se ele não está na tabela."""
+        cep = int(cep_limpo)
+        posicao = bisect.bisect_right(self._inicios, cep) - 1
+        if posicao >= 0 and cep <= self._fins[posicao]:
+            return self._lats[posicao], self._lons[posicao]
+        return None
+
+    def buscar_varios(self, ceps_limpos: list) -> list:
+        """Mesmo que buscar() para uma lista de CEPs, em uma passada só com numpy quando disponível."""
+        if np is None or not ceps_limpos:
+            return [self.buscar(cep) for cep in ceps_limpos]
+        ceps = np.array([int(cep) for cep in ceps_limpos], dtype=np.int64)
+        inicios = np.frombuffer(self._inicios, dtype=np.int64)
+        posicoes = np.searchsorted(inicios, ceps, side="right") - 1
+        validos = posicoes >= 0
+        validos[validos] &= ceps[validos] <= np.frombuffer(self._fins, dtype=np.int64)[posicoes[validos]]
+        return [
+            (self._lats[p], self._lons[p]) if ok else None
+            for p, ok in zip(posicoes.tolist(), validos.tolist())
+        ]
+
+    def __len__(self):
+        return len(self._inicios)
+
+
+# instância única do processo (carregada no lifespan, main.py)
+tabela_centroides = TabelaCentroides()
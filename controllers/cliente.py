@@ -4,13 +4,14 @@ from fastapi import APIRouter, Request, Form, UploadFile, File, Depends, HTTPExc
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-import os, shutil
-from sqlalchemy.orm import Session
+import os, shutil, uuid
+from sqlalchemy.orm import Session, selectinload
 from database import get_db, SessionLocal
 from models.models import *
 from models.models import Clientes, Produtos, Pedidos
 from auth import *
-from controllers.enviar_email import send_welcome_email
+from fila_emails import enfileirar_email, despachante_emails
+from controllers.frete import geocodificar_endereco
 
 router = APIRouter() # rotas
 templates = Jinja2Templates(directory="templates") # front-end
@@ -18,49 +19,25 @@ templates = Jinja2Templates(directory="templates") # front-end
 # Configuração dos arquivos estáticos
 router.mount("/static", StaticFiles(directory="static"), name="static")
 
-# carrinho simples em memória
-carrinhos = {}
+# carrinhos compartilhados entre workers (ver carrinho_store.py)
+from carrinho_store import carrinho_store
 
 UPLOAD_DIR = '../static/upload/img'
 # caminho para o os
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# ---------- Função Auxiliar de Contexto (Adicionado por Gemini) ----------
-
-def get_user_from_token(request: Request, db: Session):
-    """Verifica o token no cookie e retorna o objeto do usuário se válido."""
-    token = request.cookies.get("token")
-    if not token:
-        return None
-    payload = verificar_token(token)
-    if not payload:
-        return None
-    email = payload.get("sub")
-    if not email:
-        return None
-    return db.query(Clientes).filter(Clientes.email == email).first()
-
-def get_base_context(request: Request, db: Session):
-    """Retorna o contexto base para os templates, incluindo o usuário."""
-    user = get_user_from_token(request, db)
-    return {"request": request, "user": user}
+# ---------- Função Auxiliar de Contexto ----------
+from controllers.sessao import get_user_from_token, get_base_context, obter_usuario, usuario_atual, invalidar_usuario, UsuarioSessao
 
 
 # Rota para listar endereços do usuário autenticado (JSON)
 @router.get("/api/enderecos")
-def listar_enderecos(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+def listar_enderecos(request: Request, usuario: UsuarioSessao = Depends(usuario_atual), db: Session = Depends(get_db)):
+    if not usuario:
         return JSONResponse({"success": False, "message": "Usuário não autenticado"}, status_code=401)
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    if not cliente:
-        return JSONResponse({"success": False, "message": "Cliente não encontrado"}, status_code=404)
-
-    enderecos = db.query(Endereco).filter_by(id_cliente=cliente.id_cliente).all()
-    print(f"[DEBUG] listar_enderecos: encontrado {len(enderecos)} enderecos para cliente {cliente.id_cliente}")
+    enderecos = db.query(Endereco).filter_by(id_cliente=usuario.id_cliente).all()
+    print(f"[DEBUG] listar_enderecos: encontrado {len(enderecos)} enderecos para cliente {usuario.id_cliente}")
     result = []
     for e in enderecos:
         result.append({
@@ -80,18 +57,11 @@ def listar_enderecos(request: Request, db: Session = Depends(get_db)):
 
 
 @router.post("/api/enderecos/remover")
-def remover_endereco(request: Request, id_endereco: int = Form(...), db: Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+def remover_endereco(request: Request, id_endereco: int = Form(...), usuario: UsuarioSessao = Depends(usuario_atual), db: Session = Depends(get_db)):
+    if not usuario:
         return JSONResponse({"success": False, "message": "Usuário não autenticado"}, status_code=401)
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-    if not cliente:
-        return JSONResponse({"success": False, "message": "Cliente não encontrado"}, status_code=404)
-
-    endereco_obj = db.query(Endereco).filter_by(id_endereco=id_endereco, id_cliente=cliente.id_cliente).first()
+    endereco_obj = db.query(Endereco).filter_by(id_endereco=id_endereco, id_cliente=usuario.id_cliente).first()
     if not endereco_obj:
         return JSONResponse({"success": False, "message": "Endereço não encontrado"}, status_code=404)
 
@@ -120,15 +90,23 @@ def login(request: Request,
         db: Session = Depends(get_db)):
     
     cliente = db.query(Clientes).filter(Clientes.email == email).first()
-    if not cliente or not verificar_hash_senha(senha, cliente.senha):
+    senha_valida, novo_hash = False, None
+    if cliente:
+        # bcrypt roda no pool dedicado (auth.py); fila cheia vira 503 (handler no main.py)
+        senha_valida, novo_hash = verificar_senha_no_pool(senha, cliente.senha)
+    if not senha_valida:
         # Retorna JSON com status 200 para que o frontend capture o erro
         return JSONResponse(
             {"mensagem": "Credenciais inválidas"},
             status_code=200
         )
+
+    # Hash gerado com outro custo (BCRYPT_ROUNDS mudou): grava o hash refeito
+    if novo_hash:
+        cliente.senha = novo_hash
+        db.commit()
     
-    token = criar_token({"sub": cliente.email,
-    "is_admin":cliente.is_admin})
+    token = criar_token_cliente(cliente)
 
     # Determina o destino baseado no tipo de usuário
     if cliente.is_admin:
@@ -150,18 +128,13 @@ def cadastro_page(request: Request, db: Session = Depends(get_db)):
 #FALTA TESTAR E APLICAR
 #ROTA DE ENDEREÇO
 @router.get("/endereco", response_class=HTMLResponse)
-def pagina_endereco(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+def pagina_endereco(request: Request, usuario: UsuarioSessao = Depends(usuario_atual)):
+    if not usuario:
         return templates.TemplateResponse("perfil.html", {"request": request})
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-
     return templates.TemplateResponse("endereco.html", {
         "request": request,
-        "email": cliente.email if cliente else ""
+        "email": usuario.email
     })
 
 
@@ -189,6 +162,7 @@ def pagina_endereco(request: Request, db: Session = Depends(get_db)):
 @router.post("/salvar_endereco")
 def salvar_endereco(
     request: Request,
+    background_tasks: BackgroundTasks,
     logradouro: str = Form(...),
     numero: str = Form(...),
     complemento: str = Form(None),
@@ -198,26 +172,19 @@ def salvar_endereco(
     pais: str = Form("Brasil"),
     cep: str = Form(...),
     id_endereco: int = Form(None),
+    usuario: UsuarioSessao = Depends(usuario_atual),
     db: Session = Depends(get_db)
 ):
     # Verifica token de autenticação
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
+    if not usuario:
         return JSONResponse({"success": False, "message": "Usuário não autenticado"}, status_code=401)
 
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
-
-    if not cliente:
-        return {"erro": "Cliente não encontrado"}
-
     # Cria um novo endereço vinculado ao cliente
     #DADOS PEGOS DO BANCO E ATUALIZADOS - DIA 13/11/2025
     try:
         # If id_endereco provided, update existing record
         if id_endereco:
-            endereco_obj = db.query(Endereco).filter_by(id_endereco=id_endereco, id_cliente=cliente.id_cliente).first()
+            endereco_obj = db.query(Endereco).filter_by(id_endereco=id_endereco, id_cliente=usuario.id_cliente).first()
             if not endereco_obj:
                 return JSONResponse({"success": False, "message": "Endereço não encontrado"}, status_code=404)
             endereco_obj.logradouro = logradouro
@@ -227,10 +194,17 @@ def salvar_endereco(
             endereco_obj.cidade = cidade
             endereco_obj.estado = uf
             endereco_obj.pais = pais
+            # CEP novo: as coordenadas antigas não valem mais e são recalculadas em segundo plano
+            geocodificar = endereco_obj.cep != cep or endereco_obj.latitude is None
+            if geocodificar:
+                endereco_obj.latitude = None
+                endereco_obj.longitude = None
             endereco_obj.cep = cep
             db.add(endereco_obj)
             db.commit()
             db.refresh(endereco_obj)
+            if geocodificar:
+                background_tasks.add_task(geocodificar_endereco, endereco_obj.id_endereco, cep)
             return JSONResponse({"success": True, "endereco": {
                 "id_endereco": endereco_obj.id_endereco,
                 "logradouro": endereco_obj.logradouro,
@@ -246,7 +220,7 @@ def salvar_endereco(
         print(f"[DEBUG] salvar_endereco: recebido logradouro={logradouro!r}, numero={numero!r}, complemento={complemento!r}, bairro={bairro!r}, cidade={cidade!r}, uf={uf!r}, pais={pais!r}, cep={cep!r}, id_endereco={id_endereco!r}")
 
         novo_endereco = Endereco(
-            id_cliente=cliente.id_cliente,
+            id_cliente=usuario.id_cliente,
             logradouro=logradouro,
             numero=numero,
             complemento=complemento,
@@ -260,6 +234,7 @@ def salvar_endereco(
         db.add(novo_endereco)
         db.commit()
         db.refresh(novo_endereco)
+        background_tasks.add_task(geocodificar_endereco, novo_endereco.id_endereco, cep)
         return JSONResponse({"success": True, "endereco": {
             "id_endereco": novo_endereco.id_endereco,
             "logradouro": novo_endereco.logradouro,
@@ -345,7 +320,6 @@ def salvar_endereco(
 @router.post("/register")
 def cadastrar_cliente(
     request: Request,
-    background_tasks: BackgroundTasks,
     nome: str = Form(...),
     cpf: str = Form(...),
     email: str = Form(...),
@@ -394,7 +368,7 @@ def cadastrar_cliente(
             "telefone": telefone
         })
 
-    senha_hash = gerar_senha(senha)
+    senha_hash = gerar_senha_no_pool(senha)
 
     novo_cliente = Clientes(
         nome=nome,
@@ -404,20 +378,20 @@ def cadastrar_cliente(
         telefone=telefone
     )
 
+    # cliente e e-mail de boas-vindas na mesma transação (enviado pelo despachante, fila_emails.py)
     db.add(novo_cliente)
+    enfileirar_email(db, "boas_vindas", email)
     db.commit()
     db.refresh(novo_cliente)
-
-    # ---------------------------
-    # Envio de e-mail 
-    # ---------------------------
-    background_tasks.add_task(send_welcome_email, email)
+    despachante_emails.avisar()
 
     return RedirectResponse(url="/login", status_code=303)
 
 # Rota para perfil do usuário
+PEDIDOS_POR_PAGINA = 10
+
 @router.get("/perfil", response_class=HTMLResponse, name="perfil")
-def perfil(request: Request, db: Session = Depends(get_db)):
+def perfil(request: Request, pedidos_antes: int = Query(None), db: Session = Depends(get_db)):
     context = get_base_context(request, db)
     cliente = context.get("user")  # 'cliente' agora é o 'user' do contexto
 
@@ -428,11 +402,24 @@ def perfil(request: Request, db: Session = Depends(get_db)):
         })
 
     # Buscar itens do carrinho do usuário
-    carrinho = carrinhos.get(cliente.id_cliente, [])
-    total = sum(item["preco"] * item["quantidade"] for item in carrinho)
+    carrinho = carrinho_store.obter(cliente.id_cliente)
     # Buscar pedidos do usuário e enviar ao template (aba Pedidos)
+    # Paginado por id (mais recentes primeiro); itens e produtos vêm em uma consulta extra
+    # (selectinload + produto joined) em vez de uma por pedido
+    proximos_pedidos = None
     try:
-        pedidos = db.query(Pedidos).filter(Pedidos.id_cliente == cliente.id_cliente).all()
+        consulta = (
+            db.query(Pedidos)
+            .options(selectinload(Pedidos.itens))
+            .filter(Pedidos.id_cliente == cliente.id_cliente)
+        )
+        if pedidos_antes:
+            consulta = consulta.filter(Pedidos.id_pedido < pedidos_antes)
+        # busca um a mais só para saber se existe próxima página
+        pedidos = consulta.order_by(Pedidos.id_pedido.desc()).limit(PEDIDOS_POR_PAGINA + 1).all()
+        if len(pedidos) > PEDIDOS_POR_PAGINA:
+            pedidos = pedidos[:PEDIDOS_POR_PAGINA]
+            proximos_pedidos = pedidos[-1].id_pedido
     except Exception:
         pedidos = []
 
@@ -440,8 +427,10 @@ def perfil(request: Request, db: Session = Depends(get_db)):
     context.update({
         "cliente": cliente,
         "carrinho": carrinho,
-        "total": total,
-        "pedidos": pedidos
+        "total": carrinho.total,
+        "pedidos": pedidos,
+        "pedidos_antes": pedidos_antes,
+        "proximos_pedidos": proximos_pedidos
     })
     return templates.TemplateResponse("pages/perfil/perfil.html", context)
 
@@ -454,27 +443,28 @@ def pagina_checkout(request: Request, db: Session = Depends(get_db)):
     if not context.get("user"):
         return RedirectResponse(url="/login", status_code=303)
     
-    carrinho = carrinhos.get(context["user"].id_cliente, [])
-    total = sum(item["preco"] * item["quantidade"] for item in carrinho)
+    carrinho = carrinho_store.obter(context["user"].id_cliente)
 
-    context.update({"carrinho": carrinho, "total": total})
+    context.update({
+        "carrinho": carrinho,
+        "total": carrinho.total,
+        "from_profile": request.query_params.get("from_profile") == "true",
+        # chave de idempotência do POST /checkout: um clique duplo não cria dois pedidos
+        "chave_idempotencia": uuid.uuid4().hex,
+    })
     return templates.TemplateResponse("pages/checkout/checkout.html", context)
 
 # Rota para atualizar senha do perfil
 @router.post("/perfil/atualizar-senha", name="atualizar_senha")
 def atualizar_senha(request: Request, nova_senha: str = Form(...), db: Session = Depends(get_db)):
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not token or not payload:
-        return RedirectResponse(url="/login", status_code=303)
-    email = payload.get("sub")
-    cliente = db.query(Clientes).filter_by(email=email).first()
+    cliente = get_user_from_token(request, db)
     if not cliente:
         return RedirectResponse(url="/login", status_code=303)
-    senha_hash = gerar_senha(nova_senha)
+    senha_hash = gerar_senha_no_pool(nova_senha)
     cliente.senha = senha_hash
     db.add(cliente)
     db.commit()
+    invalidar_usuario(cliente.id_cliente)
     return RedirectResponse(url="/perfil", status_code=303)
 
 # Rota para logout (remove cookie do token e redireciona)
@@ -495,17 +485,10 @@ async def toggle_favorito(request: Request, db: Session = Depends(get_db)):
     Esta rota é chamada via JavaScript (Fetch API).
     """
     print("----- Início da requisição /api/favoritos/toggle -----")
-    token = request.cookies.get("token")
-    print(f"Token recebido: {token is not None}")
-    payload = verificar_token(token)
-    if not payload:
-        print("Erro: Payload do token inválido ou token ausente.")
-        return JSONResponse({'status': 'error', 'message': 'Login necessário.'}, status_code=401)
-
-    user = get_user_from_token(request, db)
+    user = obter_usuario(request, db)
     if not user:
-        print("Erro: Usuário não encontrado após verificação do token.")
-        return JSONResponse({'status': 'error', 'message': 'Usuário não encontrado.'}, status_code=404)
+        print("Erro: token inválido, ausente ou de usuário inexistente.")
+        return JSONResponse({'status': 'error', 'message': 'Login necessário.'}, status_code=401)
     print(f"Usuário autenticado: {user.id_cliente}")
 
     try:
@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database import get_db
-from models.models import Cupom
+from fastapi import APIRouter
+from controllers.cupom_indice import indice_cupons
 
 router = APIRouter(prefix="/api/cupom", tags=["Cupom"])
 
 @router.get("/validar")
-def validar_cupom(codigo: str, total: float, db: Session = Depends(get_db)):
-    cupom = db.query(Cupom).filter_by(chave_cupon=codigo, ativo=True).first()
+def validar_cupom(codigo: str, total: float):
+    # cupons em memória (controllers/cupom_indice.py): não consulta o banco.
+    # Os limites de uso são conferidos no checkout, ao registrar o uso.
+    cupom = indice_cupons.buscar(codigo)
 
     if not cupom:
         return {"success": False, "msg": "Cupom inválido ou expirado."}
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from sqlalchemy import update, or_
+from sqlalchemy.dialects import mysql, sqlite
+from database import SessionLocal
+from models.models import Cupom, CupomUso
+from versoes import ler_versao, incrementar_versao
+
+# Cupons ativos em memória: validar o código (/api/cupom/validar e checkout) não consulta o
+# banco. Em campanha todo mundo digita o mesmo código ao mesmo tempo, então a consulta por
+# chave_cupon a cada tecla/pedido vira o gargalo.
+# Os limites de uso são contadores no MySQL, incrementados com UPDATE condicional dentro da
+# transação do pedido (o índice em memória só diz se o cupom existe e o desconto).
+# Recarga: quando a versão "cupons" do SQLite local muda (ex.: cupom esgotou em outro worker)
+# e também a cada CUPONS_RECARREGAR_A_CADA segundos, porque os cupons são cadastrados
+# direto no banco. A recarga roda numa thread separada (uma por vez) e o índice antigo continua
+# respondendo até a troca: numa campanha, as requisições que chegam com o índice vencido não
+# vão todas ao banco ao mesmo tempo. Só a primeira carga (se o lifespan não carregou) é feita
+# na requisição, por uma só delas.
+
+CUPONS_RECARREGAR_A_CADA = float(os.getenv("CUPONS_RECARREGAR_A_CADA", 60))
+# intervalo mínimo entre verificações da versão compartilhada
+VERIFICAR_VERSAO_A_CADA = 2.0
+
+
+def normalizar_codigo(codigo) -> str:
+    """O MySQL compara chave_cupon sem diferenciar maiúsculas; o índice faz o mesmo."""
+    return (codigo or "").strip().casefold()
+
+
+class CupomIndexado:
+    __slots__ = ("id_cupon", "chave", "valor_desconto", "max_usos", "max_usos_por_cliente")
+
+    def __init__(self, cupom):
+        self.id_cupon = cupom.id_cupon
+        self.chave = cupom.chave_cupon
+        self.valor_desconto = cupom.valor_desconto
+        self.max_usos = cupom.max_usos
+        self.max_usos_por_cliente = cupom.max_usos_por_cliente
+
+
+class IndiceCupons:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._carga_lock = threading.Lock()  # primeira carga feita por uma requisição só
+        self._cupons = {}  # código normalizado -> CupomIndexado
+        self._recarregando = False
+        self._carregado = False
+        self._versao = None
+        self._carregado_em = 0.0
+        self._verificado_em = 0.0
+
+    def carregar(self, db):
+        """(Re)carrega os cupons ativos e ainda não esgotados."""
+        # lê a versão antes do banco: uma alteração feita durante a carga força nova recarga depois
+        versao = ler_versao("cupons")
+        linhas = (
+            db.query(Cupom.id_cupon, Cupom.chave_cupon, Cupom.valor_desconto,
+                     Cupom.max_usos, Cupom.max_usos_por_cliente)
+            .filter(Cupom.ativo == True, or_(Cupom.max_usos == None, Cupom.usos < Cupom.max_usos))
+            .all()
+        )
+        cupons = {}
+        for linha in linhas:
+            codigo = normalizar_codigo(linha.chave_cupon)
+            if codigo and linha.valor_desconto is not None:
+                cupons[codigo] = CupomIndexado(linha)
+        with self._lock:
+            self._cupons = cupons
+            self._carregado = True
+            self._versao = versao
+            self._carregado_em = self._verificado_em = time.monotonic()
+
+    def garantir_atualizado(self):
+        agora = time.monotonic()
+        if self._carregado:
+            if agora - self._carregado_em < CUPONS_RECARREGAR_A_CADA:
+                if agora - self._verificado_em < VERIFICAR_VERSAO_A_CADA:
+                    return
+                self._verificado_em = agora
+                if ler_versao("cupons") == self._versao:
+                    return
+            # vencido: recarrega em segundo plano e responde com o índice atual
+            self._recarregar_em_segundo_plano()
+            return
+        with self._carga_lock:
+            if not self._carregado:
+                with SessionLocal() as db:
+                    self.carregar(db)
+
+    def _recarregar_em_segundo_plano(self):
+        with self._lock:
+            if self._recarregando:
+                return
+            self._recarregando = True
+
+        def recarregar():
+            try:
+                with SessionLocal() as db:
+                    self.carregar(db)
+            except Exception as e:
+                print(f"Erro ao recarregar os cupons: {e}")
+                self._verificado_em = 0.0
+            finally:
+                self._recarregando = False
+
+        threading.Thread(target=recarregar, name="recarga-cupons", daemon=True).start()
+
+    def buscar(self, codigo: str):
+        """CupomIndexado do código, ou None se não existe, está inativo ou esgotou."""
+        codigo = normalizar_codigo(codigo)
+        if not codigo:
+            return None
+        self.garantir_atualizado()
+        return self._cupons.get(codigo)
+
+    def invalidar(self):
+        """Força a recarga em todos os workers (chamar após alterar cupons no banco)."""
+        incrementar_versao("cupons")
+        with self._lock:
+            self._versao = None
+            self._verificado_em = 0.0
+
+
+def _inserir_contador_cliente(db, id_cupon: int, id_cliente: int):
+    """INSERT da linha (cupom, cliente) com usos=0 que não falha se ela já existe, no dialeto do banco
+    (MySQL em produção, SQLite nos testes)."""
+    valores = {"id_cupon": id_cupon, "id_cliente": id_cliente, "usos": 0}
+    if db.get_bind().dialect.name == "mysql":
+        # "atualiza" para o próprio valor: não mexe no contador e não gera erro
+        return mysql.insert(CupomUso).values(**valores).on_duplicate_key_update(usos=CupomUso.usos)
+    return sqlite.insert(CupomUso).values(**valores).on_conflict_do_nothing()
+
+
+def registrar_uso_cupom(db, cupom: CupomIndexado, id_cliente: int):
+    """Conta um uso do cupom na transação do pedido (sem commit; quem chama faz commit/rollback).
+    Retorna None se o uso foi registrado ou a mensagem de erro se algum limite foi atingido."""
+    if cupom.max_usos_por_cliente is not None:
+        # linha do contador do cliente (já existir não é erro)
+        db.execute(_inserir_contador_cliente(db, cupom.id_cupon, id_cliente))
+        resultado = db.execute(
+            update(CupomUso)
+            .where(CupomUso.id_cupon == cupom.id_cupon, CupomUso.id_cliente == id_cliente,
+                   CupomUso.usos < cupom.max_usos_por_cliente)
+            .values(usos=CupomUso.usos + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount != 1:
+            return f"Você já usou o cupom {cupom.chave} o número máximo de vezes."
+
+    # contador geral por último: é a linha disputada por todos, fica travada o menor tempo possível
+    resultado = db.execute(
+        update(Cupom)
+        .where(Cupom.id_cupon == cupom.id_cupon, Cupom.ativo == True,
+               or_(Cupom.max_usos == None, Cupom.usos < Cupom.max_usos))
+        .values(usos=Cupom.usos + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != 1:
+        # esgotou (ou foi desativado): tira o cupom do índice de todos os workers
+        indice_cupons.invalidar()
+        return f"O cupom {cupom.chave} esgotou ou não está mais ativo."
+    return None
+
+
+# instância única do processo (carregada no lifespan, main.py)
+indice_cupons = IndiceCupons()
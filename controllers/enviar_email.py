@@ -1,256 +1,82 @@
-from email.message import EmailMessage
-import aiosmtplib
-
-SMTP_EMAIL = "4linhasesportes.ofc@gmail.com"
-SMTP_PASSWORD = "egvd ctuo eveu tviw"
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-
-# email após cadastrar (versão responsiva)
-async def send_welcome_email(to_email: str):
+import os
+from email.message import EmailMessage, MIMEPart
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+# Montagem das mensagens. O envio é feito pela fila de e-mails (fila_emails.py): as rotas só
+# gravam o e-mail na tabela emails_pendentes com os dados necessários para montá-lo.
+# O HTML fica em templates/emails/, compilado uma vez na importação (subida do servidor).
+# O e-mail de boas-vindas é igual para todos: é renderizado e codificado uma vez só e cada
+# mensagem reaproveita as mesmas partes MIME, mudando apenas os cabeçalhos.
+
+SMTP_EMAIL = os.getenv("SMTP_EMAIL", "4linhasesportes.ofc@gmail.com")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "egvd ctuo eveu tviw")
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+# SMTP_STARTTLS=0 para servidor local de teste sem TLS (ex.: aiosmtpd); sem senha não faz login
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+
+EMAIL_TEMPLATES_DIR = os.getenv("EMAIL_TEMPLATES_DIR", "templates/emails")
+
+_ambiente = Environment(
+    loader=FileSystemLoader(EMAIL_TEMPLATES_DIR),
+    autoescape=select_autoescape(["html"]),  # nome de produto com "<" não quebra o HTML
+    auto_reload=False,
+)
+_template_pedido_html = _ambiente.get_template("pedido.html")
+_template_pedido_texto = _ambiente.get_template("pedido.txt")
+
+
+def _parte(conteudo: str, subtipo: str) -> MIMEPart:
+    parte = MIMEPart()
+    parte.set_content(conteudo, subtype=subtipo)
+    return parte
+
+
+def _mensagem(to_email: str, assunto: str, partes) -> EmailMessage:
+    """Mensagem multipart/alternative (texto + HTML) com as partes já codificadas."""
     msg = EmailMessage()
     msg["From"] = SMTP_EMAIL
     msg["To"] = to_email
-    msg["Subject"] = "Bem-vindo ao nosso site!"
-
-    # HTML responsivo
-    html_content = """\
-<html>
-<body style="margin: 0; padding: 0; background-color: #f5f5f5; font-family: Arial, sans-serif;">
-
-  <!-- Container principal -->
-  <div style="
-      max-width: 600px;
-      width: 100%;
-      margin: auto;
-      background: white;
-      border-radius: 12px;
-      overflow: hidden;
-      box-shadow: 0 4px 15px rgba(0,0,0,0.08);
-  ">
-
-    <!-- Header -->
-    <div style="
-        background-color: #ff4d4f;
-        padding: 25px;
-        text-align: center;
-        color: white;
-    ">
-      <h1 style="margin: 0; font-size: 24px;">4Linhas Esportes</h1>
-      <p style="margin: 6px 0 0; font-size: 14px;">Bem-vindo ao nosso time! ⚽🔥</p>
-    </div>
-
-    <!-- Corpo -->
-    <div style="padding: 25px;">
-
-      <h2 style="color: #333; margin-top: 0; text-align: center;">
-        Bem-vindo! 🎉
-      </h2>
-
-      <p style="font-size: 16px; color: #555; line-height: 1.6;">
-        Estamos muito felizes por ter você com a gente na <strong>4Linhas</strong>,
-        o seu e-commerce de artigos esportivos preferido.
-      </p>
-
-      <p style="font-size: 16px; color: #555; line-height: 1.6;">
-        Como agradecimento, aqui está seu <strong>cupom exclusivo de boas-vindas</strong>:
-      </p>
-
-      <!-- Cupom -->
-      <div style="text-align: center; margin: 30px 0;">
-        <div style="
-            display: inline-block;
-            background-color: #ff4d4f;
-            color: white;
-            font-weight: bold;
-            padding: 16px 28px;
-            border-radius: 10px;
-            font-size: 22px;
-            letter-spacing: 1px;
-            box-shadow: 0 3px 10px rgba(255, 77, 79, 0.35);
-            width: auto;
-        ">
-          BEMVINDO10
-        </div>
-
-        <p style="font-size: 14px; color: #777; margin-top: 10px;">
-          Use no checkout para garantir seu desconto 🎁
-        </p>
-      </div>
-
-      <p style="font-size: 16px; color: #444; line-height: 1.6;">
-        Aproveite para explorar nossas categorias e encontrar
-        o que combina com seu esporte favorito.
-      </p>
-
-      <p style="font-size: 16px; color: #444; line-height: 1.6;">
-        Boas compras e bons treinos! 🏃‍♂️⚽🏀
-      </p>
-
-      <p style="margin-top: 25px; font-size: 14px; color: #777; text-align: center;">
-        Qualquer dúvida, nossa equipe está pronta para ajudar.
-      </p>
-
-    </div>
-
-    <!-- Rodapé -->
-    <div style="
-        background-color: #fafafa;
-        text-align: center;
-        padding: 15px;
-        font-size: 12px;
-        color: #888;
-    ">
-      © 2025 4Linhas Esportes — Todos os direitos reservados.
-    </div>
-
-  </div>
-
-</body>
-</html>
-"""
-
-    msg.set_content("Obrigado por se cadastrar! Seu cupom é: BEMVINDO10")
-    msg.add_alternative(html_content, subtype="html")
-
-    await aiosmtplib.send(
-        msg,
-        hostname=SMTP_SERVER,
-        port=SMTP_PORT,
-        start_tls=True,
-        username=SMTP_EMAIL,
-        password=SMTP_PASSWORD,
+    msg["Subject"] = assunto
+    msg.make_alternative()
+    for parte in partes:
+        msg.attach(parte)
+    return msg
+
+
+# email após cadastrar: conteúdo fixo, partes MIME montadas uma vez
+_PARTES_BOAS_VINDAS = (
+    _parte("Obrigado por se cadastrar! Seu cupom é: BEMVINDO10", "plain"),
+    _parte(_ambiente.get_template("boas_vindas.html").render(), "html"),
+)
+
+def montar_email_boas_vindas(to_email: str, dados: dict = None) -> EmailMessage:
+    return _mensagem(to_email, "Bem-vindo ao nosso site!", _PARTES_BOAS_VINDAS)
+
+
+# email ao completar o pedido (versão responsiva); as linhas dos itens saem do loop do template
+# dados = {"id_pedido": ..., "valor_total": ..., "itens": [{"nome", "quantidade", "preco", "imagem"}]}
+def montar_email_pedido(to_email: str, dados: dict) -> EmailMessage:
+    contexto = {
+        "id_pedido": dados["id_pedido"],
+        "valor_total": dados["valor_total"],
+        "itens": dados["itens"],
+    }
+    return _mensagem(
+        to_email,
+        f"Obrigado pela sua compra! Pedido #{contexto['id_pedido']}",
+        (
+            _parte(_template_pedido_texto.render(contexto), "plain"),
+            _parte(_template_pedido_html.render(contexto), "html"),
+        ),
     )
 
-    return True
-
 
-# email ao completar o pedido (versão responsiva)
-async def send_order_email(to_email: str, pedido, itens):
-    msg = EmailMessage()
-    msg["From"] = SMTP_EMAIL
-    msg["To"] = to_email
-    msg["Subject"] = f"Obrigado pela sua compra! Pedido #{pedido.id_pedido}"
-
-    # Fallback (texto simples)
-    resumo = "Itens do pedido:\n"
-    for item in itens:
-        resumo += f"- {item['nome']} | Qtde: {item['quantidade']} | R$ {item['preco']:.2f}\n"
-
-    msg.set_content(f"""
-Obrigado pela sua compra!
-
-Seu pedido #{pedido.id_pedido} foi recebido e está sendo processado.
-
-{resumo}
-
-Total: R$ {pedido.valor_total:.2f}
-
-Agradecemos a preferência!
-Equipe 4Linhas
-""")
-
-    # HTML dos itens com imagem + responsivo
-    html_itens = ""
-    for item in itens:
-        imagem = item.get("imagem", "https://via.placeholder.com/80")
-
-        html_itens += f"""
-        <tr>
-            <td style="padding: 15px 5px; border-bottom: 1px solid #eee; text-align: center;">
-                <img src="{imagem}" 
-                     style="width: 80px; height: 80px; object-fit: cover; border-radius: 8px;">
-                <div style="font-weight: bold; margin-top: 5px;">{item['nome']}</div>
-            </td>
-
-            <td style="padding: 15px 5px; border-bottom: 1px solid #eee; text-align: center;">
-                {item['quantidade']}
-            </td>
-
-            <td style="padding: 15px 5px; border-bottom: 1px solid #eee; text-align: center;">
-                R$ {item['preco']:.2f}
-            </td>
-        </tr>
-        """
-
-    # HTML final responsivo
-    html_content = f"""
-<html>
-<body style="margin: 0; padding: 0; background-color: #f4f4f4; font-family: Arial, sans-serif;">
-
-<!-- Container responsivo -->
-<div style="
-    max-width: 600px;
-    width: 100%;
-    margin: auto;
-    background: #ffffff;
-    padding: 20px;
-    border-radius: 10px;
-">
-
-    <h2 style="color: #FF6B35; text-align: center; margin-top: 0;">
-        Obrigado pela sua compra! 🎉
-    </h2>
-
-    <p style="font-size: 16px; text-align: center;">
-        Seu pedido <strong>#{pedido.id_pedido}</strong> foi confirmado!
-    </p>
-
-    <!-- Tabela responsiva -->
-    <div style="overflow-x: auto;">
-        <table style="width: 100%; border-collapse: collapse; min-width: 300px;">
-            <thead>
-                <tr style="background-color: #FF6B35; color: white;">
-                    <th style="padding: 12px;">Produto</th>
-                    <th style="padding: 12px;">Qtde</th>
-                    <th style="padding: 12px;">Preço</th>
-                </tr>
-            </thead>
-            <tbody>
-                {html_itens}
-            </tbody>
-        </table>
-    </div>
-
-    <p style="margin-top: 25px; font-size: 20px; text-align: right;">
-        <strong>Total:</strong> R$ {pedido.valor_total:.2f}
-    </p>
-
-    <p style="text-align: center; margin-top: 30px;">
-        <a href="#" 
-           style="
-                background-color:#FF6B35;
-                color:white;
-                padding:12px 25px;
-                border-radius:8px;
-                text-decoration:none;
-                font-size:16px;
-                display:inline-block;
-            ">
-            Acompanhar Pedido 🚚
-        </a>
-    </p>
-
-    <p style="margin-top: 20px; text-align: center; font-size: 15px;">
-        Obrigado por comprar conosco! 🛒<br>
-        <strong>Equipe 4Linhas</strong>
-    </p>
-
-</div>
-
-</body>
-</html>
-"""
-
-    msg.add_alternative(html_content, subtype="html")
-
-    await aiosmtplib.send(
-        msg,
-        hostname=SMTP_SERVER,
-        port=SMTP_PORT,
-        start_tls=True,
-        username=SMTP_EMAIL,
-        password=SMTP_PASSWORD,
-    )
+# tipo gravado na fila -> função que monta a mensagem
+MONTADORES = {
+    "boas_vindas": montar_email_boas_vindas,
+    "pedido": montar_email_pedido,
+}
 
-    return True
\ No newline at end of file
+def montar_email(tipo: str, destinatario: str, dados: dict) -> EmailMessage:
+    return MONTADORES[tipo](destinatario, dados)
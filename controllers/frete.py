@@ -1,14 +1,42 @@
 # controllers/frete.py   # NOVO ARQUIVO
 
 from fastapi import APIRouter, Query, Request, Depends, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import json
 import httpx
 import math
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional (ver distancias_km)
+    np = None
 from urllib.parse import quote # Importa a função para codificar a URL
-from auth import verificar_token
+from datetime import datetime, timedelta
+from jose import jwt, JWTError
+from sqlalchemy.orm import Session
+from auth import verificar_token, SECRET_KEY, ALGORITHM
+from database import get_db, SessionLocal
+from models.models import Endereco
+from controllers.sessao import obter_usuario
+from cep_cache import cache_cep, limpar_cep, AUSENTE
+from controle_chamadas import ChamadaUnica, LimiteTaxa, LimiteTaxaExcedido, ServicoExterno, ServicoIndisponivel
+from controllers.cep_centroides import tabela_centroides
 
 
 router = APIRouter(prefix="/api/frete")
 
+ORIGEM_LAT, ORIGEM_LON = -23.5422, -46.6066  # CEP 03008-020 (base)
+
+# Cotação em lote (/api/frete/lote)
+FRETE_LOTE_MAX = 1000
+# listas maiores que isso são respondidas em NDJSON, à medida que cada bloco fica pronto
+FRETE_LOTE_STREAM_A_PARTIR = 100
+FRETE_LOTE_BLOCO = 50
+
+# Validade da cotação assinada devolvida pelo /api/frete e conferida no checkout
+FRETE_COTACAO_MINUTOS = 30
+
 # Função haversine para calcular distância entre CEPs
 def haversine_distance(lat1, lon1, lat2, lon2):
     R = 6371  # km
@@ -18,91 +46,146 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
-# Buscar latitude/longitude pelo CEP usando geocodificador gratuito
-async def get_lat_lon_from_cep(cep: str):
-    cep_limpo = cep.replace("-", "").strip()
-    headers = {"User-Agent": "Ecommerce-4linhas/1.0", "Accept-Language": "pt-BR"}
+# Mesma conta da haversine_distance para vários destinos de uma vez (vetorizada com numpy)
+def distancias_km(lat_origem, lon_origem, lats, lons) -> list:
+    if np is None:
+        return [haversine_distance(lat_origem, lon_origem, lat, lon) for lat, lon in zip(lats, lons)]
+    R = 6371  # km
+    lats_rad = np.radians(np.asarray(lats, dtype=float))
+    d_lat = lats_rad - math.radians(lat_origem)
+    d_lon = np.radians(np.asarray(lons, dtype=float) - lon_origem)
+    a = np.sin(d_lat/2)**2 + math.cos(math.radians(lat_origem)) * np.cos(lats_rad) * np.sin(d_lon/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    return (R * c).tolist()
 
-    try:
-        # --- TENTATIVA 1: Buscar diretamente pelo CEP usando postalcode (limitar país e resultados) ---
-        url_cep = f"https://nominatim.openstreetmap.org/search?postalcode={cep_limpo}&countrycodes=br&format=json&limit=1"
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url_cep, headers=headers)
-            # Se a API devolver 4xx/5xx, tratamos abaixo
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    return float(data[0]["lat"]), float(data[0]["lon"])
-            else:
-                # Log mais explícito para debug (não interrompe a execução)
-                print(f"Nominatim (postalcode) retornou {response.status_code} para URL: {url_cep}")
-
-        # --- TENTATIVA 2 (Fallback): Usar ViaCEP para obter o endereço e depois buscar no Nominatim ---
-        url_viacep = f"https://viacep.com.br/ws/{cep_limpo}/json/"
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response_viacep = await client.get(url_viacep, headers=headers)
-            if response_viacep.status_code != 200:
-                print(f"ViaCEP retornou {response_viacep.status_code} para CEP {cep_limpo}")
-                return None
-            dados_endereco = response_viacep.json()
-
-        if dados_endereco.get("erro"):
-            return None
-
-        # Constrói uma query de busca com o endereço obtido
-        logradouro = dados_endereco.get("logradouro", "")
-        cidade = dados_endereco.get("localidade", "")
-        estado = dados_endereco.get("uf", "")
-        # Se o logradouro estiver vazio, incluir apenas cidade/estado para aumentar chance de acerto
-        if logradouro:
-            query_endereco_raw = f"{logradouro}, {cidade}, {estado}, Brasil"
-        else:
-            query_endereco_raw = f"{cidade}, {estado}, Brasil"
 
-        query_endereco_encoded = quote(query_endereco_raw) # Codifica o endereço para a URL
+# Limites por serviço: o Nominatim público aceita 1 requisição/s (política de uso),
+# o ViaCEP não documenta limite mas evitamos abrir conexões demais. O ViaCEP também
+# alimenta o autopreenchimento de endereço (/api/endereco), por isso o timeout curto.
+NOMINATIM = ServicoExterno("nominatim", max_simultaneas=2, limite_taxa=LimiteTaxa("nominatim", taxa=1.0), timeout=10.0)
+VIACEP = ServicoExterno("viacep", max_simultaneas=10, timeout=5.0)
+# consultas simultâneas do mesmo CEP compartilham a mesma chamada externa
+_consultas_cep = ChamadaUnica()
 
-        url_endereco = f"https://nominatim.openstreetmap.org/search?q={query_endereco_encoded}&countrycodes=br&format=json&limit=1"
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response_nominatim = await client.get(url_endereco, headers=headers)
-            if response_nominatim.status_code == 200:
-                data_final = response_nominatim.json()
-                if data_final:
-                    return float(data_final[0]["lat"]), float(data_final[0]["lon"])
-            else:
-                print(f"Nominatim (endereco) retornou {response_nominatim.status_code} para URL: {url_endereco}")
+# Dados de endereço do ViaCEP (com cache). Retorna o dict do ViaCEP, ou None se o CEP não existe.
+# Erros de rede/status sobem como httpx.HTTPError (ou ServicoIndisponivel com o disjuntor aberto)
+# e não são guardados no cache. Usado pelo frete e pelo /api/endereco (controllers/pedido.py).
+async def obter_endereco_viacep(cep_limpo: str):
+    em_cache = await cache_cep.get("endereco", cep_limpo)
+    if em_cache is not AUSENTE:
+        return em_cache
+    return await _consultas_cep.executar(("endereco", cep_limpo), lambda: _consultar_viacep(cep_limpo))
+
+
+async def _consultar_viacep(cep_limpo: str):
+    url_viacep = f"https://viacep.com.br/ws/{cep_limpo}/json/"
+    response_viacep = await VIACEP.get(url_viacep)
+    response_viacep.raise_for_status()
+    dados_endereco = response_viacep.json()
+
+    if dados_endereco.get("erro"):
+        dados_endereco = None
+    await cache_cep.set("endereco", cep_limpo, dados_endereco)
+    return dados_endereco
 
-        return None # Não encontrou em nenhuma das tentativas
 
-    except (httpx.HTTPStatusError, httpx.RequestError, IndexError, KeyError) as e:
-        print(f"Erro ao obter geolocalização para o CEP {cep}: {e}")
+def formatar_endereco(dados: dict) -> str:
+    # monta string compatível com front-end: logradouro - bairro - cidade - uf
+    partes = [dados.get(campo) or "" for campo in ("logradouro", "bairro", "localidade", "uf")]
+    return " - ".join(p for p in partes if p)
+
+
+# Buscar latitude/longitude pelo CEP: cache, tabela offline de centroides e, por último, geocodificador gratuito
+async def get_lat_lon_from_cep(cep: str):
+    cep_limpo = limpar_cep(cep)
+    if not cep_limpo:
         return None
+    coordenadas, _ = await _localizar_cep(cep_limpo)
+    return coordenadas
 
 
-@router.get("")  # /api/frete?cep=XXXXX-XXX OR /api/frete?cep_destino=XXXXX-XXX
-async def calcular_frete(request: Request, cep: str = Query(None), cep_destino: str = Query(None)):
-    # Adiciona verificação de autenticação
-    token = request.cookies.get("token")
-    payload = verificar_token(token)
-    if not payload:
-        return {"success": False, "msg": "Usuário não autenticado"}
-    # aceita ambos parâmetros `cep` ou `cep_destino` (compatibilidade front-end)
-    cep_value = cep or cep_destino
-    if not cep_value:
-        return {"success": False, "msg": "Parâmetro 'cep' é obrigatório"}
+async def _localizar_cep(cep_limpo: str):
+    """Retorna ((lat, lon) ou None, definitivo). `definitivo` é False quando a localização falhou
+    por limite de taxa, serviço fora do ar ou erro de rede: vale tentar de novo mais tarde."""
+    em_cache = await cache_cep.get("geo", cep_limpo)
+    if em_cache is not AUSENTE:
+        return (tuple(em_cache) if em_cache else None), True
+    # tabela offline de faixas de CEP: sem rede; o geocodificador fica para o que não está nela
+    centroide = tabela_centroides.buscar(cep_limpo)
+    if centroide is not None:
+        return centroide, True
+    return await _consultas_cep.executar(("geo", cep_limpo), lambda: _geocodificar_com_cache(cep_limpo))
 
-    origem_lat, origem_lon = -23.5422, -46.6066  # CEP 03008-020 (base)
 
-    destino = await get_lat_lon_from_cep(cep_value)
-    if not destino:
-        return {"success": False, "msg": "CEP inválido"}
+async def _geocodificar_com_cache(cep_limpo: str):
+    try:
+        coordenadas, definitivo = await _geocodificar(cep_limpo)
+    except (httpx.HTTPStatusError, httpx.RequestError, IndexError, KeyError, ValueError,
+            LimiteTaxaExcedido, ServicoIndisponivel) as e:
+        print(f"Erro ao obter geolocalização para o CEP {cep_limpo}: {e}")
+        return None, False
+
+    # falhas temporárias (status de erro dos serviços) não entram no cache negativo
+    if coordenadas or definitivo:
+        await cache_cep.set("geo", cep_limpo, list(coordenadas) if coordenadas else None)
+    return coordenadas, bool(coordenadas) or definitivo
+
+
+async def _geocodificar(cep_limpo: str):
+    """Consulta os serviços externos. Retorna ((lat, lon) ou None, resultado_definitivo)."""
+    # --- TENTATIVA 1: Buscar diretamente pelo CEP usando postalcode (limitar país e resultados) ---
+    url_cep = f"https://nominatim.openstreetmap.org/search?postalcode={cep_limpo}&countrycodes=br&format=json&limit=1"
+    response = await NOMINATIM.get(url_cep)
+    # Se a API devolver 4xx/5xx, tratamos abaixo
+    if response.status_code == 200:
+        data = response.json()
+        if data:
+            return (float(data[0]["lat"]), float(data[0]["lon"])), True
+    else:
+        # Log mais explícito para debug (não interrompe a execução)
+        print(f"Nominatim (postalcode) retornou {response.status_code} para URL: {url_cep}")
+
+    # --- TENTATIVA 2 (Fallback): Usar ViaCEP para obter o endereço e depois buscar no Nominatim ---
+    try:
+        dados_endereco = await obter_endereco_viacep(cep_limpo)
+    except httpx.HTTPStatusError as e:
+        print(f"ViaCEP retornou {e.response.status_code} para CEP {cep_limpo}")
+        return None, False
+    except ServicoIndisponivel as e:
+        print(e)
+        return None, False
+
+    if dados_endereco is None:
+        return None, True  # CEP inexistente
+
+    # Constrói uma query de busca com o endereço obtido
+    logradouro = dados_endereco.get("logradouro", "")
+    cidade = dados_endereco.get("localidade", "")
+    estado = dados_endereco.get("uf", "")
+    # Se o logradouro estiver vazio, incluir apenas cidade/estado para aumentar chance de acerto
+    if logradouro:
+        query_endereco_raw = f"{logradouro}, {cidade}, {estado}, Brasil"
+    else:
+        query_endereco_raw = f"{cidade}, {estado}, Brasil"
+
+    query_endereco_encoded = quote(query_endereco_raw) # Codifica o endereço para a URL
 
-    dest_lat, dest_lon = destino
-    distancia_km = haversine_distance(origem_lat, origem_lon, dest_lat, dest_lon)
+    url_endereco = f"https://nominatim.openstreetmap.org/search?q={query_endereco_encoded}&countrycodes=br&format=json&limit=1"
+    response_nominatim = await NOMINATIM.get(url_endereco)
+    if response_nominatim.status_code == 200:
+        data_final = response_nominatim.json()
+        if data_final:
+            return (float(data_final[0]["lat"]), float(data_final[0]["lon"])), True
+        return None, True # Não encontrou em nenhuma das tentativas
+    print(f"Nominatim (endereco) retornou {response_nominatim.status_code} para URL: {url_endereco}")
+    return None, False
 
-    # -------------------------------------------
-    # ✔ NOVO CÁLCULO DE FRETE E ESTIMATIVA
-    # -------------------------------------------
 
+# -------------------------------------------
+# ✔ NOVO CÁLCULO DE FRETE E ESTIMATIVA
+# -------------------------------------------
+def calcular_tarifa(distancia_km: float):
+    """Retorna (valor do frete, estimativa em dias) pela faixa de distância."""
     if distancia_km <= 10:
         frete = 15.00
         estimativa = 3  # ALTERADO
@@ -112,31 +195,236 @@ async def calcular_frete(request: Request, cep: str = Query(None), cep_destino:
     else:
         frete = 30.00
         estimativa = 7  # ALTERADO
+    return frete, estimativa
+
 
-    # Tenta obter dados de endereço via ViaCEP para popular campos de rua/bairro/cidade/uf
-    endereco_str = ""
+def cotar_por_coordenadas(lat: float, lon: float):
+    """Retorna (distância em km, valor do frete, estimativa em dias) até as coordenadas."""
+    distancia_km = haversine_distance(ORIGEM_LAT, ORIGEM_LON, lat, lon)
+    frete, estimativa = calcular_tarifa(distancia_km)
+    return distancia_km, frete, estimativa
+
+
+# ---------- Cotação assinada ----------
+# O /api/frete devolve a cotação assinada (mesma chave dos tokens de login). O checkout
+# só confere a assinatura e a validade: não refaz a geolocalização e não confia em
+# valores de frete vindos do formulário.
+
+def criar_cotacao(id_cliente: int, cep_limpo: str, distancia_km: float, frete: float, estimativa: int) -> str:
+    return jwt.encode({
+        "tipo": "frete",
+        "uid": id_cliente,
+        "cep": cep_limpo,
+        "distancia_km": round(distancia_km, 1),
+        "frete": round(frete, 2),
+        "estimativa": estimativa,
+        "exp": datetime.utcnow() + timedelta(minutes=FRETE_COTACAO_MINUTOS)
+    }, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def ler_cotacao(token: str, id_cliente: int, cep: str):
+    """Dados da cotação se a assinatura e a validade conferem e ela é do mesmo cliente e CEP; senão None."""
+    if not token:
+        return None
     try:
-        cep_limpo = cep_value.replace('-', '').strip()
-        url_viacep = f"https://viacep.com.br/ws/{cep_limpo}/json/"
-        async with httpx.AsyncClient(timeout=6.0) as client:
-            resp = await client.get(url_viacep)
-            if resp.status_code == 200:
-                dados = resp.json()
-                if not dados.get('erro'):
-                    log = dados.get('logradouro', '') or ''
-                    bai = dados.get('bairro', '') or ''
-                    cid = dados.get('localidade', '') or ''
-                    uf = dados.get('uf', '') or ''
-                    # monta string compatível com front-end: logradouro - bairro - cidade - uf
-                    parts = [p for p in [log, bai, cid, uf] if p]
-                    endereco_str = ' - '.join(parts)
-    except Exception as e:
-        print(f"Warning: não foi possível obter endereço via ViaCEP para {cep_value}: {e}")
+        dados = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:  # inclui cotação expirada
+        return None
+    cep_limpo = limpar_cep(cep)
+    if dados.get("tipo") != "frete" or dados.get("uid") != id_cliente or not cep_limpo or dados.get("cep") != cep_limpo:
+        return None
+    return dados
+
 
-    return {
+def _resposta_frete(id_cliente: int, cep_limpo: str, distancia_km: float, frete: float, estimativa: int, endereco_str: str) -> dict:
+    resposta = {
         "success": True,
         "distancia_km": round(distancia_km, 1),
         "frete": round(frete, 2),
         "estimativa": estimativa,
         "endereco": endereco_str
-    }
\ No newline at end of file
+    }
+    if cep_limpo:
+        resposta["cotacao"] = criar_cotacao(id_cliente, cep_limpo, distancia_km, frete, estimativa)
+    return resposta
+
+
+# Tarefa em segundo plano (salvar_endereco e checkout): geocodifica o CEP uma vez e grava
+# lat/lon no endereço salvo, para as próximas cotações não dependerem de rede
+async def geocodificar_endereco(id_endereco: int, cep: str):
+    coordenadas = await get_lat_lon_from_cep(cep)
+    if not coordenadas:
+        return
+    lat, lon = coordenadas
+    with SessionLocal() as db:
+        # só grava se o CEP não mudou enquanto a consulta rodava
+        db.query(Endereco).filter(Endereco.id_endereco == id_endereco, Endereco.cep == cep).update(
+            {"latitude": lat, "longitude": lon}, synchronize_session=False
+        )
+        db.commit()
+
+
+# Tenta obter dados de endereço via ViaCEP para popular campos de rua/bairro/cidade/uf.
+# Nunca falha: sem endereço a cotação continua valendo.
+async def _endereco_para_frete(cep_value: str) -> str:
+    cep_limpo = limpar_cep(cep_value)
+    if not cep_limpo:
+        return ""
+    try:
+        dados = await obter_endereco_viacep(cep_limpo)
+        return formatar_endereco(dados) if dados else ""
+    except Exception as e:
+        print(f"Warning: não foi possível obter endereço via ViaCEP para {cep_value}: {e}")
+        return ""
+
+
+def _usuario_e_endereco(request: Request, db: Session, id_endereco):
+    """Consultas ao banco da cotação (sessão e endereço salvo), numa chamada só para a threadpool."""
+    usuario = obter_usuario(request, db)
+    if not usuario or id_endereco is None:
+        return usuario, None
+    endereco = db.query(Endereco).filter_by(id_endereco=id_endereco, id_cliente=usuario.id_cliente).first()
+    return usuario, endereco
+
+
+@router.get("")  # /api/frete?cep=XXXXX-XXX OR /api/frete?cep_destino=XXXXX-XXX (ou &id_endereco=N para endereço salvo)
+async def calcular_frete(request: Request, cep: str = Query(None), cep_destino: str = Query(None),
+                         id_endereco: int = Query(None), db: Session = Depends(get_db)):
+    # Adiciona verificação de autenticação (a cotação assinada é vinculada ao cliente).
+    # O acesso ao banco é síncrono: roda na threadpool para não travar o event loop.
+    usuario, endereco = await run_in_threadpool(_usuario_e_endereco, request, db, id_endereco)
+    if not usuario:
+        return {"success": False, "msg": "Usuário não autenticado"}
+
+    # Endereço salvo já geocodificado: cotação direto das coordenadas gravadas, sem rede
+    if id_endereco is not None:
+        if endereco and endereco.latitude is not None and endereco.longitude is not None:
+            distancia_km, frete, estimativa = cotar_por_coordenadas(endereco.latitude, endereco.longitude)
+            endereco_str = formatar_endereco({"logradouro": endereco.logradouro, "bairro": endereco.bairro,
+                                              "localidade": endereco.cidade, "uf": endereco.estado})
+            return _resposta_frete(usuario.id_cliente, limpar_cep(endereco.cep), distancia_km, frete, estimativa, endereco_str)
+        # ainda sem coordenadas: segue pelo CEP
+        if endereco and not (cep or cep_destino):
+            cep = endereco.cep
+
+    # aceita ambos parâmetros `cep` ou `cep_destino` (compatibilidade front-end)
+    cep_value = cep or cep_destino
+    if not cep_value:
+        return {"success": False, "msg": "Parâmetro 'cep' é obrigatório"}
+
+    cep_limpo = limpar_cep(cep_value)
+    if not cep_limpo:
+        return {"success": False, "msg": "CEP inválido"}
+    # geolocalização e endereço são independentes: as duas consultas rodam ao mesmo tempo
+    (destino, definitivo), endereco_str = await asyncio.gather(
+        _localizar_cep(cep_limpo),
+        _endereco_para_frete(cep_value),
+    )
+    if not destino:
+        if not definitivo:
+            return {"success": False, "retry": True,
+                    "msg": "Não foi possível calcular o frete agora, tente novamente em instantes"}
+        return {"success": False, "msg": "CEP inválido"}
+
+    distancia_km, frete, estimativa = cotar_por_coordenadas(*destino)
+    return _resposta_frete(usuario.id_cliente, limpar_cep(cep_value), distancia_km, frete, estimativa, endereco_str)
+
+
+# ---------- Cotação em lote ----------
+
+async def _resolver_coordenadas(ceps_limpos: list):
+    """CEP -> (lat, lon) para os CEPs localizados: cache, tabela offline (de uma vez só) e, para o
+    que sobrar, geocodificação online em paralelo (limitada pelos limites de cada serviço).
+    Retorna também o conjunto dos CEPs que não foram localizados por falha temporária."""
+    coordenadas = {}
+    temporarios = set()
+    sem_cache = []
+    for cep, em_cache in zip(ceps_limpos, await cache_cep.get_varios("geo", ceps_limpos)):
+        if em_cache is AUSENTE:
+            sem_cache.append(cep)
+        elif em_cache:
+            coordenadas[cep] = tuple(em_cache)
+
+    online = []
+    for cep, centroide in zip(sem_cache, tabela_centroides.buscar_varios(sem_cache)):
+        if centroide is not None:
+            coordenadas[cep] = centroide
+        else:
+            online.append(cep)
+
+    if online:
+        resultados = await asyncio.gather(*(_localizar_cep(cep) for cep in online))
+        for cep, (localizado, definitivo) in zip(online, resultados):
+            if localizado:
+                coordenadas[cep] = localizado
+            elif not definitivo:
+                temporarios.add(cep)
+    return coordenadas, temporarios
+
+
+async def _cotar_bloco(ceps: list) -> list:
+    limpos = [limpar_cep(cep) for cep in ceps]
+    distintos = list(dict.fromkeys(cep for cep in limpos if cep))
+    coordenadas, temporarios = await _resolver_coordenadas(distintos)
+
+    # todas as distâncias do bloco em uma única passada
+    localizados = [cep for cep in distintos if cep in coordenadas]
+    distancias = dict(zip(localizados, distancias_km(
+        ORIGEM_LAT, ORIGEM_LON,
+        [coordenadas[cep][0] for cep in localizados],
+        [coordenadas[cep][1] for cep in localizados],
+    )))
+
+    resultados = []
+    for cep, limpo in zip(ceps, limpos):
+        distancia = distancias.get(limpo)
+        if distancia is None:
+            if limpo in temporarios:
+                # limite de taxa ou serviço fora do ar: o CEP pode ser válido, reenviar depois
+                resultados.append({"cep": cep, "success": False, "retry": True,
+                                   "msg": "Localização indisponível no momento, tente novamente"})
+            else:
+                resultados.append({"cep": cep, "success": False, "retry": False,
+                                   "msg": "CEP inválido ou não localizado"})
+            continue
+        frete, estimativa = calcular_tarifa(distancia)
+        resultados.append({
+            "cep": cep,
+            "success": True,
+            "distancia_km": round(distancia, 1),
+            "frete": round(frete, 2),
+            "estimativa": estimativa
+        })
+    return resultados
+
+
+async def _cotacoes_ndjson(ceps: list):
+    for inicio in range(0, len(ceps), FRETE_LOTE_BLOCO):
+        for resultado in await _cotar_bloco(ceps[inicio:inicio + FRETE_LOTE_BLOCO]):
+            yield json.dumps(resultado, ensure_ascii=False) + "\n"
+
+
+@router.post("/lote")  # corpo: {"ceps": ["01001-000", ...]}
+async def calcular_frete_lote(request: Request):
+    # uso interno (equipe/admin e integrações): exige token de administrador
+    payload = verificar_token(request.cookies.get("token"))
+    if not payload:
+        return JSONResponse({"success": False, "msg": "Usuário não autenticado"}, status_code=401)
+    if not payload.get("is_admin"):
+        return JSONResponse({"success": False, "msg": "Acesso restrito a administradores"}, status_code=403)
+
+    try:
+        dados = await request.json()
+        ceps = dados.get("ceps") if isinstance(dados, dict) else None
+        if not isinstance(ceps, list):
+            raise ValueError("campo 'ceps' deve ser uma lista")
+        ceps = [str(cep) for cep in ceps]
+    except ValueError as e:
+        return JSONResponse({"success": False, "msg": f"Corpo inválido: {e}"}, status_code=400)
+    if len(ceps) > FRETE_LOTE_MAX:
+        return JSONResponse({"success": False, "msg": f"Máximo de {FRETE_LOTE_MAX} CEPs por lote"}, status_code=400)
+
+    if len(ceps) > FRETE_LOTE_STREAM_A_PARTIR:
+        return StreamingResponse(_cotacoes_ndjson(ceps), media_type="application/x-ndjson")
+
+    return {"success": True, "resultados": await _cotar_bloco(ceps)}
@@ -4,6 +4,9 @@ from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os, shutil
+import base64, json
+from decimal import Decimal
+from sqlalchemy import or_, and_
 from sqlalchemy.orm import Session
 from database import get_db, SessionLocal
 from models.models import *
@@ -16,33 +19,151 @@ templates = Jinja2Templates(directory="templates") # front-end
 # Configuração dos arquivos estáticos
 router.mount("/static", StaticFiles(directory="static"), name="static")
 
-# carrinho simples em memória
-carrinhos = {}
-
 UPLOAD_DIR = '../static/upload/img'
 # caminho para o os
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# ---------- Função Auxiliar de Contexto (Adicionado por Gemini) ----------
+# ---------- Função Auxiliar de Contexto ----------
+from controllers.sessao import get_user_from_token, get_base_context
+from controllers.catalogo_indice import indice_catalogo, ORDENACOES_BUSCA
+from controllers.busca import tokenizar
 
-def get_user_from_token(request: Request, db: Session):
-    """Verifica o token no cookie e retorna o objeto do usuário se válido."""
-    token = request.cookies.get("token")
-    if not token:
-        return None
-    payload = verificar_token(token)
-    if not payload:
+
+# ---------- Paginação do catálogo (keyset) ----------
+# Em vez de OFFSET, cada página continua a partir do último produto da anterior
+# (valor da coluna de ordenação + id_produto como desempate). Com os índices de
+# models.Produtos o custo de uma página não depende do tamanho do catálogo.
+
+PRODUTOS_POR_PAGINA = 24
+
+# ordenação -> (coluna, crescente). Sem coluna ordena só pelo id.
+ORDENACOES = {
+    "recentes": (None, False),
+    "preco": (Produtos.preco, True),
+    "preco_desc": (Produtos.preco, False),
+    "nome": (Produtos.nome, True),
+}
+
+def _b64_json(dados: dict) -> str:
+    texto = json.dumps(dados, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+def _ler_b64_json(cursor: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+def _codificar_cursor(ordenacao: str, produto) -> str:
+    coluna, _ = ORDENACOES[ordenacao]
+    valor = getattr(produto, coluna.key) if coluna is not None else None
+    if isinstance(valor, Decimal):
+        valor = str(valor)
+    return _b64_json({"o": ordenacao, "v": valor, "id": produto.id_produto})
+
+def _decodificar_cursor(ordenacao: str, cursor: str):
+    """Retorna (valor, id_produto) ou None se o cursor for inválido ou de outra ordenação."""
+    try:
+        dados = _ler_b64_json(cursor)
+        if dados["o"] != ordenacao:
+            return None
+        valor = dados["v"]
+        if ORDENACOES[ordenacao][0] is Produtos.preco:
+            valor = Decimal(valor)
+        return valor, int(dados["id"])
+    except Exception:
         return None
-    email = payload.get("sub")
-    if not email:
+
+
+# ---------- Busca textual ----------
+# Com "q" preenchido o resultado vem do índice invertido em memória (sem acento, por
+# pedaço de palavra, ordenado por relevância). A lista de ids já sai filtrada e ordenada
+# do índice, então a página é só uma fatia dela: o cursor guarda a posição na lista.
+
+def _consulta_valida(q):
+    """Ignora buscas sem nenhum termo pesquisável (vazias ou só pontuação)."""
+    return q if q and tokenizar(q) else None
+
+def _ordenacao_padrao(ordenar, q) -> str:
+    if q:
+        return ordenar if ordenar in ORDENACOES_BUSCA else "relevancia"
+    return ordenar if ordenar in ORDENACOES else "recentes"
+
+def _codificar_cursor_busca(ordenacao: str, posicao: int) -> str:
+    return _b64_json({"o": ordenacao, "n": posicao})
+
+def _decodificar_cursor_busca(ordenacao: str, cursor: str):
+    """Retorna a posição na lista de resultados ou None se o cursor for inválido."""
+    try:
+        dados = _ler_b64_json(cursor)
+        if dados["o"] != ordenacao:
+            return None
+        posicao = int(dados["n"])
+        return posicao if posicao >= 0 else None
+    except Exception:
         return None
-    return db.query(Clientes).filter(Clientes.email == email).first()
 
-def get_base_context(request: Request, db: Session):
-    """Retorna o contexto base para os templates, incluindo o usuário."""
-    user = get_user_from_token(request, db)
-    return {"request": request, "user": user}
+def _pagina_busca(db: Session, ids: list, ordenacao: str, posicao: int = 0, limite: int = PRODUTOS_POR_PAGINA):
+    """Carrega do banco só os produtos da página e retorna (produtos, proximo_cursor)."""
+    ids_pagina = ids[posicao:posicao + limite]
+    por_id = {}
+    if ids_pagina:
+        por_id = {p.id_produto: p for p in db.query(Produtos).filter(Produtos.id_produto.in_(ids_pagina)).all()}
+    # mantém a ordem do índice; ids removidos por outro worker ainda não recarregado são descartados
+    produtos = [por_id[i] for i in ids_pagina if i in por_id]
+    fim = posicao + limite
+    proximo_cursor = _codificar_cursor_busca(ordenacao, fim) if fim < len(ids) else None
+    return produtos, proximo_cursor
+
+def _filtrar_produtos(query, tamanho=None, cor=None, sexo=None, preco_min=None, preco_max=None):
+    # A busca por texto ("q") não passa por aqui: é feita pelo índice em memória (ver _pagina_busca).
+    # Alteração feita pelo : Filtros por atributos específicos.
+    if tamanho:
+        query = query.filter(Produtos.tamanho == tamanho)
+    if cor:
+        query = query.filter(Produtos.cor == cor)
+    if sexo:
+        query = query.filter(Produtos.sexo == sexo)
+    if preco_min is not None:
+        query = query.filter(Produtos.preco >= preco_min)
+    if preco_max is not None:
+        query = query.filter(Produtos.preco <= preco_max)
+    return query
+
+def _pagina_produtos(query, ordenacao: str, posicao=None, limite: int = PRODUTOS_POR_PAGINA):
+    """Aplica ordenação e cursor à query e retorna (produtos, proximo_cursor)."""
+    coluna, crescente = ORDENACOES[ordenacao]
+    id_col = Produtos.id_produto
+
+    if posicao is not None:
+        valor, ultimo_id = posicao
+        if coluna is None:
+            query = query.filter(id_col > ultimo_id if crescente else id_col < ultimo_id)
+        elif crescente:
+            query = query.filter(or_(coluna > valor, and_(coluna == valor, id_col > ultimo_id)))
+        else:
+            query = query.filter(or_(coluna < valor, and_(coluna == valor, id_col < ultimo_id)))
+
+    colunas = [id_col] if coluna is None else [coluna, id_col]
+    query = query.order_by(*[c.asc() if crescente else c.desc() for c in colunas])
 
+    # busca um a mais só para saber se existe próxima página
+    produtos = query.limit(limite + 1).all()
+    proximo_cursor = None
+    if len(produtos) > limite:
+        produtos = produtos[:limite]
+        proximo_cursor = _codificar_cursor(ordenacao, produtos[-1])
+    return produtos, proximo_cursor
+
+def _produto_para_dict(produto) -> dict:
+    return {
+        "id_produto": produto.id_produto,
+        "nome": produto.nome,
+        "descricao": produto.descricao,
+        "preco": float(produto.preco),
+        "tamanho": produto.tamanho,
+        "cor": produto.cor,
+        "sexo": produto.sexo,
+        "imagem_caminho": produto.imagem_caminho,
+        "estoque": produto.estoque
+    }
 
 
 # ---------- Rotas Principais ----------
@@ -63,7 +184,9 @@ async def catalogo(
     cor: str = None, # Parâmetro para o filtro de cor.
     sexo: str = None, # Parâmetro para o filtro de sexo.
     preco_min: float = None, # Parâmetro para o filtro de preço mínimo.
-    preco_max: float = None # Parâmetro para o filtro de preço máximo.
+    preco_max: float = None, # Parâmetro para o filtro de preço máximo.
+    ordenar: str = None, # Ordenação: recentes, preco, preco_desc, nome ou relevancia (com busca).
+    cursor: str = None # Posição da página (gerado pela página anterior).
 ):
     try:
         # Alteração Gemini: Adiciona o contexto base com o usuário
@@ -72,42 +195,41 @@ async def catalogo(
         # Alteração feita pelo : A lógica de busca foi movida para o backend para maior eficiência.
         # Em vez de carregar todos os produtos e filtrar no navegador (o que seria lento com muitos itens),
         # o banco de dados, que é otimizado para isso, retorna apenas os produtos que correspondem aos filtros.
-        query = db.query(Produtos)
-                # Alteração feita pelo : Filtro de busca por nome.
-        # Usa 'ilike' para uma busca parcial e que não diferencia maiúsculas de minúsculas (ex: "camisa" encontra "Camisa Polo").
+        indice_catalogo.garantir_atualizado()
+        q = _consulta_valida(q)
+        ordenar = _ordenacao_padrao(ordenar, q)
+        # cursor inválido ou de outra ordenação: volta para a primeira página
         if q:
-            query = query.filter(Produtos.nome.ilike(f"%{q}%"))
-        
-        # Alteração feita pelo : Filtros por atributos específicos.
-        if tamanho:
-            query = query.filter(Produtos.tamanho == tamanho)
-        if cor:
-            query = query.filter(Produtos.cor == cor)
-        if sexo:
-            query = query.filter(Produtos.sexo == sexo)
-        if preco_min is not None:
-            query = query.filter(Produtos.preco >= preco_min)
-        if preco_max is not None:
-            query = query.filter(Produtos.preco <= preco_max)
-
-        produtos = query.all()
-
-        # Opções dinâmicas de filtro
-        opcoes_sexo = [row[0] for row in db.query(Produtos.sexo).distinct().filter(Produtos.sexo.isnot(None)).all()]
-        opcoes_cor = [row[0] for row in db.query(Produtos.cor).distinct().filter(Produtos.cor.isnot(None)).all()]
-        preco_min = db.query(Produtos.preco).order_by(Produtos.preco.asc()).first()
-        preco_max = db.query(Produtos.preco).order_by(Produtos.preco.desc()).first()
-        preco_min_val = float(preco_min[0]) if preco_min else 0.0
-        preco_max_val = float(preco_max[0]) if preco_max else 0.0
+            # busca textual feita uma vez só para a página e para as contagens das facetas
+            ids, contagens = indice_catalogo.buscar_com_contagens(q, tamanho, cor, sexo, preco_min, preco_max, ordenar)
+            posicao = (_decodificar_cursor_busca(ordenar, cursor) if cursor else None) or 0
+            produtos, proximo_cursor = _pagina_busca(db, ids, ordenar, posicao)
+            if ids and posicao == 0:
+                indice_catalogo.registrar_busca(q)
+        else:
+            query = _filtrar_produtos(db.query(Produtos), tamanho, cor, sexo, preco_min, preco_max)
+            posicao = _decodificar_cursor(ordenar, cursor) if cursor else None
+            produtos, proximo_cursor = _pagina_produtos(query, ordenar, posicao)
+            contagens = indice_catalogo.contagens(None, tamanho, cor, sexo, preco_min, preco_max)
+
+        # Opções dinâmicas de filtro, servidas pelo índice em memória (sem consultas extras)
+        opcoes_sexo = indice_catalogo.opcoes("sexo")
+        opcoes_cor = indice_catalogo.opcoes("cor")
+        preco_min_val, preco_max_val = indice_catalogo.faixa_preco()
 
         favoritos_ids = []
         if context.get("user"):
             favoritos_ids = [fav.produto_id for fav in context["user"].favoritos]
 
         context["produtos"] = produtos
+        context["ordenar"] = ordenar
+        context["busca_ativa"] = bool(q)
+        context["proximo_cursor"] = proximo_cursor
+        context["proxima_pagina_url"] = str(request.url.include_query_params(cursor=proximo_cursor)) if proximo_cursor else None
         context["favoritos_ids"] = favoritos_ids
         context["opcoes_sexo"] = opcoes_sexo
         context["opcoes_cor"] = opcoes_cor
+        context["contagens"] = contagens
         context["preco_min"] = preco_min_val
         context["preco_max"] = preco_max_val
         return templates.TemplateResponse("pages/produtos/produtos.html", context)
@@ -125,6 +247,57 @@ async def catalogo(
             "traceback": tb
         }, status_code=500)
 
+# API JSON do catálogo (rolagem infinita): mesmos filtros do /catalogo, paginada por cursor
+@router.get("/api/produtos")
+def api_produtos(
+    db: Session = Depends(get_db),
+    q: str = None,
+    tamanho: str = None,
+    cor: str = None,
+    sexo: str = None,
+    preco_min: float = None,
+    preco_max: float = None,
+    ordenar: str = None,
+    cursor: str = None,
+    limite: int = Query(PRODUTOS_POR_PAGINA, ge=1, le=100)
+):
+    q = _consulta_valida(q)
+    aceitas = ORDENACOES_BUSCA if q else ORDENACOES
+    if ordenar is not None and ordenar not in aceitas:
+        raise HTTPException(status_code=400, detail=f"Ordenação inválida. Use: {', '.join(aceitas)}")
+    ordenar = _ordenacao_padrao(ordenar, q)
+
+    if q:
+        posicao = 0
+        if cursor:
+            posicao = _decodificar_cursor_busca(ordenar, cursor)
+            if posicao is None:
+                raise HTTPException(status_code=400, detail="Cursor inválido")
+        indice_catalogo.garantir_atualizado()
+        ids = indice_catalogo.buscar(q, tamanho, cor, sexo, preco_min, preco_max, ordenar)
+        produtos, proximo_cursor = _pagina_busca(db, ids, ordenar, posicao, limite)
+    else:
+        posicao = None
+        if cursor:
+            posicao = _decodificar_cursor(ordenar, cursor)
+            if posicao is None:
+                raise HTTPException(status_code=400, detail="Cursor inválido")
+        query = _filtrar_produtos(db.query(Produtos), tamanho, cor, sexo, preco_min, preco_max)
+        produtos, proximo_cursor = _pagina_produtos(query, ordenar, posicao, limite)
+    return {
+        "produtos": [_produto_para_dict(p) for p in produtos],
+        "proximo_cursor": proximo_cursor
+    }
+
+# Autocomplete do campo de busca: servido pelo índice em memória, sem acessar o banco
+@router.get("/api/produtos/sugestoes")
+def api_sugestoes(
+    prefix: str = Query("", max_length=100),
+    limite: int = Query(8, ge=1, le=20)
+):
+    indice_catalogo.garantir_atualizado()
+    return {"sugestoes": indice_catalogo.sugerir(prefix, limite)}
+
 # Rota para detalhes do produto
 @router.get("/produto/{id_produto}", response_class=HTMLResponse, name="detalhe_produto")
 async def detalhe_produto(request: Request, id_produto: int, db: Session = Depends(get_db)):
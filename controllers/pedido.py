@@ -1,10 +1,11 @@
 import requests
+import httpx
 from fastapi import APIRouter, Request, Form, UploadFile, File, Depends, HTTPException, Query
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os, shutil
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from database import get_db, SessionLocal
 from models.models import *
 from models.models import Clientes, Produtos, Pedidos
@@ -16,32 +17,14 @@ templates = Jinja2Templates(directory="templates") # front-end
 # Configuração dos arquivos estáticos
 router.mount("/static", StaticFiles(directory="static"), name="static")
 
-# carrinho simples em memória
-carrinhos = {}
-
 UPLOAD_DIR = '../static/upload/img'
 # caminho para o os
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# ---------- Função Auxiliar de Contexto (Adicionado por Gemini) ----------
-
-def get_user_from_token(request: Request, db: Session):
-    """Verifica o token no cookie e retorna o objeto do usuário se válido."""
-    token = request.cookies.get("token")
-    if not token:
-        return None
-    payload = verificar_token(token)
-    if not payload:
-        return None
-    email = payload.get("sub")
-    if not email:
-        return None
-    return db.query(Clientes).filter(Clientes.email == email).first()
-
-def get_base_context(request: Request, db: Session):
-    """Retorna o contexto base para os templates, incluindo o usuário."""
-    user = get_user_from_token(request, db)
-    return {"request": request, "user": user}
+# ---------- Função Auxiliar de Contexto ----------
+from controllers.sessao import get_user_from_token, get_base_context
+from controllers.frete import obter_endereco_viacep
+from controle_chamadas import ServicoIndisponivel
 
 # ---------- Rotas Principais ----------
 
@@ -51,15 +34,19 @@ def pedido_confirmacao(request: Request, id: int = None, db: Session = Depends(g
     if not id:
         return templates.TemplateResponse("pages/pedidos/confirmacao.html", {"request": request, "pedido": None})
 
-    pedido = db.query(Pedidos).filter(Pedidos.id_pedido == id).first()
+    # pedido + itens (com o produto, relação joined) em 2 consultas, qualquer que seja a quantidade de itens
+    pedido = (
+        db.query(Pedidos)
+        .options(selectinload(Pedidos.itens))
+        .filter(Pedidos.id_pedido == id)
+        .first()
+    )
     if not pedido:
         return templates.TemplateResponse("pages/pedidos/confirmacao.html", {"request": request, "pedido": None})
 
-    # Fetch items for the order and include product image paths when available
-    itens_raw = db.query(ItemPedido).filter(ItemPedido.pedido_id == pedido.id_pedido).all()
     itens = []
-    for it in itens_raw:
-        produto = db.query(Produtos).filter(Produtos.id_produto == it.produto_id).first()
+    for it in pedido.itens:
+        produto = it.produto
         itens.append({
             "nome": produto.nome if produto else getattr(it, 'produto_nome', 'Produto'),
             "quantidade": it.quantidade,
@@ -81,10 +68,9 @@ async def acompanhe(request: Request, db: Session = Depends(get_db)):
 CEP_LOJA = "03008020"  # CEP 
 
 @router.get("/api/endereco")#FEITO PELO PIETRO - 13/11/2025
-def calcular_endereco(
+async def calcular_endereco(
     request: Request,
-    cep_destino: str = Query(...),
-    db: Session = Depends(get_db)
+    cep_destino: str = Query(...)
 ):
     # Autenticação obrigatória
     token = request.cookies.get("token")
@@ -96,15 +82,15 @@ def calcular_endereco(
     if not cep_destino.isdigit() or len(cep_destino) != 8:
         raise HTTPException(status_code=400, detail="CEP inválido")
 
-    # Consulta no ViaCEP
-    via_cep_url = f"https://viacep.com.br/ws/{cep_destino}/json/"
-    resposta = requests.get(via_cep_url)
-
-    if resposta.status_code != 200:
+    # Consulta no ViaCEP pelo mesmo cache/cliente do frete (não bloqueia o servidor e tem timeout)
+    try:
+        dados = await obter_endereco_viacep(cep_destino)
+    except ServicoIndisponivel:
+        raise HTTPException(status_code=503, detail="Consulta de CEP indisponível no momento, tente novamente em instantes")
+    except httpx.HTTPError:
         raise HTTPException(status_code=400, detail="Erro ao consultar o CEP")
 
-    dados = resposta.json()
-    if "erro" in dados:
+    if dados is None:
         raise HTTPException(status_code=400, detail="CEP não encontrado")
 
     return dados  # devolve o JSON do ViaCEP diretamente
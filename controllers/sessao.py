@@ -0,0 +1,100 @@
+import time
+from fastapi import Request
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models.models import Clientes
+from auth import verificar_token, ler_claims_cliente
+from cache import CacheLRU
+
+# Identidade do cliente por token. O TTL curto limita o tempo em que outro worker
+# pode enxergar dados antigos depois de uma alteração de perfil.
+USUARIO_CACHE_TTL = 60
+_usuarios = CacheLRU(max_itens=10000, ttl=USUARIO_CACHE_TTL)
+_NAO_RESOLVIDO = object()
+
+
+class UsuarioSessao:
+    """Dados do cliente logado que as rotas precisam sem carregar o objeto do banco."""
+    __slots__ = ("id_cliente", "email", "is_admin")
+
+    def __init__(self, id_cliente: int, email: str, is_admin: bool):
+        self.id_cliente = id_cliente
+        self.email = email
+        self.is_admin = is_admin
+
+
+def _buscar_cliente_por_email(email: str, request: Request, db: Session = None):
+    """Caminho dos tokens v1 (sem id): precisa de uma consulta para achar o id_cliente."""
+    if db is not None:
+        cliente = db.query(Clientes).filter(Clientes.email == email).first()
+        # guarda o objeto completo para get_user_from_token não consultar de novo nesta requisição
+        request.state.cliente = cliente
+        return cliente
+    with SessionLocal() as sessao:
+        return sessao.query(Clientes).filter(Clientes.email == email).first()
+
+
+def _resolver_token(token: str, request: Request, db: Session = None):
+    usuario = _usuarios.get(token)
+    if usuario is not None:
+        return usuario
+
+    payload = verificar_token(token)
+    claims = ler_claims_cliente(payload)
+    if not claims:
+        return None
+
+    if claims["id_cliente"] is not None:
+        usuario = UsuarioSessao(claims["id_cliente"], claims["email"], claims["is_admin"])
+    else:
+        cliente = _buscar_cliente_por_email(claims["email"], request, db)
+        if not cliente:
+            return None
+        usuario = UsuarioSessao(cliente.id_cliente, cliente.email, bool(cliente.is_admin))
+
+    # a entrada nunca vive mais que o próprio token
+    ttl = min(USUARIO_CACHE_TTL, payload.get("exp", 0) - time.time())
+    if ttl > 0:
+        _usuarios.set(token, usuario, ttl=ttl)
+    return usuario
+
+
+def obter_usuario(request: Request, db: Session = None):
+    """Retorna a identidade do cliente logado (ou None), resolvida uma única vez por requisição.
+    Com tokens v2 não há acesso ao banco; `db` só é usado pelos tokens antigos."""
+    usuario = getattr(request.state, "usuario", _NAO_RESOLVIDO)
+    if usuario is not _NAO_RESOLVIDO:
+        return usuario
+    token = request.cookies.get("token")
+    usuario = _resolver_token(token, request, db) if token else None
+    request.state.usuario = usuario
+    return usuario
+
+
+def usuario_atual(request: Request):
+    """Dependência do FastAPI: identidade do cliente logado ou None (não abre sessão no banco)."""
+    return obter_usuario(request)
+
+
+def get_user_from_token(request: Request, db: Session):
+    """Verifica o token no cookie e retorna o objeto do usuário se válido."""
+    cliente = getattr(request.state, "cliente", _NAO_RESOLVIDO)
+    if cliente is not _NAO_RESOLVIDO:
+        return cliente
+    usuario = obter_usuario(request, db)
+    cliente = None
+    if usuario is not None:
+        cliente = db.get(Clientes, usuario.id_cliente)
+    request.state.cliente = cliente
+    return cliente
+
+
+def get_base_context(request: Request, db: Session):
+    """Retorna o contexto base para os templates, incluindo o usuário."""
+    user = get_user_from_token(request, db)
+    return {"request": request, "user": user}
+
+
+def invalidar_usuario(id_cliente: int):
+    """Descarta a identidade em cache do cliente (chamar após alterar senha ou perfil)."""
+    _usuarios.remover_se(lambda usuario: usuario.id_cliente == id_cliente)
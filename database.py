@@ -1,3 +1,6 @@
+import os
+import sqlite3
+import threading
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
@@ -19,3 +22,23 @@ def get_db():
     finally:
         db.close()
 
+
+# Banco SQLite local (arquivo em disco), compartilhado entre os workers do uvicorn
+# da mesma máquina. Usado para estado efêmero que não pertence ao MySQL (carrinhos, caches).
+LOCAL_DB_PATH = os.getenv("LOCAL_DB_PATH", "dados_locais.sqlite3")
+
+_local_conexoes = threading.local()
+
+def get_local_db(caminho: str = LOCAL_DB_PATH) -> sqlite3.Connection:
+    """Retorna a conexão SQLite local da thread atual (uma por thread e por arquivo)."""
+    conexoes = getattr(_local_conexoes, "conexoes", None)
+    if conexoes is None:
+        conexoes = _local_conexoes.conexoes = {}
+    conexao = conexoes.get(caminho)
+    if conexao is None:
+        conexao = sqlite3.connect(caminho, timeout=5.0, isolation_level=None, check_same_thread=False)
+        # WAL permite leitores concorrentes enquanto outro processo escreve
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        conexoes[caminho] = conexao
+    return conexao
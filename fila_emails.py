@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import aiosmtplib
+from sqlalchemy import update, delete
+from database import SessionLocal
+from models.models import EmailPendente
+from controllers.enviar_email import montar_email, SMTP_EMAIL, SMTP_PASSWORD, SMTP_SERVER, SMTP_PORT, SMTP_STARTTLS
+
+# Fila de e-mails (padrão "outbox"):
+# - as rotas chamam enfileirar_email() antes do commit, então o e-mail só existe se o pedido/
+#   cadastro foi gravado, e não se perde se o processo reiniciar antes do envio
+# - o DespachanteEmails (uma tarefa por worker, iniciada no lifespan) reserva lotes de e-mails
+#   pendentes e envia por um pool pequeno de conexões SMTP persistentes (STARTTLS + login uma
+#   vez por conexão, não uma vez por mensagem)
+# - falhas são tentadas de novo com espera exponencial; depois de EMAIL_MAX_TENTATIVAS o e-mail
+#   fica com status "falhou"
+# A reserva é um UPDATE ... LIMIT que marca o lote com um id único, então vários workers podem
+# despachar ao mesmo tempo sem enviar o mesmo e-mail duas vezes. A reserva vale por
+# EMAIL_RESERVA_SEGUNDOS: se o worker cair no meio do envio, o e-mail volta para a fila.
+#
+# Teste local com aiosmtpd:
+#   python -m aiosmtpd -n -l localhost:8025
+#   SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 SMTP_PASSWORD= python fila_emails.py
+
+EMAIL_LOTE = int(os.getenv("EMAIL_LOTE", 20))
+EMAIL_CONEXOES = int(os.getenv("EMAIL_CONEXOES", 2))
+EMAIL_TIMEOUT = float(os.getenv("EMAIL_TIMEOUT", 30.0))
+# intervalo entre verificações da fila quando não há aviso de e-mail novo
+EMAIL_INTERVALO = float(os.getenv("EMAIL_INTERVALO", 10.0))
+EMAIL_RESERVA_SEGUNDOS = int(os.getenv("EMAIL_RESERVA_SEGUNDOS", 300))
+EMAIL_MAX_TENTATIVAS = int(os.getenv("EMAIL_MAX_TENTATIVAS", 8))
+# espera antes da nova tentativa: base * 2^(tentativas-1), até o máximo
+EMAIL_BACKOFF_BASE = float(os.getenv("EMAIL_BACKOFF_BASE", 30.0))
+EMAIL_BACKOFF_MAXIMO = float(os.getenv("EMAIL_BACKOFF_MAXIMO", 60 * 60))
+# conexão parada há mais que isso é fechada (servidores SMTP derrubam conexões ociosas)
+EMAIL_CONEXAO_OCIOSA = float(os.getenv("EMAIL_CONEXAO_OCIOSA", 60.0))
+# e-mails enviados ficam na tabela por esse tempo (consulta/suporte) e depois são apagados
+EMAIL_MANTER_ENVIADOS_DIAS = int(os.getenv("EMAIL_MANTER_ENVIADOS_DIAS", 7))
+# "0" desliga o despachante neste processo (ex.: quando ele roda separado com python fila_emails.py)
+EMAIL_DESPACHANTE_ATIVO = os.getenv("EMAIL_DESPACHANTE_ATIVO", "1") != "0"
+
+
+def enfileirar_email(db, tipo: str, destinatario: str, dados: dict = None):
+    """Grava o e-mail na fila dentro da transação de quem chama (não faz commit)."""
+    agora = datetime.now()
+    db.add(EmailPendente(
+        tipo=tipo,
+        destinatario=destinatario,
+        dados=json.dumps(dados or {}),
+        status="pendente",
+        tentativas=0,
+        proxima_tentativa=agora,
+        criado_em=agora,
+    ))
+
+
+def _espera_nova_tentativa(tentativas: int) -> float:
+    espera = min(EMAIL_BACKOFF_BASE * 2 ** (tentativas - 1), EMAIL_BACKOFF_MAXIMO)
+    # variação aleatória para as tentativas de vários e-mails não caírem no mesmo instante
+    return espera * random.uniform(0.8, 1.2)
+
+
+class ConexoesSMTP:
+    """Pool pequeno de conexões SMTP persistentes."""
+
+    def __init__(self, tamanho: int = EMAIL_CONEXOES):
+        self._semaforo = asyncio.Semaphore(tamanho)
+        self._livres = []  # (conexão, último uso)
+
+    async def _conectar(self):
+        smtp = aiosmtplib.SMTP(hostname=SMTP_SERVER, port=SMTP_PORT, start_tls=SMTP_STARTTLS, timeout=EMAIL_TIMEOUT)
+        await smtp.connect()
+        if SMTP_PASSWORD:
+            await smtp.login(SMTP_EMAIL, SMTP_PASSWORD)
+        return smtp
+
+    @staticmethod
+    async def _fechar(smtp):
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @asynccontextmanager
+    async def conexao(self):
+        """Empresta uma conexão; se der erro durante o uso ela é descartada (estado desconhecido)."""
+        async with self._semaforo:
+            smtp = None
+            while self._livres:
+                smtp, ultimo_uso = self._livres.pop()
+                if smtp.is_connected and time.monotonic() - ultimo_uso < EMAIL_CONEXAO_OCIOSA:
+                    break
+                await self._fechar(smtp)
+                smtp = None
+            if smtp is None:
+                smtp = await self._conectar()
+            try:
+                yield smtp
+            except BaseException:
+                await self._fechar(smtp)
+                raise
+            self._livres.append((smtp, time.monotonic()))
+
+    async def fechar_todas(self):
+        livres, self._livres = self._livres, []
+        for smtp, _ in livres:
+            await self._fechar(smtp)
+
+
+class DespachanteEmails:
+
+    def __init__(self):
+        self._conexoes = None
+        self._tarefa = None
+        self._aviso = None
+        self._limpo_em = 0.0
+
+    def iniciar(self):
+        """Inicia a tarefa de envio no event loop atual (chamar no lifespan)."""
+        if self._tarefa is not None:
+            return
+        self._conexoes = ConexoesSMTP()
+        self._aviso = asyncio.Event()
+        self._tarefa = asyncio.get_running_loop().create_task(self._executar())
+
+    async def encerrar(self):
+        if self._tarefa is None:
+            return
+        self._tarefa.cancel()
+        try:
+            await self._tarefa
+        except asyncio.CancelledError:
+            pass
+        self._tarefa = None
+        await self._conexoes.fechar_todas()
+
+    def avisar(self):
+        """Acorda o despachante (chamar após o commit que enfileirou um e-mail)."""
+        if self._aviso is not None:
+            self._aviso.set()
+
+    async def _executar(self):
+        while True:
+            self._aviso.clear()
+            try:
+                quantidade = await self.processar_lote()
+            except Exception as e:
+                # banco fora do ar etc.: tenta de novo no próximo ciclo
+                print(f"Erro no despachante de e-mails: {e}")
+                quantidade = 0
+            if quantidade < EMAIL_LOTE:
+                # fila vazia: espera um e-mail novo (aviso) ou o intervalo
+                try:
+                    await asyncio.wait_for(self._aviso.wait(), EMAIL_INTERVALO)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def processar_lote(self) -> int:
+        """Reserva e envia um lote. Retorna quantos e-mails foram reservados."""
+        if self._conexoes is None:
+            self._conexoes = ConexoesSMTP()
+        # as consultas ao banco são síncronas: rodam fora do event loop
+        emails = await asyncio.to_thread(self._reservar_lote)
+        if emails:
+            erros = await self._enviar(emails)
+            await asyncio.to_thread(self._registrar_resultados, emails, erros)
+        if time.monotonic() - self._limpo_em > 60 * 60:
+            self._limpo_em = time.monotonic()
+            await asyncio.to_thread(self._remover_enviados_antigos)
+        return len(emails)
+
+    async def _enviar(self, emails) -> dict:
+        """Envia os e-mails pelas conexões do pool. Retorna {id: mensagem de erro} das falhas."""
+        fila = list(emails)
+        erros = {}
+
+        async def enviar_da_fila():
+            # cada tarefa reaproveita a conexão emprestada para vários e-mails do lote
+            while fila:
+                email = fila.pop(0)
+                try:
+                    mensagem = montar_email(email.tipo, email.destinatario, json.loads(email.dados or "{}"))
+                    async with self._conexoes.conexao() as smtp:
+                        await smtp.send_message(mensagem)
+                except Exception as e:
+                    erros[email.id] = f"{e.__class__.__name__}: {e}"[:255]
+
+        await asyncio.gather(*(enviar_da_fila() for _ in range(min(EMAIL_CONEXOES, len(fila)))))
+        return erros
+
+    def _reservar_lote(self) -> list:
+        lote = uuid.uuid4().hex
+        agora = datetime.now()
+        with SessionLocal() as db:
+            db.execute(
+                update(EmailPendente)
+                .where(EmailPendente.status == "pendente", EmailPendente.proxima_tentativa <= agora)
+                .values(lote=lote, proxima_tentativa=agora + timedelta(seconds=EMAIL_RESERVA_SEGUNDOS))
+                .with_dialect_options(mysql_limit=EMAIL_LOTE)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            return (
+                db.query(EmailPendente.id, EmailPendente.tipo, EmailPendente.destinatario,
+                         EmailPendente.dados, EmailPendente.tentativas)
+                .filter(EmailPendente.lote == lote)
+                .all()
+            )
+
+    def _registrar_resultados(self, emails, erros: dict):
+        agora = datetime.now()
+        with SessionLocal() as db:
+            enviados = [email.id for email in emails if email.id not in erros]
+            if enviados:
+                db.execute(
+                    update(EmailPendente)
+                    .where(EmailPendente.id.in_(enviados))
+                    .values(status="enviado", enviado_em=agora, lote=None, ultimo_erro=None)
+                    .execution_options(synchronize_session=False)
+                )
+            for email in emails:
+                if email.id not in erros:
+                    continue
+                tentativas = email.tentativas + 1
+                valores = {"tentativas": tentativas, "ultimo_erro": erros[email.id], "lote": None}
+                if tentativas >= EMAIL_MAX_TENTATIVAS:
+                    valores["status"] = "falhou"
+                    print(f"E-mail {email.id} ({email.tipo}) para {email.destinatario} falhou {tentativas} vezes: {erros[email.id]}")
+                else:
+                    valores["proxima_tentativa"] = agora + timedelta(seconds=_espera_nova_tentativa(tentativas))
+                db.execute(
+                    update(EmailPendente)
+                    .where(EmailPendente.id == email.id)
+                    .values(**valores)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+
+    def _remover_enviados_antigos(self):
+        limite = datetime.now() - timedelta(days=EMAIL_MANTER_ENVIADOS_DIAS)
+        with SessionLocal() as db:
+            db.execute(
+                delete(EmailPendente)
+                .where(EmailPendente.status == "enviado", EmailPendente.enviado_em < limite)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+
+
+# instância única do processo (iniciada no lifespan, main.py)
+despachante_emails = DespachanteEmails()
+
+
+async def _despachar_sempre():
+    despachante_emails.iniciar()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await despachante_emails.encerrar()
+
+
+if __name__ == "__main__":
+    # despachante rodando sozinho (fora do uvicorn)
+    asyncio.run(_despachar_sempre())
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from database import get_local_db, LOCAL_DB_PATH
+
+# Chaves de idempotência (usadas no POST /checkout).
+# O formulário manda uma chave gerada quando a página é aberta; o primeiro envio com a chave
+# a reserva ("processando") e, ao terminar, guarda a resposta (URL da confirmação do pedido).
+# Envios repetidos com a mesma chave (duplo clique, reenvio do navegador) recebem a mesma
+# resposta sem criar outro pedido nem mandar outro e-mail. Fica no SQLite local para valer
+# entre os workers.
+
+# por quanto tempo uma resposta concluída é reaproveitada
+IDEMPOTENCIA_TTL = int(os.getenv("IDEMPOTENCIA_TTL", 60 * 60))
+# reserva "processando" mais antiga que isso é considerada abandonada (worker caiu no meio)
+IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO = int(os.getenv("IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO", 120))
+# quanto tempo um envio repetido espera o primeiro terminar
+IDEMPOTENCIA_ESPERA_MAXIMA = float(os.getenv("IDEMPOTENCIA_ESPERA_MAXIMA", 15.0))
+
+# retornado por reservar() quando outro envio com a mesma chave ainda está em andamento
+EM_PROCESSAMENTO = object()
+
+_RE_CHAVE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+
+def chave_valida(chave) -> bool:
+    return isinstance(chave, str) and bool(_RE_CHAVE.match(chave))
+
+
+class RegistroIdempotencia:
+
+    # A limpeza das chaves expiradas roda a cada N reservas
+    LIMPEZA_A_CADA = 200
+
+    def __init__(self, caminho: str = LOCAL_DB_PATH):
+        self.caminho = caminho
+        self._reservas = 0
+        self._conexao().execute(
+            "CREATE TABLE IF NOT EXISTS idempotencia ("
+            " chave TEXT PRIMARY KEY,"
+            " estado TEXT NOT NULL,"
+            " resposta TEXT,"
+            " atualizado_em REAL NOT NULL,"
+            " expira_em REAL NOT NULL)"
+        )
+
+    def _conexao(self):
+        return get_local_db(self.caminho)
+
+    def reservar(self, chave: str):
+        """None se a chave foi reservada para este envio (pode processar);
+        a resposta guardada se a chave já foi concluída; EM_PROCESSAMENTO se outro envio está rodando."""
+        conexao = self._conexao()
+        agora = time.time()
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                linha = conexao.execute(
+                    "SELECT estado, resposta, atualizado_em FROM idempotencia WHERE chave = ? AND expira_em > ?",
+                    (chave, agora),
+                ).fetchone()
+                if linha:
+                    estado, resposta, atualizado_em = linha
+                    if estado == "concluido":
+                        conexao.execute("COMMIT")
+                        return resposta
+                    if atualizado_em > agora - IDEMPOTENCIA_TIMEOUT_PROCESSAMENTO:
+                        conexao.execute("COMMIT")
+                        return EM_PROCESSAMENTO
+                conexao.execute(
+                    "INSERT OR REPLACE INTO idempotencia (chave, estado, resposta, atualizado_em, expira_em) "
+                    "VALUES (?, 'processando', NULL, ?, ?)",
+                    (chave, agora, agora + IDEMPOTENCIA_TTL),
+                )
+                conexao.execute("COMMIT")
+            except sqlite3.Error:
+                conexao.execute("ROLLBACK")
+                raise
+            self._reservas += 1
+            if self._reservas % self.LIMPEZA_A_CADA == 0:
+                self.remover_expirados()
+        except sqlite3.Error as e:
+            # sem o registro o checkout continua funcionando, só sem a proteção contra repetição
+            print(f"Erro ao reservar chave de idempotência: {e}")
+        return None
+
+    async def aguardar(self, chave: str, espera_maxima: float = IDEMPOTENCIA_ESPERA_MAXIMA):
+        """Espera o envio em andamento terminar. Retorna como reservar(): a resposta dele,
+        None se ele falhou e a chave ficou para este envio, ou EM_PROCESSAMENTO se o tempo acabou."""
+        limite = time.monotonic() + espera_maxima
+        while time.monotonic() < limite:
+            await asyncio.sleep(0.25)
+            # BEGIN IMMEDIATE pode esperar o lock de outro worker: roda fora do event loop
+            resultado = await asyncio.to_thread(self.reservar, chave)
+            if resultado is not EM_PROCESSAMENTO:
+                return resultado
+        return EM_PROCESSAMENTO
+
+    def concluir(self, chave: str, resposta: str):
+        try:
+            self._conexao().execute(
+                "UPDATE idempotencia SET estado = 'concluido', resposta = ?, atualizado_em = ?, expira_em = ? "
+                "WHERE chave = ?",
+                (resposta, time.time(), time.time() + IDEMPOTENCIA_TTL, chave),
+            )
+        except sqlite3.Error as e:
+            print(f"Erro ao concluir chave de idempotência: {e}")
+
+    def liberar(self, chave: str):
+        """Desfaz a reserva (envio terminou com erro): um novo envio com a chave processa de novo."""
+        try:
+            self._conexao().execute(
+                "DELETE FROM idempotencia WHERE chave = ? AND estado = 'processando'", (chave,)
+            )
+        except sqlite3.Error as e:
+            print(f"Erro ao liberar chave de idempotência: {e}")
+
+    def remover_expirados(self) -> None:
+        self._conexao().execute("DELETE FROM idempotencia WHERE expira_em <= ?", (time.time(),))
+
+
+# instância única do processo
+registro_idempotencia = RegistroIdempotencia()
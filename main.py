@@ -1,8 +1,40 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import anyio.to_thread
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from controllers import admin, carrinho, cliente, main, pedido, cupom, frete
+from auth import encerrar_hash_pool, HashSobrecarregadoError, THREADPOOL_THREADS, HASH_RETRY_AFTER
+from cliente_http import iniciar_cliente_http, encerrar_cliente_http
+from database import SessionLocal
+from fila_emails import despachante_emails, EMAIL_DESPACHANTE_ATIVO
+from controllers.catalogo_indice import indice_catalogo
+from controllers.cupom_indice import indice_cupons
+from controllers.cep_centroides import tabela_centroides
 
-app = FastAPI(title="Ecommerce Esportes")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # tamanho do threadpool das rotas síncronas: o limite da fila de hash (auth.py) conta com ele
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_THREADS
+    # índice do catálogo (filtros do /catalogo) montado uma vez na subida
+    with SessionLocal() as db:
+        indice_catalogo.carregar(db)
+        # cupons ativos em memória (validação sem consulta ao banco)
+        indice_cupons.carregar(db)
+    # faixas de CEP -> coordenadas aproximadas (frete sem depender do Nominatim)
+    tabela_centroides.carregar()
+    # cliente HTTP compartilhado (conexões reaproveitadas com Nominatim/ViaCEP)
+    iniciar_cliente_http()
+    # envio dos e-mails da fila (emails_pendentes)
+    if EMAIL_DESPACHANTE_ATIVO:
+        despachante_emails.iniciar()
+    yield
+    # encerramento do servidor
+    await despachante_emails.encerrar()
+    await encerrar_cliente_http()
+    encerrar_hash_pool()
+
+app = FastAPI(title="Ecommerce Esportes", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(admin.router)
 app.include_router(carrinho.router)
@@ -12,4 +44,13 @@ app.include_router(pedido.router)
 app.include_router(cupom.router)
 app.include_router(frete.router)
 
-# python -m uvicorn main:app --reload
\ No newline at end of file
+# fila do pool de hash cheia (login, cadastro, troca de senha): mesma resposta nas três rotas
+@app.exception_handler(HashSobrecarregadoError)
+async def hash_sobrecarregado(request: Request, exc: HashSobrecarregadoError):
+    return JSONResponse(
+        {"mensagem": "Muitos acessos no momento. Tente novamente em instantes."},
+        status_code=503,
+        headers={"Retry-After": str(HASH_RETRY_AFTER)},
+    )
+
+# python -m uvicorn main:app --reload
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DECIMAL, Boolean, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DECIMAL, Boolean, ForeignKey, UniqueConstraint, Index, Text, DateTime
 from database import Base, engine, SessionLocal
 from sqlalchemy.orm import relationship
 from auth import *
@@ -18,6 +18,11 @@ class Clientes(Base):
     favoritos = relationship("Favoritos", back_populates="cliente", cascade="all, delete-orphan")
     is_admin = Column(Boolean,default=False)
 
+    __table_args__ = (
+        # busca de pedidos do admin pelo começo do nome do cliente (LIKE 'texto%')
+        Index('ix_clientes_nome', 'nome'),
+    )
+
 # tabela produtos
 class Produtos(Base):
     __tablename__ = 'produtos'
@@ -34,6 +39,12 @@ class Produtos(Base):
     imagem_caminho3 = Column(String(255), nullable=True)
     estoque = Column(Integer, nullable=False)
     data_cadastro = Column(String, nullable=True)
+
+    # Índices da paginação por cursor do catálogo (ordenação + id_produto como desempate)
+    __table_args__ = (
+        Index('ix_produtos_preco_id', 'preco', 'id_produto'),
+        Index('ix_produtos_nome_id', 'nome', 'id_produto'),
+    )
     
 # tabela pedidos
 class Pedidos(Base):
@@ -49,6 +60,12 @@ class Pedidos(Base):
     clientes = relationship("Clientes", back_populates="pedidos")
     itens = relationship("ItemPedido", back_populates="pedidos", cascade="all, delete-orphan")
 
+    # filtro por status do painel admin (paginado por id_pedido); status é VARCHAR sem tamanho
+    # no modelo, então no MySQL o índice usa um prefixo de 50 caracteres
+    __table_args__ = (
+        Index('ix_pedidos_status_id', 'status', 'id_pedido', mysql_length={'status': 50}),
+    )
+
 
 class ItemPedido(Base):
     __tablename__="itens_pedido"
@@ -76,6 +93,9 @@ class Endereco(Base): #esperando o bda criar a tabela
     estado = Column(String, nullable=True)
     pais = Column(String, nullable=True)
     cep = Column(String, nullable=True)
+    # coordenadas do CEP, gravadas em segundo plano ao salvar o endereço (frete sem consulta externa)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
 
 class Favoritos(Base):
@@ -95,9 +115,43 @@ class Favoritos(Base):
 class Cupom(Base):
     __tablename__ = "cupons"
     id_cupon = Column(Integer,primary_key=True,index=True)
-    chave_cupon = Column(String, nullable=True)
+    chave_cupon = Column(String(50), nullable=True, index=True)
     valor_desconto = Column(Float, nullable=True)
     ativo = Column(Boolean,default=True)
+    # limites de uso (NULL = sem limite); "usos" é o contador, incrementado no checkout
+    max_usos = Column(Integer, nullable=True)
+    max_usos_por_cliente = Column(Integer, nullable=True)
+    usos = Column(Integer, nullable=False, default=0)
+
+
+# quantas vezes cada cliente usou cada cupom (limite por cliente)
+class CupomUso(Base):
+    __tablename__ = "cupons_usos"
+    id_cupon = Column(Integer, ForeignKey("cupons.id_cupon"), primary_key=True)
+    id_cliente = Column(Integer, ForeignKey("clientes.id_cliente"), primary_key=True)
+    usos = Column(Integer, nullable=False, default=0)
+
+
+# fila de e-mails (outbox): gravada na mesma transação do pedido/cadastro e enviada
+# pelo despachante (fila_emails.py)
+class EmailPendente(Base):
+    __tablename__ = "emails_pendentes"
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String(30), nullable=False)          # "boas_vindas", "pedido"
+    destinatario = Column(String(100), nullable=False)
+    dados = Column(Text, nullable=True)                # JSON usado para montar a mensagem
+    status = Column(String(20), nullable=False, default="pendente")  # pendente, enviado, falhou
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa = Column(DateTime, nullable=False)
+    lote = Column(String(32), nullable=True)           # despachante que reservou o e-mail
+    ultimo_erro = Column(String(255), nullable=True)
+    criado_em = Column(DateTime, nullable=False)
+    enviado_em = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_emails_pendentes_status_proxima', 'status', 'proxima_tentativa'),
+        Index('ix_emails_pendentes_lote', 'lote'),
+    )
 
 
 #Base.metadata.create_all(bind=engine)
@@ -1,15 +1,4 @@
-// Busca de produtos (filtro simples)
-function configurarBusca(inputId, tabelaSelector) {
-  document.getElementById(inputId)?.addEventListener('input', function(e) {
-    const termo = e.target.value.toLowerCase();
-    const linhas = document.querySelectorAll(tabelaSelector + ' tbody tr');
-    linhas.forEach(linha => {
-      const texto = linha.textContent.toLowerCase();
-      linha.style.display = texto.includes(termo) ? '' : 'none';
-    });
-  });
-}
-configurarBusca('buscaProdutos', '.tabela');
+// Busca das tabelas: feita no servidor (admin_tabelas.js / rotas /api/admin/*)
 
 // Confirmações
 function confirmarExclusao(id) {
@@ -0,0 +1,176 @@
+/**
+ * admin_tabelas.js
+ *
+ * Tabelas do painel admin (produtos, pedidos e usuários) carregadas em páginas pelas rotas
+ * `/api/admin/*`. Busca e filtro de status são feitos no servidor; "Carregar mais" pede a
+ * próxima página pelo cursor devolvido na resposta.
+ */
+(function () {
+  const ATRASO_MS = 300;
+  const tabelas = {};
+
+  function formatarPreco(valor) {
+    return 'R$ ' + Number(valor || 0).toFixed(2).replace('.', ',');
+  }
+
+  function celula(linha, rotulo, conteudo) {
+    const td = document.createElement('td');
+    td.dataset.label = rotulo;
+    td.textContent = conteudo ?? '';
+    linha.appendChild(td);
+    return td;
+  }
+
+  function linhaProduto(p) {
+    const tr = document.createElement('tr');
+    celula(tr, 'ID', p.id_produto);
+    celula(tr, 'Nome', p.nome);
+    celula(tr, 'Preço', formatarPreco(p.preco));
+    celula(tr, 'Estoque', p.estoque ?? '-');
+    const acoes = celula(tr, 'Ações', '');
+
+    const form = document.createElement('form');
+    form.action = `/admin/produto/deletar/${p.id_produto}`;
+    form.method = 'POST';
+    form.style.display = 'inline';
+    form.addEventListener('submit', e => {
+      if (!confirm(`Tem certeza que deseja excluir o produto ID ${p.id_produto}?`)) e.preventDefault();
+    });
+    const excluir = document.createElement('button');
+    excluir.type = 'submit';
+    excluir.className = 'btn small danger';
+    excluir.textContent = 'Excluir';
+    form.appendChild(excluir);
+    acoes.appendChild(form);
+
+    // o modal de edição (script do admin.html) lê estes data-* ao clicar
+    const editar = document.createElement('button');
+    editar.type = 'button';
+    editar.className = 'btn small editar-produto-btn';
+    editar.textContent = 'Editar';
+    const imagens = p.imagens || [];
+    Object.assign(editar.dataset, {
+      id: p.id_produto,
+      nome: p.nome || '',
+      descricao: p.descricao || '',
+      preco: p.preco,
+      tamanho: p.tamanho || '',
+      categoria: '',
+      cor: p.cor || '',
+      estoque: p.estoque ?? '',
+      imagem: imagens[0] || '',
+      imagem1: imagens[1] || '',
+      imagem2: imagens[2] || '',
+      imagem3: imagens[3] || ''
+    });
+    acoes.appendChild(editar);
+    return tr;
+  }
+
+  function linhaPedido(p) {
+    const tr = document.createElement('tr');
+    celula(tr, 'ID Pedido', p.id_pedido);
+    celula(tr, 'Cliente', p.email ? `${p.cliente || ''} (${p.email})` : (p.cliente || '-'));
+    celula(tr, 'Total', formatarPreco(p.valor_total));
+    celula(tr, 'Data', p.data_pedido);
+    celula(tr, 'Status', p.status);
+    return tr;
+  }
+
+  function linhaCliente(c) {
+    const tr = document.createElement('tr');
+    celula(tr, 'ID', c.id_cliente);
+    celula(tr, 'Nome', c.nome);
+    celula(tr, 'E-mail', c.email);
+    celula(tr, 'Telefone', c.telefone);
+    celula(tr, 'Admin', c.is_admin ? 'Sim' : 'Não');
+    return tr;
+  }
+
+  const MONTADORES = { produtos: linhaProduto, pedidos: linhaPedido, clientes: linhaCliente };
+
+  function mensagem(corpo, texto) {
+    corpo.innerHTML = '';
+    const tr = document.createElement('tr');
+    const td = document.createElement('td');
+    td.colSpan = 5;
+    td.textContent = texto;
+    tr.appendChild(td);
+    corpo.appendChild(tr);
+  }
+
+  // os cards colapsáveis usam max-height fixo: ajusta depois que as linhas mudam
+  function ajustarAlturaCard(elemento) {
+    const card = elemento.closest('.card');
+    const conteudo = card && card.querySelector('.card-content');
+    if (conteudo && !card.classList.contains('collapsed')) {
+      conteudo.style.maxHeight = conteudo.scrollHeight + 'px';
+    }
+  }
+
+  async function carregar(id, reiniciar) {
+    const tabela = tabelas[id];
+    if (tabela.controle) tabela.controle.abort();
+    tabela.controle = new AbortController();
+
+    const params = new URLSearchParams();
+    document.querySelectorAll(`[data-parametro][data-tabela="${id}"]`).forEach(campo => {
+      const valor = campo.value.trim();
+      if (valor) params.set(campo.dataset.parametro, valor);
+    });
+    if (!reiniciar && tabela.cursor) params.set('cursor', tabela.cursor);
+
+    try {
+      const resp = await fetch(`${tabela.corpo.dataset.api}?${params}`, {
+        credentials: 'same-origin',
+        signal: tabela.controle.signal
+      });
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      const data = await resp.json();
+      const itens = data[tabela.corpo.dataset.tipo] || [];
+      const montar = MONTADORES[tabela.corpo.dataset.tipo];
+
+      if (reiniciar) tabela.corpo.innerHTML = '';
+      itens.forEach(item => tabela.corpo.appendChild(montar(item)));
+      if (reiniciar && !itens.length) mensagem(tabela.corpo, 'Nenhum registro encontrado.');
+
+      tabela.cursor = data.proximo_cursor;
+      if (tabela.botao) tabela.botao.hidden = !tabela.cursor;
+      ajustarAlturaCard(tabela.corpo);
+    } catch (err) {
+      if (err.name === 'AbortError') return;
+      console.error('Erro ao carregar tabela do admin:', err);
+      if (reiniciar) mensagem(tabela.corpo, 'Erro ao carregar os dados.');
+    }
+  }
+
+  document.querySelectorAll('tbody[data-api]').forEach(corpo => {
+    tabelas[corpo.id] = {
+      corpo,
+      cursor: null,
+      controle: null,
+      botao: document.querySelector(`.carregar-mais[data-tabela="${corpo.id}"]`)
+    };
+    carregar(corpo.id, true);
+  });
+
+  document.querySelectorAll('[data-parametro][data-tabela]').forEach(campo => {
+    const id = campo.dataset.tabela;
+    if (!tabelas[id]) return;
+    if (campo.tagName === 'SELECT') {
+      campo.addEventListener('change', () => carregar(id, true));
+    } else {
+      let temporizador = null;
+      campo.addEventListener('input', () => {
+        clearTimeout(temporizador);
+        temporizador = setTimeout(() => carregar(id, true), ATRASO_MS);
+      });
+    }
+  });
+
+  document.querySelectorAll('.carregar-mais[data-tabela]').forEach(botao => {
+    botao.addEventListener('click', () => {
+      if (tabelas[botao.dataset.tabela]) carregar(botao.dataset.tabela, false);
+    });
+  });
+})();
@@ -0,0 +1,46 @@
+/**
+ * busca_sugestoes.js
+ *
+ * Autocomplete do campo de busca do catálogo. A cada digitação (com um pequeno atraso)
+ * consulta `/api/produtos/sugestoes` e preenche o <datalist> ligado ao campo.
+ */
+(function () {
+  const campo = document.getElementById('q');
+  const lista = document.getElementById('sugestoes-busca');
+  if (!campo || !lista) return;
+
+  const ATRASO_MS = 150;
+  let temporizador = null;
+  let ultimoPrefixo = '';
+  let controle = null;
+
+  async function buscarSugestoes(prefixo) {
+    if (controle) controle.abort();
+    controle = new AbortController();
+    try {
+      const resp = await fetch(`/api/produtos/sugestoes?prefix=${encodeURIComponent(prefixo)}`, { signal: controle.signal });
+      if (!resp.ok) return;
+      const data = await resp.json();
+      lista.innerHTML = '';
+      data.sugestoes.forEach(texto => {
+        const opcao = document.createElement('option');
+        opcao.value = texto;
+        lista.appendChild(opcao);
+      });
+    } catch (err) {
+      if (err.name !== 'AbortError') console.error('Erro ao buscar sugestões:', err);
+    }
+  }
+
+  campo.addEventListener('input', () => {
+    const prefixo = campo.value.trim();
+    clearTimeout(temporizador);
+    if (prefixo === ultimoPrefixo) return;
+    ultimoPrefixo = prefixo;
+    if (!prefixo) {
+      lista.innerHTML = '';
+      return;
+    }
+    temporizador = setTimeout(() => buscarSugestoes(prefixo), ATRASO_MS);
+  });
+})();
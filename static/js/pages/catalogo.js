@@ -0,0 +1,101 @@
+/**
+ * catalogo.js
+ *
+ * Rolagem infinita do catálogo. A primeira página vem renderizada pelo servidor;
+ * as seguintes são buscadas em `/api/produtos` usando o cursor devolvido pela página
+ * anterior (paginação keyset), com os mesmos filtros da URL atual.
+ * Sem JavaScript, o botão "Carregar mais" continua funcionando como link normal.
+ */
+(function () {
+  const botao = document.getElementById('carregar-mais');
+  const grid = document.querySelector('.outfit-grid');
+  if (!botao || !grid) return;
+
+  let cursor = botao.dataset.cursor;
+  let carregando = false;
+
+  function escapeHtml(texto) {
+    return String(texto ?? '')
+      .replace(/&/g, '&amp;')
+      .replace(/</g, '&lt;')
+      .replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;');
+  }
+
+  function formatarPreco(valor) {
+    return Number(valor || 0).toFixed(2).replace('.', ',');
+  }
+
+  // Mesmo markup do card renderizado em produtos.html
+  function criarCard(produto) {
+    const link = `/produto/${produto.id_produto}`;
+    const imagem = produto.imagem_caminho
+      ? `/static/upload/img/${encodeURIComponent(produto.imagem_caminho)}`
+      : '/static/assets/logo/4linhas-bg-red.svg';
+    const emEstoque = produto.estoque > 0;
+
+    const card = document.createElement('div');
+    card.className = 'outfit-card';
+    card.dataset.price = Number(produto.preco || 0).toFixed(2);
+    card.innerHTML = `
+      <a href="${link}" class="product-link">
+        <img class="product-card-img" src="${imagem}" alt="${escapeHtml(produto.nome)}">
+      </a>
+      <div class="outfit-overlay">
+        <h3><a href="${link}" class="product-title-link">${escapeHtml(produto.nome)}</a></h3>
+        <a href="${link}" class="product-desc-link"><p class="product-desc">${escapeHtml(produto.descricao)}</p></a>
+        <p class="product-price">R$ ${formatarPreco(produto.preco)}</p>
+        <p class="product-size">Tamanho: ${escapeHtml(produto.tamanho)}</p>
+        <button class="add-to-cart-btn" data-product-id="${produto.id_produto}" ${emEstoque ? '' : 'disabled'}>
+          ${emEstoque ? 'Adicionar ao Carrinho' : 'Fora de Estoque'}
+        </button>
+      </div>
+    `;
+    const img = card.querySelector('img.product-card-img');
+    img.addEventListener('load', () => img.classList.add('loaded'));
+    return card;
+  }
+
+  async function carregarProximaPagina() {
+    if (carregando || !cursor) return;
+    carregando = true;
+    botao.textContent = 'Carregando...';
+
+    const params = new URLSearchParams(window.location.search);
+    params.set('cursor', cursor);
+
+    try {
+      const resp = await fetch(`/api/produtos?${params.toString()}`, { credentials: 'same-origin' });
+      if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+      const data = await resp.json();
+
+      data.produtos.forEach(produto => grid.appendChild(criarCard(produto)));
+      cursor = data.proximo_cursor;
+
+      if (!cursor) {
+        observer.disconnect();
+        botao.parentElement.remove();
+      } else {
+        params.set('cursor', cursor);
+        botao.href = `${window.location.pathname}?${params.toString()}`;
+        botao.textContent = 'Carregar mais';
+      }
+    } catch (err) {
+      console.error('Erro ao carregar mais produtos:', err);
+      botao.textContent = 'Carregar mais';
+    } finally {
+      carregando = false;
+    }
+  }
+
+  botao.addEventListener('click', (e) => {
+    e.preventDefault();
+    carregarProximaPagina();
+  });
+
+  // Carrega a próxima página quando o botão se aproxima da área visível
+  const observer = new IntersectionObserver((entradas) => {
+    if (entradas.some(entrada => entrada.isIntersecting)) carregarProximaPagina();
+  }, { rootMargin: '600px 0px' });
+  observer.observe(botao);
+})();
@@ -151,7 +151,7 @@ document.addEventListener('DOMContentLoaded', function(){
         if(cep) {
           // global function defined in checkout.html: calcularFrete
           if(typeof window.calcularFrete === 'function') {
-            await window.calcularFrete(cep);
+            await window.calcularFrete(cep, selectedAddress.value);
           }
         }
       } catch (err) {
@@ -183,6 +183,15 @@ document.addEventListener('DOMContentLoaded', function(){
     if(current > 0) showStep(current - 1);
   }));
 
+  // Idempotency key: pages re-rendered by the server after an error come without one
+  const chaveInput = document.getElementById('chave_idempotencia_hidden');
+  if (chaveInput && !chaveInput.value) {
+    chaveInput.value = (window.crypto && crypto.randomUUID)
+      ? crypto.randomUUID()
+      : Date.now().toString(36) + Math.random().toString(36).slice(2, 12);
+  }
+  let enviando = false;
+
   // on submit, keep confirmation message visible while server processes
   if(form){
     form.addEventListener('submit', async function(e){
@@ -215,6 +224,9 @@ document.addEventListener('DOMContentLoaded', function(){
 
       // Prevent default and submit via fetch so we can follow server redirects
       e.preventDefault();
+      // ignore double clicks while the order is being sent (the server also dedupes by the key)
+      if (enviando) return;
+      enviando = true;
       console.log('Submitting checkout via fetch...');
       const review = document.querySelector('#step-confirm .review-summary');
       if(review) review.innerHTML = '<p>Processando pagamento e finalizando seu pedido...</p>';
@@ -244,6 +256,7 @@ document.addEventListener('DOMContentLoaded', function(){
         document.close();
       } catch (err) {
         console.error('Checkout submit failed:', err);
+        enviando = false;
         if (window.showToast) window.showToast('Ocorreu um erro ao processar o pedido. Tente novamente.', 'error');
       }
     });
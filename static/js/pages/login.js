@@ -124,6 +124,13 @@
           }
         }
 
+        // Servidor sobrecarregado (503 + Retry-After): mostra a mensagem do servidor
+        if (response.status === 503) {
+          const data = await response.json().catch(() => ({}));
+          showErrorNotification(data.mensagem || 'Muitos acessos no momento. Tente novamente em instantes.');
+          return;
+        }
+
         // Para qualquer outro status
         showErrorNotification('Erro ao fazer login. Tente novamente.');
 
@@ -0,0 +1,125 @@
+"""App com um banco SQLite temporário no lugar do MySQL, para os testes e benchmarks.
+
+Importar este módulo antes dos módulos do app: ele ajusta o diretório de trabalho (templates e
+static são caminhos relativos) e as variáveis de ambiente lidas na importação.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(RAIZ)
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+DIRETORIO = tempfile.mkdtemp(prefix="4linhas_")
+atexit.register(shutil.rmtree, DIRETORIO, ignore_errors=True)
+os.environ.setdefault("LOCAL_DB_PATH", os.path.join(DIRETORIO, "locais.sqlite3"))
+os.environ.setdefault("EMAIL_DESPACHANTE_ATIVO", "0")
+
+import uuid
+from sqlalchemy import create_engine, event
+import database
+from database import Base, SessionLocal
+from models.models import Clientes, Produtos, Endereco
+from auth import criar_token_cliente
+
+
+def criar_banco(nome: str = "banco.sqlite3"):
+    """Cria as tabelas num arquivo SQLite novo e aponta o SessionLocal do app para ele."""
+    caminho = os.path.join(DIRETORIO, nome)
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    engine = create_engine(
+        f"sqlite:///{caminho}",
+        # as rotas síncronas rodam em várias threads; o timeout cobre a espera pelo lock de escrita
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _wal(conexao, _):
+        # leitores não bloqueiam o escritor (como no SQLite local do app)
+        conexao.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(engine)
+    SessionLocal.configure(bind=engine)
+    database.engine = engine
+    limpar_banco_local()
+    return engine
+
+
+def limpar_banco_local():
+    """Esvazia as tabelas do SQLite local (carrinhos, idempotência, versões...): os ids do banco
+    novo recomeçam do 1 e não podem herdar o carrinho de um teste anterior."""
+    conexao = database.get_local_db()
+    tabelas = conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    for (tabela,) in tabelas:
+        conexao.execute(f'DELETE FROM "{tabela}"')
+
+
+def criar_cliente(db, numero: int, senha_hash: str = "x") -> Clientes:
+    cliente = Clientes(
+        nome=f"Cliente {numero}",
+        cpf=f"{numero:011d}",
+        email=f"cliente{numero}@teste.com",
+        senha=senha_hash,
+        telefone="11999999999",
+        endereco="Rua Teste, 1",
+        is_admin=False,
+    )
+    db.add(cliente)
+    return cliente
+
+
+def criar_produto(db, numero: int, estoque: int = 100, preco: str = "10.00") -> Produtos:
+    produto = Produtos(
+        nome=f"Produto {numero}",
+        descricao="",
+        preco=preco,
+        tamanho="M",
+        cor="azul",
+        estoque=estoque,
+    )
+    db.add(produto)
+    return produto
+
+
+def criar_endereco(db, cliente) -> Endereco:
+    """Endereço já geocodificado: o checkout calcula o frete sem cotação nem rede."""
+    endereco = Endereco(
+        id_cliente=cliente.id_cliente,
+        logradouro="Rua Teste",
+        numero="1",
+        bairro="Centro",
+        cidade="São Paulo",
+        estado="SP",
+        pais="Brasil",
+        cep="01001000",
+        latitude=-23.55,
+        longitude=-46.63,
+    )
+    db.add(endereco)
+    return endereco
+
+
+def encher_carrinho(id_cliente: int, produtos, quantidade: int = 1):
+    from carrinho_store import carrinho_store
+    for produto in produtos:
+        carrinho_store.atualizar(id_cliente, lambda carrinho: carrinho.adicionar(
+            produto.id_produto, produto.nome, produto.preco, quantidade, produto.imagem_caminho))
+
+
+def formulario_checkout() -> dict:
+    return {"payment": "pix", "chave_idempotencia": uuid.uuid4().hex}
+
+
+def cookies_do_cliente(cliente) -> dict:
+    return {"token": criar_token_cliente(cliente)}
+
+
+def app_asgi():
+    """App do main.py (sem o lifespan: índices e despachante ficam a cargo de quem chama)."""
+    from main import app
+    return app
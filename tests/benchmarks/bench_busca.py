@@ -0,0 +1,156 @@
+"""Benchmark da busca em memória (controllers/busca.py) com um catálogo sintético grande.
+
+Mede a montagem do índice, a busca textual, a busca do /catalogo (resultados + contagens das
+facetas numa chamada), as contagens sem busca e o autocomplete, e confere as sugestões contra o
+ranking feito percorrendo a faixa inteira do prefixo. Sai com erro (código 1) se o p95 de alguma
+consulta passar de --alvo-p95 ms.
+
+    python -m tests.benchmarks.bench_busca --produtos 100000
+    python -m tests.benchmarks.bench_busca --produtos 100000 --alvo-p95 5
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from tests.ambiente import criar_banco
+from sqlalchemy import insert
+from database import SessionLocal
+from models.models import Produtos
+from controllers.catalogo_indice import IndiceCatalogo
+from controllers.busca import tokenizar
+
+TIPOS = ["Camisa", "Camiseta", "Calção", "Chuteira", "Tênis", "Meião", "Jaqueta", "Agasalho",
+         "Boné", "Luva", "Caneleira", "Bola", "Mochila", "Regata", "Bermuda", "Moletom"]
+MARCAS = ["Nike", "Adidas", "Puma", "Umbro", "Penalty", "Topper", "Kappa", "Mizuno", "Olympikus"]
+TIMES = ["Flamengo", "Corinthians", "Palmeiras", "São Paulo", "Santos", "Grêmio", "Internacional",
+         "Cruzeiro", "Atlético", "Vasco", "Botafogo", "Fluminense", "Bahia", "Fortaleza"]
+DETALHES = ["Dry Fit", "Oficial", "Torcedor", "Retrô", "Treino", "Viagem", "Infantil", "Feminina",
+            "Society", "Campo", "Futsal", "Edição Especial", "Home", "Away"]
+CORES = ["azul", "vermelho", "preto", "branco", "verde", "amarelo", "cinza", "rosa"]
+TAMANHOS = ["PP", "P", "M", "G", "GG", "36", "38", "40", "42"]
+CONSULTAS = ["camisa flamengo", "chuteira", "nike dry", "tenis", "bola futsal", "jaqueta preta",
+             "cam", "fla", "ret", "agasalho oficial"]
+PREFIXOS = ["c", "ca", "cam", "camisa f", "fl", "n", "te", "bola", "x"]
+
+
+def produtos_sinteticos(quantidade: int, semente: int = 42):
+    aleatorio = random.Random(semente)
+    for numero in range(1, quantidade + 1):
+        nome = " ".join((aleatorio.choice(TIPOS), aleatorio.choice(TIMES), aleatorio.choice(MARCAS),
+                         aleatorio.choice(DETALHES), str(numero % 997)))
+        yield {
+            "id_produto": numero,
+            "nome": nome,
+            "descricao": f"{nome} em {aleatorio.choice(CORES)}, tecido leve",
+            "preco": f"{aleatorio.randint(1990, 79990) / 100:.2f}",
+            "tamanho": aleatorio.choice(TAMANHOS),
+            "cor": aleatorio.choice(CORES),
+            "sexo": aleatorio.choice(["masculino", "feminino", "unissex"]),
+            "estoque": 10,
+        }
+
+
+def medir(funcao, repeticoes: int):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return statistics.median(tempos) * 1000, tempos[int(len(tempos) * 0.95) - 1] * 1000
+
+
+def sugestoes_exatas(indice, prefixo: str, limite: int) -> list:
+    """Ranking de referência: percorre todas as sugestões (sem a ordem por peso)."""
+    sugestoes = indice._sugestoes._sugestoes
+    prefixo = " ".join(tokenizar(prefixo))
+    casam = {}
+    for normalizado in sugestoes:
+        if normalizado.startswith(prefixo):
+            casam[normalizado] = True
+        elif (" " + prefixo) in normalizado:
+            casam[normalizado] = False
+
+    def relevancia(normalizado):
+        _, produtos, buscas = sugestoes[normalizado]
+        return (-(buscas * 2 + produtos), not casam[normalizado], len(normalizado), normalizado)
+
+    return [sugestoes[n][0] for n in sorted(casam, key=relevancia)[:limite]]
+
+
+def peso(indice, texto: str) -> int:
+    _, produtos, buscas = indice._sugestoes._sugestoes[" ".join(tokenizar(texto))]
+    return buscas * 2 + produtos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--produtos", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    parser.add_argument("--alvo-p95", type=float, default=10.0, help="p95 máximo por consulta (ms)")
+    args = parser.parse_args()
+    acima_do_alvo = []
+
+    def conferir(nome, p95):
+        if p95 > args.alvo_p95:
+            acima_do_alvo.append(f"{nome} ({p95:.1f} ms)")
+            return "  ACIMA DO ALVO"
+        return ""
+
+    criar_banco()
+    with SessionLocal() as db:
+        db.execute(insert(Produtos), list(produtos_sinteticos(args.produtos)))
+        db.commit()
+
+        indice = IndiceCatalogo()
+        inicio = time.perf_counter()
+        indice.carregar(db)
+        print(f"{args.produtos} produtos: índice montado em {time.perf_counter() - inicio:.2f}s")
+
+    # buscas populares, como as registradas pelo /catalogo
+    aleatorio = random.Random(7)
+    for _ in range(3000):
+        indice.registrar_busca(aleatorio.choice(CONSULTAS + ["camisa flamengo", "chuteira nike"]))
+
+    print("\nbusca textual (ms)             mediana      p95  resultados")
+    for consulta in CONSULTAS:
+        mediana, p95 = medir(lambda: indice.buscar(consulta), args.repeticoes)
+        print(f"  {consulta:<28}{mediana:8.2f} {p95:8.2f} {len(indice.buscar(consulta)):11d}"
+              f"{conferir(f'busca {consulta!r}', p95)}")
+
+    print("\n/catalogo: busca + contagens (ms)")
+    for consulta in CONSULTAS:
+        mediana, p95 = medir(lambda: indice.buscar_com_contagens(consulta), args.repeticoes)
+        print(f"  {consulta:<28}{mediana:8.2f} {p95:8.2f}{conferir(f'catalogo {consulta!r}', p95)}")
+
+    print("\ncontagens das facetas sem busca (ms)")
+    for cor in (None, "azul"):
+        mediana, p95 = medir(lambda: indice.contagens(None, cor=cor), args.repeticoes)
+        print(f"  cor={cor!s:<10}                 {mediana:8.2f} {p95:8.2f}{conferir(f'contagens cor={cor}', p95)}")
+
+    # "pesos" compara só o peso de cada posição: empates podem trazer outro texto de mesmo peso
+    # (limite documentado em controllers/busca.py), mas nunca um mais leve
+    print("\nautocomplete (ms)              mediana      p95  ranking completo")
+    divergentes = 0
+    for prefixo in PREFIXOS:
+        mediana, p95 = medir(lambda: indice.sugerir(prefixo), args.repeticoes)
+        obtidas, exatas = indice.sugerir(prefixo), sugestoes_exatas(indice, prefixo, 8)
+        if obtidas == exatas:
+            situacao = "igual"
+        elif [peso(indice, s) for s in obtidas] == [peso(indice, s) for s in exatas]:
+            situacao = "mesmos pesos"
+        else:
+            situacao = "DIFERENTE"
+            divergentes += 1
+        print(f"  {prefixo!r:<28}{mediana:8.2f} {p95:8.2f}  {situacao}{conferir(f'sugestão {prefixo!r}', p95)}")
+    if divergentes:
+        print(f"\n{divergentes} prefixo(s) com pesos diferentes do ranking completo")
+    if acima_do_alvo:
+        print(f"\np95 acima de {args.alvo_p95:.1f} ms: " + ", ".join(acima_do_alvo))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
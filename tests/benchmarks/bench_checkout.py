@@ -0,0 +1,86 @@
+"""Benchmark de pedidos por segundo do POST /checkout para carrinhos de 1, 10 e 50 itens.
+
+Cada pedido passa pela rota inteira (baixa de estoque, pedido, itens, e-mail na fila, commit)
+contra um SQLite temporário. Mostra também quantos comandos SQL cada pedido executa: os itens
+entram num INSERT só; o que cresce com o carrinho é o UPDATE condicional de estoque (um por
+produto, na ordem do id).
+
+    python -m tests.benchmarks.bench_checkout --pedidos 200
+    python -m tests.benchmarks.bench_checkout --itens 1 10 50 --concorrencia 8
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from tests.ambiente import (criar_banco, criar_cliente, criar_produto, criar_endereco, encher_carrinho,
+                            formulario_checkout, cookies_do_cliente, app_asgi)
+import httpx
+from sqlalchemy import event
+from database import SessionLocal
+
+
+async def medir_tamanho(http, engine, clientes, produtos, itens: int, pedidos: int, concorrencia: int):
+    comandos = [0]
+
+    def contar(*_):
+        comandos[0] += 1
+
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias, falhas = [], []
+    # cada cliente finaliza um pedido por vez (o carrinho é limpo no fim do checkout)
+    travas = {cliente.id_cliente: asyncio.Lock() for cliente in clientes}
+
+    async def finalizar(indice):
+        cliente = clientes[indice % len(clientes)]
+        async with travas[cliente.id_cliente], semaforo:
+            # carrinho montado fora da medição: o tempo é só o do checkout
+            encher_carrinho(cliente.id_cliente, produtos[:itens])
+            inicio = time.perf_counter()
+            resposta = await http.post("/checkout", data=formulario_checkout(), cookies=cookies_do_cliente(cliente))
+            latencias.append(time.perf_counter() - inicio)
+        if not resposta.headers.get("location", "").startswith("/pedidos/confirmacao"):
+            falhas.append(resposta.status_code)
+
+    event.listen(engine, "before_cursor_execute", contar)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(finalizar(i) for i in range(pedidos)))
+    duracao = time.perf_counter() - inicio
+    event.remove(engine, "before_cursor_execute", contar)
+
+    latencias.sort()
+    print(f"{itens:6d} {pedidos / duracao:12.1f} {statistics.median(latencias) * 1000:10.1f} "
+          f"{latencias[int(len(latencias) * 0.95) - 1] * 1000:9.1f} {comandos[0] / pedidos:11.1f} {len(falhas):7d}")
+
+
+async def executar(args):
+    engine = criar_banco()
+    with SessionLocal() as db:
+        clientes = [criar_cliente(db, n) for n in range(max(args.concorrencia, 1) * 2)]
+        produtos = [criar_produto(db, n, estoque=10 ** 9) for n in range(max(args.itens))]
+        db.flush()
+        for cliente in clientes:
+            criar_endereco(db, cliente)
+        db.commit()
+        for objeto in clientes + produtos:
+            db.refresh(objeto)
+        db.expunge_all()
+
+    transporte = httpx.ASGITransport(app=app_asgi())
+    async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as http:
+        print(f"concorrência={args.concorrencia}")
+        print(" itens  pedidos/s  p50 (ms)  p95 (ms)  SQL/pedido  falhas")
+        for itens in args.itens:
+            await medir_tamanho(http, engine, clientes, produtos, itens, args.pedidos, args.concorrencia)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--itens", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--pedidos", type=int, default=200, help="pedidos por tamanho de carrinho")
+    parser.add_argument("--concorrencia", type=int, default=1)
+    asyncio.run(executar(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
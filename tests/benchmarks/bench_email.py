@@ -0,0 +1,56 @@
+"""Benchmark de mensagens montadas por segundo: templates Jinja pré-compilados
+(controllers/enviar_email.py) contra a montagem antiga com f-strings (email_fstring.py).
+
+Cada mensagem é montada e serializada (as_bytes), que é o trabalho feito por e-mail no envio.
+Serve de referência para envios em massa (mudança de status do pedido, queda de preço).
+
+    python -m tests.benchmarks.bench_email
+    python -m tests.benchmarks.bench_email --itens 1 10 50 100 --segundos 2
+"""
+import argparse
+import time
+
+import tests.ambiente  # noqa: F401 (diretório de trabalho na raiz: templates/emails)
+from controllers import enviar_email
+from tests.benchmarks import email_fstring
+
+
+def dados_pedido(itens: int) -> dict:
+    return {
+        "id_pedido": 12345,
+        "valor_total": 89.9 * itens + 15.0,
+        "itens": [{"nome": f"Camisa Oficial {n} Dry Fit", "quantidade": 1 + n % 3, "preco": 89.9,
+                   "imagem": f"/static/upload/img/produto_{n}.jpg"} for n in range(itens)],
+    }
+
+
+def por_segundo(montar, dados, segundos: float) -> float:
+    """Mensagens montadas e serializadas por segundo durante ~`segundos`."""
+    montar("cliente@teste.com", dados).as_bytes()  # aquecimento
+    quantidade, inicio = 0, time.perf_counter()
+    while (decorrido := time.perf_counter() - inicio) < segundos:
+        for _ in range(50):
+            montar("cliente@teste.com", dados).as_bytes()
+        quantidade += 50
+    return quantidade / decorrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--itens", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--segundos", type=float, default=1.0, help="tempo de medição por caso")
+    args = parser.parse_args()
+
+    casos = [("boas-vindas", enviar_email.montar_email_boas_vindas,
+              email_fstring.montar_email_boas_vindas, None)]
+    casos += [(f"pedido, {itens} itens", enviar_email.montar_email_pedido,
+               email_fstring.montar_email_pedido, dados_pedido(itens)) for itens in args.itens]
+
+    print(f"{'mensagens/s':<22}{'templates':>12}{'f-strings':>12}{'ganho':>8}")
+    for nome, atual, antiga, dados in casos:
+        novas, antigas = por_segundo(atual, dados, args.segundos), por_segundo(antiga, dados, args.segundos)
+        print(f"{nome:<22}{novas:12.0f}{antigas:12.0f}{novas / antigas:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
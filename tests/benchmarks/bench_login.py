@@ -0,0 +1,91 @@
+"""Benchmark de logins por segundo (POST /login) com o bcrypt no pool dedicado (auth.py).
+
+Mede a vazão de logins por núcleo (logins/s divididos pelos núcleos que o pool de hash usa) e o
+atraso do event loop durante o pico: com as rotas de senha síncronas o loop continua livre para
+as outras requisições enquanto os hashes rodam. Acima de HASH_FILA_MAX as requisições recebem 503.
+
+    python -m tests.benchmarks.bench_login --requisicoes 200 --concorrencia 50
+    HASH_WORKERS=8 HASH_FILA_MAX=24 python -m tests.benchmarks.bench_login
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--requisicoes", type=int, default=200)
+parser.add_argument("--concorrencia", type=int, default=50)
+parser.add_argument("--clientes", type=int, default=20)
+parser.add_argument("--rounds", type=int, default=12, help="custo do bcrypt (BCRYPT_ROUNDS)")
+args = parser.parse_args()
+os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+from tests.ambiente import criar_banco, criar_cliente, app_asgi
+import httpx
+from database import SessionLocal
+from auth import gerar_senha, encerrar_hash_pool, HASH_WORKERS, HASH_FILA_MAX
+
+SENHA = "senha-de-teste"
+
+
+async def medir_atraso_loop(parar: asyncio.Event, atrasos: list):
+    """Dorme 10 ms em loop e anota quanto acordou atrasado (loop bloqueado)."""
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.01)
+        atrasos.append(time.perf_counter() - inicio - 0.01)
+
+
+async def executar():
+    criar_banco()
+    senha_hash = gerar_senha(SENHA)
+    with SessionLocal() as db:
+        for numero in range(args.clientes):
+            criar_cliente(db, numero, senha_hash)
+        db.commit()
+
+    transporte = httpx.ASGITransport(app=app_asgi())
+    semaforo = asyncio.Semaphore(args.concorrencia)
+    latencias, resultados = [], {"ok": 0, "recusado": 0, "erro": 0}
+
+    async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as http:
+        async def logar(numero):
+            dados = {"email": f"cliente{numero % args.clientes}@teste.com", "senha": SENHA}
+            async with semaforo:
+                inicio = time.perf_counter()
+                resposta = await http.post("/login", data=dados)
+                latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code == 303:
+                resultados["ok"] += 1
+            elif resposta.status_code == 503:
+                resultados["recusado"] += 1
+            else:
+                resultados["erro"] += 1
+
+        parar, atrasos = asyncio.Event(), []
+        monitor = asyncio.create_task(medir_atraso_loop(parar, atrasos))
+        inicio = time.perf_counter()
+        await asyncio.gather(*(logar(n) for n in range(args.requisicoes)))
+        duracao = time.perf_counter() - inicio
+        parar.set()
+        await monitor
+
+    latencias.sort()
+    # núcleos que o bcrypt consegue ocupar: um por worker do pool, até o total da máquina
+    nucleos = min(HASH_WORKERS, os.cpu_count() or 1)
+    print(f"bcrypt rounds={args.rounds} HASH_WORKERS={HASH_WORKERS} HASH_FILA_MAX={HASH_FILA_MAX} "
+          f"núcleos={nucleos} concorrência={args.concorrencia}")
+    print(f"{args.requisicoes} requisições em {duracao:.2f}s: {resultados['ok'] / duracao / nucleos:.1f} logins/s por núcleo "
+          f"({resultados['ok'] / duracao:.1f} no total; ok={resultados['ok']} recusados={resultados['recusado']} "
+          f"erros={resultados['erro']})")
+    print(f"latência p50={statistics.median(latencias) * 1000:.0f}ms "
+          f"p95={latencias[int(len(latencias) * 0.95) - 1] * 1000:.0f}ms")
+    print(f"atraso do event loop: máx={max(atrasos) * 1000:.1f}ms média={statistics.mean(atrasos) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(executar())
+    finally:
+        encerrar_hash_pool()
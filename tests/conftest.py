@@ -0,0 +1,18 @@
+# tests.ambiente ajusta o ambiente (SQLite temporário, diretório de trabalho) antes de
+# qualquer módulo do app ser importado pelos testes
+import itertools
+import pytest
+import tests.ambiente as ambiente
+
+_bancos = itertools.count()
+
+
+@pytest.fixture
+def engine():
+    """Banco SQLite novo por teste, já com as tabelas criadas."""
+    return ambiente.criar_banco(f"teste_{next(_bancos)}.sqlite3")
+
+
+@pytest.fixture
+def app(engine):
+    return ambiente.app_asgi()
@@ -0,0 +1,65 @@
+"""Busca das tabelas do painel admin: "%" e "_" digitados casam literalmente no LIKE; pedidos
+só pelo começo do nome ou do e-mail do cliente."""
+import asyncio
+
+import httpx
+import pytest
+
+from tests import ambiente
+from database import SessionLocal
+from models.models import Pedidos
+
+
+@pytest.fixture
+def admin_e_clientes(engine):
+    with SessionLocal() as db:
+        admin = ambiente.criar_cliente(db, 0)
+        admin.is_admin = True
+        nomes = {1: "Loja 100% Esporte", 2: "Loja 1000 Esportes", 3: "joao_silva", 4: "joaoXsilva"}
+        clientes = {}
+        for numero, nome in nomes.items():
+            clientes[numero] = ambiente.criar_cliente(db, numero)
+            clientes[numero].nome = nome
+        db.flush()
+        for cliente in clientes.values():
+            db.add(Pedidos(id_cliente=cliente.id_cliente, valor_frete=0.0, data_pedido="2025-01-01 10:00:00",
+                           status="Pendente", valor_total=10.0))
+        db.commit()
+        db.refresh(admin)
+        db.expunge(admin)
+    return admin
+
+
+def buscar(app, admin, recurso: str, q: str) -> list:
+    async def chamar():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste",
+                                     cookies=ambiente.cookies_do_cliente(admin)) as http:
+            return await http.get(f"/api/admin/{recurso}", params={"q": q})
+
+    resposta = asyncio.run(chamar())
+    assert resposta.status_code == 200
+    return resposta.json()[recurso]
+
+
+@pytest.mark.parametrize("q, esperados", [
+    ("100%", ["Loja 100% Esporte"]),
+    ("o_s", ["joao_silva"]),
+    ("%", ["Loja 100% Esporte"]),
+    ("joao", ["joaoXsilva", "joao_silva"]),
+])
+def test_busca_de_clientes_trata_curingas_como_texto(app, admin_e_clientes, q, esperados):
+    assert [c["nome"] for c in buscar(app, admin_e_clientes, "clientes", q)] == esperados
+
+
+@pytest.mark.parametrize("q, esperados", [
+    ("Loja 100%", ["Loja 100% Esporte"]),
+    ("joao_", ["joao_silva"]),
+    ("joao", ["joaoXsilva", "joao_silva"]),
+    ("cliente3@", ["joao_silva"]),
+    # só o começo do nome/e-mail (usa índice): trecho do meio não casa
+    ("silva", []),
+    ("o_s", []),
+])
+def test_busca_de_pedidos_por_inicio_do_nome_ou_email(app, admin_e_clientes, q, esperados):
+    assert [p["cliente"] for p in buscar(app, admin_e_clientes, "pedidos", q)] == esperados
@@ -0,0 +1,68 @@
+"""Índice do catálogo em memória: busca e contagens das facetas numa chamada só."""
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from database import SessionLocal
+from models.models import Produtos
+from controllers import busca
+from controllers.catalogo_indice import IndiceCatalogo, FACETAS
+from tests.benchmarks.bench_busca import produtos_sinteticos
+
+
+@pytest.fixture
+def indice(engine):
+    with SessionLocal() as db:
+        db.execute(insert(Produtos), list(produtos_sinteticos(3000)))
+        db.commit()
+        indice = IndiceCatalogo()
+        indice.carregar(db)
+    return indice
+
+
+def contagens_por_intersecao(indice, q, filtros, preco_min=None, preco_max=None):
+    """Referência: a contagem de cada faceta intersectando os conjuntos de ids."""
+    base = set(indice._busca.buscar(q)) if q else set(indice._produtos)
+    faixa = indice._ids_preco(preco_min, preco_max)
+    if faixa is not None:
+        base &= faixa
+    resultado = {}
+    for faceta in FACETAS:
+        ids = base
+        for outra, valor in filtros.items():
+            if outra != faceta and valor:
+                ids = ids & indice._por_valor[outra].get(valor, set())
+        resultado[faceta] = {valor: len(s & ids) for valor, s in indice._por_valor[faceta].items()}
+    return resultado
+
+
+@pytest.mark.parametrize("q", [None, "camisa", "cam", "ret", "nike dry", "inexistente"])
+def test_contagens_batem_com_a_intersecao_dos_conjuntos(indice, q):
+    aleatorio = random.Random(3)
+    for _ in range(10):
+        filtros = {faceta: aleatorio.choice([None] + sorted(indice._por_valor[faceta])) for faceta in FACETAS}
+        preco_min = aleatorio.choice([None, 100.0, 300.0])
+        esperado = contagens_por_intersecao(indice, q, filtros, preco_min)
+        assert indice.contagens(q, preco_min=preco_min, **filtros) == esperado
+        if q:
+            ids, contagens = indice.buscar_com_contagens(q, preco_min=preco_min, **filtros)
+            assert contagens == esperado
+            assert ids == indice.buscar(q, preco_min=preco_min, **filtros)
+
+
+def test_contagens_acompanham_atualizacao_incremental(indice):
+    produto = indice._produtos[1]
+    antes = indice.contagens(None)["cor"][produto.cor]
+    indice._remover(1)
+    assert indice.contagens(None)["cor"][produto.cor] == antes - 1
+    assert indice.contagens(None, cor=produto.cor) == contagens_por_intersecao(indice, None, {"cor": produto.cor})
+
+
+def test_pedaco_curto_limita_os_termos_parciais(indice, monkeypatch):
+    monkeypatch.setattr(busca, "MAX_PRODUTOS_PARCIAIS", 1)
+    # "ret" casa com "retro" e "preto" (mesmo tamanho): entra só o de menos produtos
+    retro, preto = (len(indice._busca._postings[t]) for t in ("retro", "preto"))
+    assert len(indice.buscar("ret")) == min(retro, preto)
+    # o termo exato nunca é cortado
+    assert len(indice.buscar("preto")) == preto
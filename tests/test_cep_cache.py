@@ -0,0 +1,31 @@
+"""Cache de CEP: o segundo nível (SQLite) é lido e gravado fora do event loop."""
+import asyncio
+import threading
+
+from cep_cache import CacheCEP, AUSENTE
+
+
+def test_sqlite_do_cache_de_cep_fica_fora_do_event_loop(tmp_path, monkeypatch):
+    cache = CacheCEP(caminho=str(tmp_path / "cep.sqlite3"))
+    threads = []
+    for metodo in ("_ler", "_gravar"):
+        original = getattr(cache, metodo)
+
+        def anotado(*args, _original=original):
+            threads.append(threading.current_thread())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, metodo, anotado)
+
+    async def usar():
+        await cache.set("geo", "01001000", [-23.55, -46.63])
+        await cache.set("geo", "99999999", None)
+        cache._memoria.limpar()  # obriga a leitura do SQLite
+        return (await cache.get("geo", "01001000"),
+                await cache.get_varios("geo", ["99999999", "01001000", "12345678"]))
+
+    um, varios = asyncio.run(usar())
+
+    assert um == [-23.55, -46.63]
+    assert varios == [None, [-23.55, -46.63], AUSENTE]
+    assert threads and threading.main_thread() not in threads
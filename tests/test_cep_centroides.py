@@ -0,0 +1,42 @@
+"""Tabela offline de centroides: a consulta em lote com numpy dá o mesmo que a busca com bisect."""
+import random
+
+import pytest
+
+from controllers import cep_centroides
+from controllers.cep_centroides import TabelaCentroides
+
+
+@pytest.fixture
+def tabela(tmp_path):
+    aleatorio = random.Random(13)
+    linhas = ["cep_inicio,cep_fim,lat,lon"]
+    inicio = 1000000
+    for _ in range(500):
+        inicio += aleatorio.randint(1, 50000)  # deixa buracos entre as faixas
+        fim = inicio + aleatorio.randint(0, 20000)
+        linhas.append(f"{inicio:08d},{fim:08d},{aleatorio.uniform(-33, 5):.4f},{aleatorio.uniform(-73, -35):.4f}")
+        inicio = fim
+    caminho = tmp_path / "centroides.csv"
+    caminho.write_text("\n".join(linhas), encoding="utf-8")
+    tabela = TabelaCentroides()
+    tabela.carregar(str(caminho))
+    return tabela
+
+
+def test_buscar_varios_com_e_sem_numpy_batem_com_buscar(tabela, monkeypatch):
+    aleatorio = random.Random(14)
+    ceps = [f"{aleatorio.randint(0, 99999999):08d}" for _ in range(2000)]
+    # bordas: início e fim das faixas e os vizinhos fora delas
+    for inicio, fim in list(zip(tabela._inicios, tabela._fins))[:50]:
+        ceps += [f"{inicio - 1:08d}", f"{inicio:08d}", f"{fim:08d}", f"{fim + 1:08d}"]
+    esperado = [tabela.buscar(cep) for cep in ceps]
+    assert any(esperado) and not all(esperado)
+
+    assert tabela.buscar_varios(ceps) == esperado
+    monkeypatch.setattr(cep_centroides, "np", None)
+    assert tabela.buscar_varios(ceps) == esperado
+
+
+def test_buscar_varios_com_tabela_vazia():
+    assert TabelaCentroides().buscar_varios(["01001000", "99999999"]) == [None, None]
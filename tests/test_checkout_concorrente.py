@@ -0,0 +1,100 @@
+"""Estresse do checkout: N checkouts simultâneos disputando um produto com estoque K < N.
+
+A baixa de estoque é um UPDATE condicional (controllers/carrinho.py): exatamente os pedidos
+que cabem no estoque podem ser criados e o estoque nunca fica negativo.
+
+Também roda como script, com valores maiores:
+
+    python -m tests.test_checkout_concorrente --checkouts 200 --estoque 50 --quantidade 2
+"""
+import argparse
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import func
+
+from tests import ambiente
+from database import SessionLocal
+from models.models import Produtos, Pedidos, ItemPedido
+
+
+def preparar(checkouts: int, estoque: int, quantidade: int):
+    with SessionLocal() as db:
+        clientes = [ambiente.criar_cliente(db, n) for n in range(checkouts)]
+        produto = ambiente.criar_produto(db, 1, estoque=estoque)
+        db.flush()
+        for cliente in clientes:
+            ambiente.criar_endereco(db, cliente)
+        db.commit()
+        for objeto in clientes + [produto]:
+            db.refresh(objeto)
+        db.expunge_all()
+    for cliente in clientes:
+        ambiente.encher_carrinho(cliente.id_cliente, [produto], quantidade)
+    return clientes, produto
+
+
+async def disparar(app, clientes) -> list:
+    """Todos os checkouts ao mesmo tempo; retorna as respostas."""
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as http:
+        return await asyncio.gather(*(
+            http.post("/checkout", data=ambiente.formulario_checkout(),
+                      cookies=ambiente.cookies_do_cliente(cliente))
+            for cliente in clientes
+        ))
+
+
+def executar_estresse(app, checkouts: int, estoque: int, quantidade: int = 1) -> dict:
+    clientes, produto = preparar(checkouts, estoque, quantidade)
+    respostas = asyncio.run(disparar(app, clientes))
+    confirmados = [r for r in respostas
+                   if r.status_code == 303 and r.headers["location"].startswith("/pedidos/confirmacao")]
+    sem_estoque = [r for r in respostas if r.status_code == 200 and "Estoque insuficiente" in r.text]
+    with SessionLocal() as db:
+        return {
+            "confirmados": len(confirmados),
+            "sem_estoque": len(sem_estoque),
+            "estoque_final": db.get(Produtos, produto.id_produto).estoque,
+            "pedidos": db.query(func.count(Pedidos.id_pedido)).scalar(),
+            "unidades_vendidas": db.query(func.coalesce(func.sum(ItemPedido.quantidade), 0)).scalar(),
+        }
+
+
+@pytest.mark.parametrize("checkouts, estoque, quantidade", [
+    (40, 15, 1),
+    (30, 21, 2),  # 10 pedidos de 2 unidades cabem; sobra 1, que não atende nenhum pedido
+])
+def test_checkouts_simultaneos_nao_vendem_alem_do_estoque(app, checkouts, estoque, quantidade):
+    resultado = executar_estresse(app, checkouts, estoque, quantidade)
+
+    esperados = estoque // quantidade
+    assert resultado["confirmados"] == esperados
+    assert resultado["sem_estoque"] == checkouts - esperados
+    assert resultado["pedidos"] == esperados
+    assert resultado["unidades_vendidas"] == esperados * quantidade
+    assert resultado["estoque_final"] == estoque - esperados * quantidade
+    assert resultado["estoque_final"] >= 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkouts", type=int, default=200)
+    parser.add_argument("--estoque", type=int, default=50)
+    parser.add_argument("--quantidade", type=int, default=1)
+    args = parser.parse_args()
+
+    ambiente.criar_banco()
+    resultado = executar_estresse(ambiente.app_asgi(), args.checkouts, args.estoque, args.quantidade)
+    print(resultado)
+    esperados = args.estoque // args.quantidade
+    ok = (resultado["confirmados"] == esperados
+          and resultado["estoque_final"] == args.estoque - esperados * args.quantidade
+          and resultado["estoque_final"] >= 0)
+    print("OK" if ok else f"FALHOU: esperados {esperados} pedidos confirmados")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
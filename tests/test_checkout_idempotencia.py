@@ -0,0 +1,43 @@
+"""Chave de idempotência do checkout: gerada pelo GET /checkout e respeitada pelo POST."""
+import asyncio
+import re
+
+import httpx
+from sqlalchemy import func
+
+from tests import ambiente
+from tests.test_checkout_concorrente import preparar
+from database import SessionLocal
+from models.models import Pedidos
+
+
+def test_pagina_de_checkout_traz_uma_chave_nova_a_cada_visita(app):
+    clientes, _ = preparar(checkouts=1, estoque=10, quantidade=1)
+
+    async def abrir():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste",
+                                     cookies=ambiente.cookies_do_cliente(clientes[0])) as http:
+            return [await http.get("/checkout") for _ in range(2)]
+
+    chaves = [re.search(r'name="chave_idempotencia"[^>]*value="([0-9a-f]{32})"', r.text).group(1)
+              for r in asyncio.run(abrir())]
+    assert chaves[0] != chaves[1]
+
+
+def test_envio_duplicado_com_a_mesma_chave_cria_um_pedido_so(app):
+    clientes, _ = preparar(checkouts=1, estoque=10, quantidade=1)
+    formulario = ambiente.formulario_checkout()
+
+    async def enviar_duas_vezes():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste",
+                                     cookies=ambiente.cookies_do_cliente(clientes[0])) as http:
+            return await asyncio.gather(*(http.post("/checkout", data=formulario) for _ in range(2)))
+
+    respostas = asyncio.run(enviar_duas_vezes())
+
+    assert [r.status_code for r in respostas] == [303, 303]
+    assert respostas[0].headers["location"] == respostas[1].headers["location"]
+    with SessionLocal() as db:
+        assert db.query(func.count(Pedidos.id_pedido)).scalar() == 1
@@ -0,0 +1,86 @@
+"""Quantidade de consultas SQL do perfil e da confirmação de pedido: não pode crescer com o
+número de pedidos do cliente nem com o número de itens de cada pedido (sem N+1)."""
+import asyncio
+import itertools
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from tests import ambiente
+from database import SessionLocal
+from models.models import Pedidos, ItemPedido
+
+_clientes = itertools.count()
+
+
+def criar_pedidos(pedidos: int, itens: int):
+    """Cliente novo com `pedidos` pedidos de `itens` produtos diferentes cada."""
+    with SessionLocal() as db:
+        cliente = ambiente.criar_cliente(db, next(_clientes))
+        produtos = [ambiente.criar_produto(db, n) for n in range(itens)]
+        db.flush()
+        ids = []
+        for _ in range(pedidos):
+            pedido = Pedidos(id_cliente=cliente.id_cliente, endereco_entrega="Rua Teste, 1",
+                             cep_entrega="01001000", valor_frete=10.0, data_pedido="2025-01-01 10:00:00",
+                             status="Pendente", valor_total=10.0 * itens + 10.0)
+            pedido.itens = [ItemPedido(produto_id=p.id_produto, quantidade=1, preco_unitario=10.0)
+                            for p in produtos]
+            db.add(pedido)
+            db.flush()
+            ids.append(pedido.id_pedido)
+        db.commit()
+        db.refresh(cliente)
+        db.expunge(cliente)
+    return cliente, ids
+
+
+def contar_consultas(engine, app, cliente, url: str) -> int:
+    consultas = []
+
+    def anotar(_conexao, _cursor, sql, *_):
+        consultas.append(sql)
+
+    async def abrir():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste",
+                                     cookies=ambiente.cookies_do_cliente(cliente)) as http:
+            return await http.get(url)
+
+    event.listen(engine, "before_cursor_execute", anotar)
+    try:
+        resposta = asyncio.run(abrir())
+    finally:
+        event.remove(engine, "before_cursor_execute", anotar)
+    assert resposta.status_code == 200
+    return len(consultas)
+
+
+@pytest.mark.parametrize("pedidos, itens", [(3, 5), (25, 1), (25, 20)])
+def test_perfil_nao_cresce_com_pedidos_e_itens(engine, app, pedidos, itens):
+    # referência: 1 pedido de 1 item (a primeira visita também aquece caches do app)
+    referencia, _ = criar_pedidos(1, 1)
+    contar_consultas(engine, app, referencia, "/perfil")
+    base = contar_consultas(engine, app, criar_pedidos(1, 1)[0], "/perfil")
+
+    cliente, _ = criar_pedidos(pedidos, itens)
+    assert contar_consultas(engine, app, cliente, "/perfil") == base
+
+
+def test_perfil_pagina_os_pedidos(engine, app):
+    cliente, ids = criar_pedidos(25, 2)
+    base = contar_consultas(engine, app, cliente, "/perfil")
+    # página seguinte (pedidos_antes): mesma quantidade de consultas
+    assert contar_consultas(engine, app, cliente, f"/perfil?pedidos_antes={ids[15]}") == base
+
+
+@pytest.mark.parametrize("itens", [10, 50])
+def test_confirmacao_nao_cresce_com_itens(engine, app, itens):
+    referencia, ids = criar_pedidos(1, 1)
+    contar_consultas(engine, app, referencia, f"/pedidos/confirmacao?id={ids[0]}")
+    referencia, ids = criar_pedidos(1, 1)
+    base = contar_consultas(engine, app, referencia, f"/pedidos/confirmacao?id={ids[0]}")
+
+    cliente, ids = criar_pedidos(1, itens)
+    assert contar_consultas(engine, app, cliente, f"/pedidos/confirmacao?id={ids[0]}") == base
@@ -0,0 +1,115 @@
+"""Limites de uso dos cupons no checkout: max_usos (total) e max_usos_por_cliente.
+
+Os contadores são incrementados com UPDATE condicional na transação do pedido
+(controllers/cupom_indice.py): um cupom esgotado ou já usado pelo cliente desfaz o pedido.
+"""
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import func
+
+from tests import ambiente
+from tests.test_checkout_concorrente import preparar
+from database import SessionLocal
+from models.models import Cupom, CupomUso, Pedidos
+from controllers.cupom_indice import indice_cupons
+
+CODIGO = "CAMPANHA10"
+
+
+def criar_cupom(**limites) -> int:
+    with SessionLocal() as db:
+        cupom = Cupom(chave_cupon=CODIGO, valor_desconto=0.1, ativo=True, usos=0, **limites)
+        db.add(cupom)
+        db.commit()
+        indice_cupons.carregar(db)
+        return cupom.id_cupon
+
+
+def finalizar(app, clientes) -> list:
+    """Um checkout com o cupom por cliente, todos ao mesmo tempo."""
+    async def disparar():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste") as http:
+            return await asyncio.gather(*(
+                http.post("/checkout", data={**ambiente.formulario_checkout(), "promo_code": CODIGO},
+                          cookies=ambiente.cookies_do_cliente(cliente))
+                for cliente in clientes
+            ))
+    return asyncio.run(disparar())
+
+
+def confirmado(resposta) -> bool:
+    return resposta.status_code == 303 and resposta.headers["location"].startswith("/pedidos/confirmacao")
+
+
+@pytest.mark.parametrize("checkouts", [2, 10])
+def test_checkouts_simultaneos_nao_passam_de_max_usos(app, checkouts):
+    id_cupon = criar_cupom(max_usos=1)
+    clientes, _ = preparar(checkouts=checkouts, estoque=100, quantidade=1)
+
+    respostas = finalizar(app, clientes)
+
+    assert sum(map(confirmado, respostas)) == 1
+    assert sum("esgotou" in r.text for r in respostas) == checkouts - 1
+    with SessionLocal() as db:
+        assert db.get(Cupom, id_cupon).usos == 1
+        # os pedidos recusados foram desfeitos junto com o cupom
+        assert db.query(func.count(Pedidos.id_pedido)).scalar() == 1
+
+
+def test_cliente_nao_reutiliza_cupom_de_uso_unico(app):
+    id_cupon = criar_cupom(max_usos_por_cliente=1)
+    clientes, produto = preparar(checkouts=1, estoque=100, quantidade=1)
+
+    assert confirmado(finalizar(app, clientes)[0])
+    ambiente.encher_carrinho(clientes[0].id_cliente, [produto])
+    segunda = finalizar(app, clientes)[0]
+
+    assert segunda.status_code == 200
+    assert "já usou o cupom" in segunda.text
+    with SessionLocal() as db:
+        assert db.get(CupomUso, (id_cupon, clientes[0].id_cliente)).usos == 1
+        assert db.get(Cupom, id_cupon).usos == 1
+        assert db.query(func.count(Pedidos.id_pedido)).scalar() == 1
+
+
+def test_cupom_por_cliente_vale_para_clientes_diferentes(app):
+    id_cupon = criar_cupom(max_usos_por_cliente=1)
+    clientes, _ = preparar(checkouts=3, estoque=100, quantidade=1)
+
+    assert all(map(confirmado, finalizar(app, clientes)))
+    with SessionLocal() as db:
+        assert db.get(Cupom, id_cupon).usos == 3
+
+
+def test_indice_vencido_recarrega_uma_vez_em_segundo_plano(engine, monkeypatch):
+    import threading
+    from controllers.cupom_indice import IndiceCupons
+
+    indice = IndiceCupons()
+    with SessionLocal() as db:
+        indice.carregar(db)
+    liberar = threading.Event()
+    cargas = []
+
+    def carregar_devagar(db):
+        cargas.append(db)
+        liberar.wait(5)
+
+    monkeypatch.setattr(indice, "carregar", carregar_devagar)
+    indice._carregado_em -= 10_000  # vencido
+    threads = [threading.Thread(target=indice.garantir_atualizado) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    # nenhuma requisição esperou pela recarga e só uma recarga foi disparada
+    assert all(not t.is_alive() for t in threads)
+    for _ in range(100):
+        if cargas:
+            break
+        threading.Event().wait(0.05)
+    assert len(cargas) == 1
+    liberar.set()
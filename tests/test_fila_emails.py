@@ -0,0 +1,140 @@
+"""Fila de e-mails (fila_emails.py) contra um servidor SMTP local (aiosmtpd): entrega pelo pool
+de conexões, nova tentativa com espera exponencial e status "falhou" no limite de tentativas."""
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import fila_emails
+from fila_emails import DespachanteEmails, enfileirar_email
+from database import SessionLocal
+from models.models import EmailPendente
+
+
+class Caixa:
+    """Handler do aiosmtpd: guarda as mensagens recebidas e a sessão (conexão) de cada uma."""
+
+    def __init__(self):
+        self.mensagens = []
+        self.sessoes = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.mensagens.append((envelope.rcpt_tos, envelope.content.decode("utf-8", "replace")))
+        self.sessoes.add(id(session))
+        return "250 OK"
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(engine, monkeypatch):
+    caixa = Caixa()
+    controlador = Controller(caixa, hostname="127.0.0.1", port=porta_livre())
+    controlador.start()
+    monkeypatch.setattr(fila_emails, "SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setattr(fila_emails, "SMTP_PORT", controlador.port)
+    monkeypatch.setattr(fila_emails, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(fila_emails, "SMTP_PASSWORD", "")
+    monkeypatch.setattr(fila_emails, "EMAIL_TIMEOUT", 5.0)
+    yield caixa
+    controlador.stop()
+
+
+def enfileirar(*emails):
+    with SessionLocal() as db:
+        for tipo, destinatario, dados in emails:
+            enfileirar_email(db, tipo, destinatario, dados)
+        db.commit()
+
+
+def situacao():
+    with SessionLocal() as db:
+        return {e.destinatario: e for e in db.query(EmailPendente).order_by(EmailPendente.id)}
+
+
+def processar(despachante: DespachanteEmails) -> int:
+    async def lote():
+        try:
+            return await despachante.processar_lote()
+        finally:
+            await despachante._conexoes.fechar_todas()
+    return asyncio.run(lote())
+
+
+def test_entrega_o_lote_pelo_pool_de_conexoes(smtp, monkeypatch):
+    monkeypatch.setattr(fila_emails, "EMAIL_CONEXOES", 2)
+    pedido = {"id_pedido": 7, "valor_total": 59.9,
+              "itens": [{"nome": "Camisa", "quantidade": 1, "preco": 49.9, "imagem": None}]}
+    enfileirar(("pedido", "a@teste.com", pedido),
+               *(("boas_vindas", f"cliente{n}@teste.com", None) for n in range(5)))
+
+    assert processar(DespachanteEmails()) == 6
+
+    assert sorted(d for destinos, _ in smtp.mensagens for d in destinos) == sorted(
+        ["a@teste.com"] + [f"cliente{n}@teste.com" for n in range(5)])
+    assert any("Pedido #7" in conteudo for _, conteudo in smtp.mensagens)
+    # 6 mensagens em no máximo EMAIL_CONEXOES conexões (sem uma conexão por e-mail)
+    assert len(smtp.sessoes) <= 2
+    emails = situacao()
+    assert {e.status for e in emails.values()} == {"enviado"}
+    assert all(e.enviado_em and e.lote is None for e in emails.values())
+    # nada mais pendente
+    assert processar(DespachanteEmails()) == 0
+
+
+def test_falha_tenta_de_novo_com_espera_exponencial_ate_falhar(smtp, monkeypatch):
+    # servidor fora do ar: porta sem ninguém escutando
+    monkeypatch.setattr(fila_emails, "SMTP_PORT", porta_livre())
+    monkeypatch.setattr(fila_emails, "EMAIL_MAX_TENTATIVAS", 3)
+    monkeypatch.setattr(fila_emails, "EMAIL_BACKOFF_BASE", 30.0)
+    enfileirar(("boas_vindas", "b@teste.com", None))
+    despachante = DespachanteEmails()
+
+    esperas = []
+    for tentativa in (1, 2):
+        antes = datetime.now()
+        assert processar(despachante) == 1
+        email = situacao()["b@teste.com"]
+        assert (email.status, email.tentativas, email.lote) == ("pendente", tentativa, None)
+        assert email.ultimo_erro
+        esperas.append((email.proxima_tentativa - antes).total_seconds())
+        # ainda na espera: não é reenviado
+        assert processar(despachante) == 0
+        # adianta o relógio da fila para a próxima tentativa
+        with SessionLocal() as db:
+            db.query(EmailPendente).update({"proxima_tentativa": datetime.now() - timedelta(seconds=1)})
+            db.commit()
+
+    # base * 2^(tentativas-1) com variação de ±20%
+    assert 30 * 0.8 - 1 <= esperas[0] <= 30 * 1.2 + 1
+    assert 60 * 0.8 - 1 <= esperas[1] <= 60 * 1.2 + 1
+
+    assert processar(despachante) == 1
+    email = situacao()["b@teste.com"]
+    assert (email.status, email.tentativas) == ("falhou", 3)
+    assert processar(despachante) == 0
+    assert smtp.mensagens == []
+
+
+def test_email_volta_a_ser_entregue_quando_o_servidor_volta(smtp, monkeypatch):
+    porta = fila_emails.SMTP_PORT
+    monkeypatch.setattr(fila_emails, "SMTP_PORT", porta_livre())
+    enfileirar(("boas_vindas", "c@teste.com", None))
+    despachante = DespachanteEmails()
+    processar(despachante)
+    assert situacao()["c@teste.com"].tentativas == 1
+
+    monkeypatch.setattr(fila_emails, "SMTP_PORT", porta)
+    with SessionLocal() as db:
+        db.query(EmailPendente).update({"proxima_tentativa": datetime.now() - timedelta(seconds=1)})
+        db.commit()
+    assert processar(despachante) == 1
+    email = situacao()["c@teste.com"]
+    assert (email.status, email.tentativas, email.ultimo_erro) == ("enviado", 1, None)
+    assert [destinos for destinos, _ in smtp.mensagens] == [["c@teste.com"]]
@@ -0,0 +1,56 @@
+"""/api/frete: consultas ao banco fora do event loop e distâncias em lote (numpy) iguais à haversine."""
+import asyncio
+import random
+import threading
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from tests import ambiente
+from database import SessionLocal
+from controllers import frete
+
+
+def test_cotacao_do_endereco_salvo_consulta_o_banco_fora_do_event_loop(engine, app):
+    with SessionLocal() as db:
+        cliente = ambiente.criar_cliente(db, 1)
+        db.flush()
+        endereco = ambiente.criar_endereco(db, cliente)
+        db.commit()
+        id_endereco = endereco.id_endereco
+        db.refresh(cliente)
+        db.expunge(cliente)
+
+    threads = []
+
+    def anotar(*_):
+        threads.append(threading.current_thread())
+
+    async def cotar():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste",
+                                     cookies=ambiente.cookies_do_cliente(cliente)) as http:
+            return await http.get("/api/frete", params={"id_endereco": id_endereco})
+
+    event.listen(engine, "before_cursor_execute", anotar)
+    try:
+        resposta = asyncio.run(cotar())
+    finally:
+        event.remove(engine, "before_cursor_execute", anotar)
+
+    assert resposta.json()["success"] is True
+    assert resposta.json()["cotacao"]
+    # o event loop do teste roda na thread principal
+    assert threads and threading.main_thread() not in threads
+
+
+def test_distancias_km_com_e_sem_numpy_batem_com_a_haversine(monkeypatch):
+    aleatorio = random.Random(7)
+    lats = [aleatorio.uniform(-33.7, 5.3) for _ in range(500)] + [frete.ORIGEM_LAT]
+    lons = [aleatorio.uniform(-73.9, -34.8) for _ in range(500)] + [frete.ORIGEM_LON]
+    esperado = [frete.haversine_distance(frete.ORIGEM_LAT, frete.ORIGEM_LON, lat, lon) for lat, lon in zip(lats, lons)]
+
+    assert frete.distancias_km(frete.ORIGEM_LAT, frete.ORIGEM_LON, lats, lons) == pytest.approx(esperado, abs=1e-6)
+    monkeypatch.setattr(frete, "np", None)
+    assert frete.distancias_km(frete.ORIGEM_LAT, frete.ORIGEM_LON, lats, lons) == esperado
@@ -0,0 +1,39 @@
+"""Fila do pool de hash cheia: login, cadastro e troca de senha respondem igual (503 + Retry-After)."""
+import asyncio
+
+import httpx
+import pytest
+
+import auth
+from tests import ambiente
+from database import SessionLocal
+
+
+def test_fila_de_hash_fica_abaixo_do_threadpool():
+    assert auth.HASH_FILA_MAX <= auth.THREADPOOL_THREADS - auth.HASH_FOLGA_THREADPOOL
+
+
+@pytest.mark.parametrize("url, dados", [
+    ("/login", {"email": "cliente0@teste.com", "senha": "x"}),
+    ("/register", {"nome": "Novo", "cpf": "98765432100", "email": "novo@teste.com", "senha": "x",
+                   "telefone": "11999999999"}),
+    ("/perfil/atualizar-senha", {"nova_senha": "outra"}),
+])
+def test_fila_cheia_responde_503_com_retry_after(app, monkeypatch, url, dados):
+    with SessionLocal() as db:
+        cliente = ambiente.criar_cliente(db, 0)
+        db.commit()
+        db.refresh(cliente)
+        db.expunge(cliente)
+    monkeypatch.setattr(auth, "HASH_FILA_MAX", 0)
+
+    async def enviar():
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://teste",
+                                     cookies=ambiente.cookies_do_cliente(cliente)) as http:
+            return await http.post(url, data=dados)
+
+    resposta = asyncio.run(enviar())
+    assert resposta.status_code == 503
+    assert resposta.headers["retry-after"] == str(auth.HASH_RETRY_AFTER)
+    assert "Muitos acessos" in resposta.json()["mensagem"]
@@ -0,0 +1,75 @@
+from database import get_local_db
+
+# Versões compartilhadas entre os workers (SQLite local).
+# Cada worker do uvicorn guarda dados em memória (índice do catálogo, cupons); quem altera
+# os dados incrementa a versão da chave e os outros workers, ao ver a versão mudar,
+# recarregam do banco.
+# Quem informa o item alterado (ex.: id do produto) junto com o incremento deixa registrado em
+# "alteracoes": os outros workers leem só os itens alterados desde a versão que têm em vez de
+# recarregar tudo. O registro guarda as últimas MANTER_ALTERACOES versões de cada chave.
+
+MANTER_ALTERACOES = 1000
+
+_tabela_versoes_criada = False
+
+def _conexao_versao():
+    global _tabela_versoes_criada
+    conexao = get_local_db()
+    if not _tabela_versoes_criada:
+        conexao.execute("CREATE TABLE IF NOT EXISTS versoes (chave TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS alteracoes ("
+            " chave TEXT NOT NULL,"
+            " versao INTEGER NOT NULL,"
+            " item INTEGER NOT NULL,"
+            " PRIMARY KEY (chave, versao))"
+        )
+        _tabela_versoes_criada = True
+    return conexao
+
+def ler_versao(chave: str) -> int:
+    linha = _conexao_versao().execute("SELECT valor FROM versoes WHERE chave = ?", (chave,)).fetchone()
+    return linha[0] if linha else 0
+
+def incrementar_versao(chave: str, item: int = None) -> int:
+    conexao = _conexao_versao()
+    # incremento e leitura na mesma transação para não pegar o incremento de outro worker
+    conexao.execute("BEGIN IMMEDIATE")
+    try:
+        conexao.execute(
+            "INSERT INTO versoes (chave, valor) VALUES (?, 1) "
+            "ON CONFLICT(chave) DO UPDATE SET valor = valor + 1",
+            (chave,),
+        )
+        versao = conexao.execute("SELECT valor FROM versoes WHERE chave = ?", (chave,)).fetchone()[0]
+        if item is not None:
+            conexao.execute("INSERT OR REPLACE INTO alteracoes (chave, versao, item) VALUES (?, ?, ?)",
+                            (chave, versao, item))
+            if versao % 100 == 0:
+                conexao.execute("DELETE FROM alteracoes WHERE chave = ? AND versao <= ?",
+                                (chave, versao - MANTER_ALTERACOES))
+        conexao.execute("COMMIT")
+    except Exception:
+        conexao.execute("ROLLBACK")
+        raise
+    return versao
+
+def alteracoes_desde(chave: str, versao: int):
+    """Retorna (versão atual, itens alterados depois de `versao`).
+    Os itens vêm como None quando o registro não cobre o intervalo todo (incremento sem item ou
+    registro já apagado): nesse caso quem chama precisa recarregar tudo."""
+    conexao = _conexao_versao()
+    # leitura da versão e do registro no mesmo snapshot
+    conexao.execute("BEGIN")
+    try:
+        linha = conexao.execute("SELECT valor FROM versoes WHERE chave = ?", (chave,)).fetchone()
+        atual = linha[0] if linha else 0
+        itens = [item for (item,) in conexao.execute(
+            "SELECT item FROM alteracoes WHERE chave = ? AND versao > ? AND versao <= ?",
+            (chave, versao, atual),
+        )]
+    finally:
+        conexao.execute("COMMIT")
+    if len(itens) != atual - versao:
+        return atual, None
+    return atual, set(itens)